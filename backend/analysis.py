@@ -0,0 +1,188 @@
+"""
+Service layer for running the analysis pipeline.
+Kept free of app state so it can be imported by worker processes.
+"""
+
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+import pandas as pd
+
+from schemas import AnalysisRequest, AnalysisSummary
+from logic import (
+    AREA_CLASSES,
+    CoLocationHierarchy,
+    PipelineProfile,
+    SpatialIndex,
+    StageTiming,
+    analyze_sites,
+    class_counts_for_thresholds,
+    classify_sites,
+    process_sites
+)
+from datasets import SiteDataset
+
+# Worker processes for the exact density queries of a single run (1 = serial)
+QUERY_WORKERS = int(os.environ.get('PIPELINE_QUERY_WORKERS', '1'))
+
+# Record per-stage peak memory with tracemalloc (slows runs by roughly 30%);
+# stages that overlap another traced run in the same process report no peak
+TRACE_MEMORY = os.environ.get('PIPELINE_TRACE_MEMORY', '0').lower() in ('1', 'true', 'yes')
+
+
+class AnalysisResult(NamedTuple):
+    """Output of one pipeline run, as stored in the job store."""
+    data: pd.DataFrame
+    messages: List[str]
+    summary: AnalysisSummary
+    hierarchy: Optional[CoLocationHierarchy] = None
+    timings: Optional[List[StageTiming]] = None
+    counts: Optional[Dict[str, int]] = None
+    nbytes: int = 0
+
+
+def result_nbytes(result_df: pd.DataFrame, hierarchy: Optional[CoLocationHierarchy]) -> int:
+    """Approximate memory held by a result's data and hierarchy."""
+    size = int(result_df.memory_usage(deep=True).sum())
+    if hierarchy is not None:
+        size += hierarchy.nbytes
+    return size
+
+
+def summarize(result_df: pd.DataFrame) -> AnalysisSummary:
+    """Count sites per area class."""
+    area_class_counts = result_df['area_class'].value_counts().to_dict()
+    return AnalysisSummary(
+        Rural=area_class_counts.get('Rural', 0),
+        Suburban=area_class_counts.get('Suburban', 0),
+        Urban=area_class_counts.get('Urban', 0),
+        Dense=area_class_counts.get('Dense', 0)
+    )
+
+
+def pipeline_options(params: AnalysisRequest) -> Dict[str, Any]:
+    """Keyword arguments for process_sites / analyze_sites from request parameters."""
+    return dict(
+        radius_km=params.radius_km,
+        co_location_threshold_m=params.co_location_threshold_m,
+        classification_mode=params.classification_mode,
+        classification_thresholds=params.classification_thresholds,
+        density_radii_km=params.density_radii_km,
+        density_engine=params.density_engine,
+        spatial_engine=params.spatial_engine,
+        query_workers=QUERY_WORKERS,
+        co_location_max_threshold_m=params.co_location_max_threshold_m,
+        return_hierarchy=True
+    )
+
+
+def make_result(
+    result_df: pd.DataFrame,
+    messages: List[str],
+    hierarchy: Optional[CoLocationHierarchy],
+    timings: Optional[List[StageTiming]] = None,
+    counts: Optional[Dict[str, int]] = None
+) -> AnalysisResult:
+    """
+    Summarize a pipeline run into an AnalysisResult.
+    
+    Raises:
+        ValueError: If the run produced no rows
+    """
+    if len(result_df) == 0:
+        raise ValueError("No valid rows after processing. Check CSV format and data quality.")
+    
+    return AnalysisResult(
+        data=result_df,
+        messages=messages,
+        summary=summarize(result_df),
+        hierarchy=hierarchy,
+        timings=timings,
+        counts=counts,
+        nbytes=result_nbytes(result_df, hierarchy)
+    )
+
+
+def run_analysis(df: pd.DataFrame, params: AnalysisRequest) -> AnalysisResult:
+    """
+    Run the processing pipeline and summarize the result.
+    
+    Raises:
+        ValueError: If no rows survive validation
+    """
+    with PipelineProfile(trace_memory=TRACE_MEMORY) as profile:
+        output = process_sites(df=df, profile=profile, **pipeline_options(params))
+    return make_result(*output, timings=profile.stages, counts=profile.counts)
+
+
+def run_dataset_analysis(
+    df_clean: pd.DataFrame,
+    index: SpatialIndex,
+    params: AnalysisRequest
+) -> AnalysisResult:
+    """
+    Run the pipeline on a registered dataset's validated sites and cached index.
+    
+    Skips parsing, validation and the index build.
+    """
+    with PipelineProfile(trace_memory=TRACE_MEMORY) as profile:
+        output = analyze_sites(df_clean, index=index, profile=profile, **pipeline_options(params))
+    return make_result(*output, timings=profile.stages, counts=profile.counts)
+
+
+def reclassify_result(
+    result: AnalysisResult,
+    classification_mode: str,
+    classification_thresholds: Optional[Dict[str, float]] = None
+) -> AnalysisResult:
+    """
+    Apply new classification settings to an analyzed result.
+    
+    Density and co-location are reused as they are; only area_class is
+    recomputed. The original result is left untouched. Stage timings and
+    counts of the original run are dropped, since no pipeline ran.
+    """
+    area_class = classify_sites(
+        result.data,
+        mode=classification_mode,
+        thresholds=classification_thresholds
+    )
+    # Shallow copy: every other column is shared with the original result
+    result_df = result.data.copy(deep=False)
+    result_df['area_class'] = area_class
+    
+    messages = [f"Reclassified {len(result_df)} sites ({classification_mode} mode)"]
+    return result._replace(
+        data=result_df,
+        messages=messages,
+        summary=summarize(result_df),
+        timings=None,
+        counts=None,
+        nbytes=result_nbytes(result_df, result.hierarchy)
+    )
+
+
+def summaries_for_thresholds(
+    result_df: pd.DataFrame,
+    threshold_sets: Sequence[Dict[str, float]]
+) -> List[AnalysisSummary]:
+    """Threshold-mode summary of an analyzed result for each threshold set."""
+    counts = class_counts_for_thresholds(
+        result_df['density'].to_numpy(dtype=float), threshold_sets
+    )
+    return [AnalysisSummary(**dict(zip(AREA_CLASSES, row.tolist()))) for row in counts]
+
+
+def build_dataset(df: pd.DataFrame, params: AnalysisRequest) -> SiteDataset:
+    """
+    Analyze sites into a dataset that can be updated incrementally.
+    
+    Raises:
+        ValueError: If no rows survive validation
+    """
+    return SiteDataset(
+        df,
+        radius_km=params.radius_km,
+        co_location_threshold_m=params.co_location_threshold_m,
+        classification_mode=params.classification_mode,
+        classification_thresholds=params.classification_thresholds
+    )
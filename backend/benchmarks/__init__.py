@@ -0,0 +1,4 @@
+"""
+Benchmarks for the analysis pipeline and API.
+Run from the backend directory, e.g. python -m benchmarks.pipeline --help
+"""
@@ -0,0 +1,346 @@
+"""
+Seeded, vectorized generator of synthetic site inventories.
+
+Presets cover realistic and adversarial layouts for benchmarks and
+scaling tests. Rows are generated and written in chunks, so 10M+ site
+files need only one chunk in memory:
+
+    python -m benchmarks.generate --preset dense_urban --sites 10M --output sites.parquet
+
+CSV is always available; Parquet and Arrow IPC (Feather v2) need pyarrow.
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+KM_PER_DEGREE = 111.32
+
+PRESETS = {
+    'metro': "The original stress file: a ~110 km square around Bengaluru with 20% of sites in 100 tight clusters",
+    'uniform_rural': "Sites spread evenly at rural density; the region grows with the site count",
+    'dense_urban': "Cities of 50k sites (Gaussian, ~5 km spread) over a sparse rural background",
+    'co_location_chains': "Worst case for co-location: chains of sites spaced just under the threshold, "
+                          "so every chain is one large group",
+    'many_clusters': "Many small cluster_ids (50 sites each), stressing per-cluster classification",
+    'global': "Sites uniform over the whole sphere (defeats the projected engine)"
+}
+
+# Output formats by file extension
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+@dataclass(frozen=True)
+class GeneratorOptions:
+    """Tunable parameters of the presets (each preset uses the ones that apply)."""
+    center_lat: float = 13.3
+    center_lon: float = 77.9
+    sites_per_km2: float = 5.0
+    clustered_fraction: float = 0.2
+    clusters: int = 100
+    sites_per_city: int = 50_000
+    city_spread_km: float = 5.0
+    chain_length: int = 1000
+    chain_spacing_m: float = 90.0
+    sites_per_cluster: int = 50
+    id_prefix: str = 'STRESS_'
+
+
+def parse_size(text: str) -> int:
+    """Parse a site count such as '1000', '10k' or '1M'."""
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def _square(n: float, options: GeneratorOptions) -> float:
+    """Side (degrees) of the square around the center holding n sites at sites_per_km2."""
+    return max(np.sqrt(n / options.sites_per_km2) / KM_PER_DEGREE, 0.01)
+
+
+def _uniform_square(rng: np.random.Generator, count: int, side_deg: float, options: GeneratorOptions):
+    """count points uniform in a square of side_deg around the center."""
+    lat = options.center_lat + rng.uniform(-side_deg / 2, side_deg / 2, count)
+    lon = options.center_lon + rng.uniform(-side_deg / 2, side_deg / 2, count)
+    return lat, lon
+
+
+def _grid_codes(lat: np.ndarray, lon: np.ndarray, extent: Tuple[float, float, float, float], cells: int) -> np.ndarray:
+    """Cell index of each point on a cells x cells grid over extent (lat0, lat1, lon0, lon1)."""
+    lat0, lat1, lon0, lon1 = extent
+    row = np.clip(((lat - lat0) / (lat1 - lat0) * cells).astype(np.int64), 0, cells - 1)
+    col = np.clip(((lon - lon0) / (lon1 - lon0) * cells).astype(np.int64), 0, cells - 1)
+    return row * cells + col
+
+
+def plan_layout(preset: str, n: int, rng: np.random.Generator, options: GeneratorOptions) -> Dict[str, np.ndarray]:
+    """
+    Draw the structure shared by all chunks (cluster centers, chain starts, ...).
+    
+    Args:
+        preset: Key of PRESETS
+        n: Total number of sites
+        rng: Generator for the layout
+        options: Preset parameters
+    
+    Returns:
+        Layout arrays used by generate_chunk
+    """
+    if preset == 'metro':
+        return {
+            'centers_lat': rng.uniform(13.0, 13.5, options.clusters),
+            'centers_lon': rng.uniform(77.5, 78.0, options.clusters)
+        }
+    if preset == 'dense_urban':
+        n_cities = max(n // options.sites_per_city, 1)
+        # Cities are spread over the area the rural background would cover
+        side_deg = _square(n, options)
+        lat, lon = _uniform_square(rng, n_cities, side_deg, options)
+        return {'side_deg': np.array(side_deg), 'centers_lat': lat, 'centers_lon': lon}
+    if preset == 'co_location_chains':
+        n_chains = -(-n // options.chain_length)
+        side_deg = _square(n, options)
+        lat, lon = _uniform_square(rng, n_chains, side_deg, options)
+        return {'start_lat': lat, 'start_lon': lon, 'bearing': rng.uniform(0, 2 * np.pi, n_chains)}
+    if preset == 'many_clusters':
+        n_clusters = max(n // options.sites_per_cluster, 1)
+        side_deg = _square(n, options)
+        lat, lon = _uniform_square(rng, n_clusters, side_deg, options)
+        return {'centers_lat': lat, 'centers_lon': lon}
+    if preset in ('uniform_rural', 'global'):
+        return {}
+    raise ValueError(f"Unknown preset: {preset}")
+
+
+def generate_chunk(
+    preset: str,
+    layout: Dict[str, np.ndarray],
+    n: int,
+    start: int,
+    stop: int,
+    rng: np.random.Generator,
+    options: GeneratorOptions
+) -> pd.DataFrame:
+    """
+    Generate sites start..stop-1 of an n-site inventory.
+    
+    Returns:
+        DataFrame with site_id, lat, lon and cluster_id columns
+    """
+    index = np.arange(start, stop, dtype=np.int64)
+    count = len(index)
+    
+    if preset == 'metro':
+        lat = rng.uniform(12.8, 13.8, count)
+        lon = rng.uniform(77.4, 78.4, count)
+        clustered = index < int(n * options.clustered_fraction)
+        members = index[clustered] % options.clusters
+        lat[clustered] = layout['centers_lat'][members] + rng.normal(0, 0.005, len(members))
+        lon[clustered] = layout['centers_lon'][members] + rng.normal(0, 0.005, len(members))
+        codes = _grid_codes(lat, lon, (12.8, 13.8, 77.4, 78.4), 2)
+    
+    elif preset == 'uniform_rural':
+        side_deg = _square(n, options)
+        lat, lon = _uniform_square(rng, count, side_deg, options)
+        extent = (options.center_lat - side_deg / 2, options.center_lat + side_deg / 2,
+                  options.center_lon - side_deg / 2, options.center_lon + side_deg / 2)
+        codes = _grid_codes(lat, lon, extent, 4)
+    
+    elif preset == 'dense_urban':
+        n_cities = len(layout['centers_lat'])
+        # 90% of sites in cities, the rest as rural background
+        urban = rng.random(count) >= 0.1
+        lat, lon = _uniform_square(rng, count, float(layout['side_deg']), options)
+        city = rng.integers(0, n_cities, int(urban.sum()))
+        spread_deg = options.city_spread_km / KM_PER_DEGREE
+        lat[urban] = layout['centers_lat'][city] + rng.normal(0, spread_deg, len(city))
+        lon[urban] = layout['centers_lon'][city] + rng.normal(0, spread_deg, len(city))
+        codes = np.full(count, n_cities, dtype=np.int64)
+        codes[urban] = city
+    
+    elif preset == 'co_location_chains':
+        chain = index // options.chain_length
+        step_km = (index % options.chain_length) * options.chain_spacing_m / 1000.0
+        bearing = layout['bearing'][chain]
+        lat = layout['start_lat'][chain] + step_km * np.cos(bearing) / KM_PER_DEGREE
+        lon = layout['start_lon'][chain] + step_km * np.sin(bearing) / (
+            KM_PER_DEGREE * np.cos(np.radians(layout['start_lat'][chain]))
+        )
+        codes = chain
+    
+    elif preset == 'many_clusters':
+        n_clusters = len(layout['centers_lat'])
+        codes = index % n_clusters
+        lat = layout['centers_lat'][codes] + rng.normal(0, 0.01, count)
+        lon = layout['centers_lon'][codes] + rng.normal(0, 0.01, count)
+    
+    elif preset == 'global':
+        # Uniform on the sphere: sin(lat) is uniform
+        lat = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, count)))
+        lon = rng.uniform(-180.0, 180.0, count)
+        codes = _grid_codes(lat, lon, (-90.0, 90.0, -180.0, 180.0), 8)
+    
+    else:
+        raise ValueError(f"Unknown preset: {preset}")
+    
+    width = len(str(max(n - 1, 0)))
+    return pd.DataFrame({
+        'site_id': np.char.add(options.id_prefix, np.char.zfill(index.astype(str), width)),
+        'lat': np.clip(lat, -90.0, 90.0),
+        'lon': (lon + 180.0) % 360.0 - 180.0,
+        'cluster_id': np.char.add('C', codes.astype(str))
+    })
+
+
+def generate_sites(
+    n: int,
+    preset: str = 'metro',
+    seed: int = 0,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    options: Optional[GeneratorOptions] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Generate an n-site inventory in chunks of at most chunk_rows rows.
+    
+    The output depends only on (n, preset, seed, chunk_rows, options):
+    the layout comes from the seed and each chunk from its own child seed.
+    
+    Args:
+        n: Number of sites
+        preset: Key of PRESETS
+        seed: Random seed
+        chunk_rows: Rows per chunk
+        options: Preset parameters (defaults if omitted)
+    
+    Yields:
+        DataFrames with site_id, lat, lon and cluster_id columns
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset: {preset}")
+    options = options or GeneratorOptions()
+    seeds = np.random.SeedSequence(seed)
+    layout = plan_layout(preset, n, np.random.default_rng(seeds.spawn(1)[0]), options)
+    
+    # At least one (possibly empty) chunk, so callers always get the columns
+    n_chunks = max(-(-n // chunk_rows), 1)
+    for chunk, chunk_seed in enumerate(seeds.spawn(n_chunks)):
+        start = chunk * chunk_rows
+        yield generate_chunk(
+            preset, layout, n, start, min(start + chunk_rows, n),
+            np.random.default_rng(chunk_seed), options
+        )
+
+
+def generate_frame(n: int, preset: str = 'metro', seed: int = 0, options: Optional[GeneratorOptions] = None) -> pd.DataFrame:
+    """generate_sites as a single DataFrame."""
+    chunks = list(generate_sites(n, preset, seed, options=options))
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def output_format(path: str, fmt: Optional[str] = None) -> str:
+    """Output format from an explicit choice or the file extension."""
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Cannot infer the format of {path}; pass --format")
+    return FORMAT_EXTENSIONS[extension]
+
+
+def write_sites(chunks: Iterator[pd.DataFrame], path: str, fmt: str) -> int:
+    """
+    Write chunks to path as one CSV, Parquet or Arrow IPC file.
+    
+    Returns:
+        Number of rows written
+    
+    Raises:
+        ImportError: If fmt needs pyarrow and it is not installed
+    """
+    rows = 0
+    if fmt == 'csv':
+        with open(path, 'w', newline='') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(i == 0))
+                rows += len(chunk)
+        return rows
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(f"Writing {fmt} needs pyarrow (pip install pyarrow)") from e
+    
+    schema = pa.schema([('site_id', pa.string()), ('lat', pa.float64()), ('lon', pa.float64()), ('cluster_id', pa.string())])
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command-line entry point."""
+    defaults = GeneratorOptions()
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic site inventories.",
+        epilog="Presets:\n" + "\n".join(f"  {name}: {text}" for name, text in PRESETS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='metro')
+    parser.add_argument('--sites', type=parse_size, default=100_000, help="Number of sites, e.g. 100k or 10M")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='limit_test.csv', help="Output file (.csv, .parquet, .arrow/.feather)")
+    parser.add_argument('--format', choices=sorted(set(FORMAT_EXTENSIONS.values())),
+                        help="Output format (default: from the file extension)")
+    parser.add_argument('--chunk-rows', type=parse_size, default=DEFAULT_CHUNK_ROWS, help="Rows generated per chunk")
+    parser.add_argument('--sites-per-km2', type=float, default=defaults.sites_per_km2,
+                        help="Background density of uniform_rural, dense_urban, co_location_chains and many_clusters")
+    parser.add_argument('--clusters', type=int, default=defaults.clusters, help="Clusters of the metro preset")
+    parser.add_argument('--sites-per-city', type=int, default=defaults.sites_per_city)
+    parser.add_argument('--chain-length', type=int, default=defaults.chain_length)
+    parser.add_argument('--chain-spacing-m', type=float, default=defaults.chain_spacing_m)
+    parser.add_argument('--sites-per-cluster', type=int, default=defaults.sites_per_cluster,
+                        help="Sites per cluster_id of the many_clusters preset")
+    args = parser.parse_args(argv)
+    
+    options = replace(
+        defaults,
+        sites_per_km2=args.sites_per_km2,
+        clusters=args.clusters,
+        sites_per_city=args.sites_per_city,
+        chain_length=args.chain_length,
+        chain_spacing_m=args.chain_spacing_m,
+        sites_per_cluster=args.sites_per_cluster
+    )
+    try:
+        fmt = output_format(args.output, args.format)
+        rows = write_sites(
+            generate_sites(args.sites, args.preset, args.seed, args.chunk_rows, options), args.output, fmt
+        )
+    except (ImportError, ValueError) as e:
+        parser.exit(2, f"error: {e}\n")
+    
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"Wrote {rows:,} {args.preset} sites to {args.output} ({fmt}, {size_mb:.1f} MB)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark of the Arrow CSV reader against the pandas reader for uploads.
+
+Each input is parsed by read_csv_upload with and without Arrow, once with
+all columns and once with only the required ones, then run through
+validate_csv to check that both readers give the same sites:
+
+    python -m benchmarks.ingest --files ../limit_test.csv --sizes 1M,5M
+
+Generated sizes are written to a temporary directory with the metro preset.
+Arrow allocates outside the Python heap, so only times are reported.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from logic import REQUIRED_COLUMNS, validate_csv
+from utils import read_csv_upload
+from benchmarks.generate import generate_sites, parse_size, write_sites
+
+
+def read_file(path: str, usecols: Optional[Sequence[str]], use_arrow: bool) -> pd.DataFrame:
+    """Parse a CSV file the way an upload is parsed."""
+    with open(path, 'rb') as f:
+        return read_csv_upload(f, usecols, use_arrow)
+
+
+def same_sites(path: str, usecols: Optional[Sequence[str]]) -> bool:
+    """Whether both readers give the same validated sites and messages."""
+    arrow_df, arrow_errors = validate_csv(read_file(path, usecols, use_arrow=True))
+    pandas_df, pandas_errors = validate_csv(read_file(path, usecols, use_arrow=False))
+    try:
+        pd.testing.assert_frame_equal(arrow_df, pandas_df, check_dtype=False)
+    except AssertionError:
+        return False
+    return arrow_errors == pandas_errors
+
+
+def fastest(fn: Callable[[], Any], repeats: int) -> float:
+    """Fastest wall time of fn over repeats runs."""
+    walls = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - start)
+    return min(walls)
+
+
+def benchmark_file(path: str, repeats: int) -> List[Dict[str, Any]]:
+    """Parse and parse-plus-validate times of both readers, with and without extra columns."""
+    results = []
+    for columns, usecols in (('all', None), ('required', REQUIRED_COLUMNS)):
+        for step, validate in (('read', False), ('read+validate', True)):
+            times = {}
+            for reader, use_arrow in (('pandas', False), ('arrow', True)):
+                def run():
+                    df = read_file(path, usecols, use_arrow)
+                    return validate_csv(df) if validate else df
+                times[reader] = fastest(run, repeats)
+            results.append({'columns': columns, 'step': step, **times})
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command-line entry point; returns 1 if the two readers disagree."""
+    parser = argparse.ArgumentParser(description="Benchmark the Arrow CSV reader against the pandas reader.")
+    parser.add_argument('--files', default='', help="Comma-separated CSV files")
+    parser.add_argument('--sizes', default='1M', help="Comma-separated site counts to generate")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+    # Arrow fallbacks and validation drops are logged on every run
+    logging.getLogger('utils').setLevel(logging.ERROR)
+    logging.getLogger('logic').setLevel(logging.ERROR)
+    
+    status = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [path for path in args.files.split(',') if path]
+        for n in (parse_size(size) for size in args.sizes.split(',') if size):
+            path = os.path.join(tmp, f'sites_{n}.csv')
+            write_sites(generate_sites(n, 'metro'), path, 'csv')
+            paths.append(path)
+        
+        for path in paths:
+            size_mb = os.path.getsize(path) / 1e6
+            print(f"{os.path.basename(path)} ({size_mb:.0f} MB)")
+            for usecols in (None, REQUIRED_COLUMNS):
+                if not same_sites(path, usecols):
+                    print("  validated sites differ between the readers")
+                    status = 1
+            for r in benchmark_file(path, args.repeats):
+                print(
+                    f"  {r['columns']:<9} {r['step']:<14} pandas {r['pandas']:.3f} s, "
+                    f"arrow {r['arrow']:.3f} s ({r['pandas'] / r['arrow']:.1f}x faster)"
+                )
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Timing and memory benchmarks for the pipeline stages and HTTP endpoints.
+
+Each benchmark runs on generated sites (see benchmarks.generate) at
+several sizes and layouts. Results are written as JSON and can be compared against a
+stored baseline run to flag regressions:
+
+    python -m benchmarks.pipeline --sizes 1k,10k,100k --output current.json
+    python -m benchmarks.pipeline --sizes 1k,10k,100k --baseline baseline.json
+
+Baselines are machine specific; record one on the machine that runs the
+comparison.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from logic import calculate_density, classify_sites, find_co_location_groups, process_sites, validate_csv
+from benchmarks.generate import PRESETS, generate_frame, parse_size
+
+# Layouts benchmarked by default. Their density and cluster sizes do not
+# grow with the site count, so the work per site stays comparable.
+DEFAULT_PRESETS = ('uniform_rural', 'dense_urban', 'co_location_chains')
+
+PIPELINE_BENCHMARKS = ('validate_csv', 'calculate_density', 'find_co_location_groups', 'classify_sites', 'process_sites')
+HTTP_BENCHMARKS = ('http_analyze', 'http_download')
+
+# Inputs with at least this many rows are timed once instead of --repeats times
+SINGLE_RUN_MIN_ROWS = 1_000_000
+
+
+def measure(fn: Callable[[], Any], repeats: int, trace_memory: bool) -> Dict[str, Any]:
+    """
+    Time fn over repeats runs, plus one traced run for peak memory.
+    
+    The traced run is separate because tracemalloc slows the code it measures.
+    
+    Returns:
+        Dict with wall_s_min, wall_s_median, cpu_s (of the fastest run),
+        repeats and peak_memory_bytes (None unless trace_memory)
+    """
+    walls, cpus = [], []
+    for _ in range(repeats):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        fn()
+        walls.append(time.perf_counter() - start_wall)
+        cpus.append(time.process_time() - start_cpu)
+    
+    peak_memory = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    
+    fastest = int(np.argmin(walls))
+    return {
+        'wall_s_min': walls[fastest],
+        'wall_s_median': statistics.median(walls),
+        'cpu_s': cpus[fastest],
+        'repeats': repeats,
+        'peak_memory_bytes': peak_memory
+    }
+
+
+def pipeline_benchmarks(df: pd.DataFrame, radius_km: float, threshold_m: float) -> Dict[str, Callable[[], Any]]:
+    """Callables for the pipeline stages, each on the input it gets inside process_sites."""
+    df_clean, _ = validate_csv(df)
+    df_density = df_clean.copy()
+    df_density['density'] = calculate_density(df_clean, radius_km=radius_km)
+    return {
+        'validate_csv': lambda: validate_csv(df),
+        'calculate_density': lambda: calculate_density(df_clean, radius_km=radius_km),
+        'find_co_location_groups': lambda: find_co_location_groups(df_clean, threshold_m=threshold_m),
+        'classify_sites': lambda: classify_sites(df_density),
+        'process_sites': lambda: process_sites(df, radius_km=radius_km, co_location_threshold_m=threshold_m)
+    }
+
+
+def http_benchmarks(df: pd.DataFrame, radius_km: float, threshold_m: float) -> Dict[str, Callable[[], Any]]:
+    """
+    Callables for POST /analyze and POST /download, served in process through an ASGI client.
+    
+    The result cache is disabled so every request runs the pipeline. Large
+    inputs run on the app's process pool, whose memory tracemalloc cannot
+    see, so peak memory covers the API process only.
+    """
+    import httpx
+    import main
+    from cache import ResultCache
+    
+    main.result_cache = ResultCache(max_bytes=0, spill_dir=None)
+    csv_bytes = df.to_csv(index=False).encode('utf-8')
+    params = {'radius_km': radius_km, 'co_location_threshold_m': threshold_m}
+    
+    async def post(path: str) -> None:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            response = await client.post(
+                path, params=params, files={'file': ('sites.csv', io.BytesIO(csv_bytes), 'text/csv')}
+            )
+            response.raise_for_status()
+    
+    return {
+        'http_analyze': lambda: asyncio.run(post('/analyze')),
+        'http_download': lambda: asyncio.run(post('/download'))
+    }
+
+
+def run_benchmarks(
+    sizes: Sequence[int],
+    presets: Sequence[str],
+    benchmarks: Sequence[str],
+    repeats: int = 3,
+    trace_memory: bool = True,
+    radius_km: float = 2.0,
+    threshold_m: float = 100.0,
+    http_max_rows: int = 1_000_000,
+    seed: int = 0,
+    log: Callable[[str], None] = print
+) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks at every size and preset.
+    
+    Args:
+        sizes: Site counts
+        presets: Keys of benchmarks.generate.PRESETS
+        benchmarks: Names from PIPELINE_BENCHMARKS and HTTP_BENCHMARKS
+        repeats: Timed runs per benchmark (one for inputs of SINGLE_RUN_MIN_ROWS or more)
+        trace_memory: Add a tracemalloc run for peak memory
+        radius_km: Density radius
+        threshold_m: Co-location threshold
+        http_max_rows: Largest input sent through the HTTP benchmarks
+        seed: Seed for the generated sites
+        log: Progress output
+    
+    Returns:
+        Report dict with 'meta' and 'results' (one record per benchmark run)
+    """
+    results = []
+    for n in sizes:
+        for preset in presets:
+            df = generate_frame(n, preset, seed=seed)
+            cases = {}
+            if any(name in PIPELINE_BENCHMARKS for name in benchmarks):
+                cases.update(pipeline_benchmarks(df, radius_km, threshold_m))
+            if any(name in HTTP_BENCHMARKS for name in benchmarks) and n <= http_max_rows:
+                cases.update(http_benchmarks(df, radius_km, threshold_m))
+            
+            for name in benchmarks:
+                if name not in cases:
+                    continue
+                record = {'benchmark': name, 'sites': n, 'preset': preset}
+                record.update(measure(cases[name], 1 if n >= SINGLE_RUN_MIN_ROWS else repeats, trace_memory))
+                results.append(record)
+                log(format_record(record))
+    
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'radius_km': radius_km,
+            'threshold_m': threshold_m,
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+def format_record(record: Dict[str, Any]) -> str:
+    """One result as a fixed-width text line."""
+    memory = record.get('peak_memory_bytes')
+    memory_text = f"{memory / 1e6:9.1f} MB" if memory is not None else f"{'-':>12}"
+    return (
+        f"{record['benchmark']:<24} {record['sites']:>10,} {record['preset']:<18} "
+        f"{record['wall_s_min']:9.4f} s {record['cpu_s']:9.4f} s cpu {memory_text}"
+    )
+
+
+def compare_results(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_tolerance: float = 0.2,
+    memory_tolerance: float = 0.2,
+    min_time_delta_s: float = 0.005
+) -> List[Dict[str, Any]]:
+    """
+    Find benchmarks that got slower or use more memory than in a baseline report.
+    
+    Records are matched on (benchmark, sites, preset). The fastest wall
+    time is compared, and differences under min_time_delta_s are ignored
+    as timer noise.
+    
+    Args:
+        current: Report from run_benchmarks
+        baseline: Earlier report from run_benchmarks
+        time_tolerance: Allowed relative wall time increase
+        memory_tolerance: Allowed relative peak memory increase
+        min_time_delta_s: Smallest absolute slowdown counted as a regression
+    
+    Returns:
+        One dict per regression with benchmark, sites, preset, metric,
+        baseline, current and ratio
+    """
+    def key(record):
+        return record['benchmark'], record['sites'], record['preset']
+    
+    previous = {key(record): record for record in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        old = previous.get(key(record))
+        if old is None:
+            continue
+        checks = [('wall_s_min', time_tolerance, min_time_delta_s), ('peak_memory_bytes', memory_tolerance, 0)]
+        for metric, tolerance, min_delta in checks:
+            new_value, old_value = record.get(metric), old.get(metric)
+            if new_value is None or not old_value:
+                continue
+            if new_value > old_value * (1 + tolerance) and new_value - old_value > min_delta:
+                regressions.append({
+                    'benchmark': record['benchmark'],
+                    'sites': record['sites'],
+                    'preset': record['preset'],
+                    'metric': metric,
+                    'baseline': old_value,
+                    'current': new_value,
+                    'ratio': new_value / old_value
+                })
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command-line entry point; returns 1 if regressions were found."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1k,10k,100k', help="Comma-separated site counts, e.g. 1k,100k,1M,10M")
+    parser.add_argument('--presets', default=','.join(DEFAULT_PRESETS),
+                        help=f"Comma-separated layouts from: {', '.join(PRESETS)}")
+    parser.add_argument('--benchmarks', default=','.join(PIPELINE_BENCHMARKS + HTTP_BENCHMARKS),
+                        help="Comma-separated benchmark names")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per benchmark below 1M sites")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc peak memory run")
+    parser.add_argument('--radius-km', type=float, default=2.0)
+    parser.add_argument('--threshold-m', type=float, default=100.0)
+    parser.add_argument('--http-max-rows', type=parse_size, default=1_000_000,
+                        help="Largest input sent through the HTTP benchmarks")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this path")
+    parser.add_argument('--baseline', help="Compare against this JSON report")
+    parser.add_argument('--time-tolerance', type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help="Allowed relative memory increase")
+    args = parser.parse_args(argv)
+    
+    benchmarks = [name.strip() for name in args.benchmarks.split(',') if name.strip()]
+    unknown = set(benchmarks) - set(PIPELINE_BENCHMARKS + HTTP_BENCHMARKS)
+    presets = [name.strip() for name in args.presets.split(',') if name.strip()]
+    unknown |= set(presets) - set(PRESETS)
+    if unknown:
+        parser.error(f"Unknown benchmarks or presets: {sorted(unknown)}")
+    
+    try:
+        report = run_benchmarks(
+            sizes=[parse_size(size) for size in args.sizes.split(',')],
+            presets=presets,
+            benchmarks=benchmarks,
+            repeats=args.repeats,
+            trace_memory=not args.no_memory,
+            radius_km=args.radius_km,
+            threshold_m=args.threshold_m,
+            http_max_rows=args.http_max_rows,
+            seed=args.seed
+        )
+    finally:
+        if 'main' in sys.modules:
+            sys.modules['main'].worker_pool.shutdown(wait=False)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.time_tolerance, args.memory_tolerance)
+        for r in regressions:
+            print(
+                f"REGRESSION {r['benchmark']} {r['sites']:,} {r['preset']} {r['metric']}: "
+                f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)"
+            )
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
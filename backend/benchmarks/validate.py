@@ -0,0 +1,154 @@
+"""
+Benchmark of validate_csv against its previous implementation.
+
+The previous version parsed each coordinate column twice, filtered the
+frame once per check and rebuilt it with pd.concat to restore extra
+columns. It is kept here, unchanged, as the reference for timings and
+for checking that both return the same rows and messages:
+
+    python -m benchmarks.validate --sizes 100k,1M --invalid-fraction 0.01
+"""
+
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logic import REQUIRED_COLUMNS, validate_csv
+from benchmarks.generate import generate_frame, parse_size
+
+
+def legacy_validate_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """validate_csv as it was before the single-pass rewrite."""
+    errors = []
+    required_columns = REQUIRED_COLUMNS
+    
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        errors.append(f"Missing required columns: {missing_columns}")
+        return pd.DataFrame(), errors
+    
+    initial_count = len(df)
+    
+    df_clean = df[required_columns].copy()
+    df_clean = df_clean.dropna(subset=required_columns)
+    
+    for col in ['lat', 'lon']:
+        non_numeric = pd.to_numeric(df_clean[col], errors='coerce').isna()
+        if non_numeric.any():
+            invalid_count = non_numeric.sum()
+            errors.append(f"Dropped {invalid_count} rows with non-numeric {col}")
+            df_clean = df_clean[~non_numeric]
+    
+    df_clean['lat'] = pd.to_numeric(df_clean['lat'])
+    df_clean['lon'] = pd.to_numeric(df_clean['lon'])
+    df_clean['site_id'] = df_clean['site_id'].astype(str)
+    df_clean['cluster_id'] = df_clean['cluster_id'].astype(str)
+    
+    invalid_lat = (df_clean['lat'] < -90) | (df_clean['lat'] > 90)
+    invalid_lon = (df_clean['lon'] < -180) | (df_clean['lon'] > 180)
+    invalid_coords = invalid_lat | invalid_lon
+    
+    if invalid_coords.any():
+        invalid_count = invalid_coords.sum()
+        errors.append(f"Dropped {invalid_count} rows with invalid coordinates")
+        df_clean = df_clean[~invalid_coords]
+    
+    other_columns = [col for col in df.columns if col not in required_columns]
+    if other_columns:
+        df_other = df[other_columns].loc[df_clean.index]
+        df_clean = pd.concat([df_clean, df_other], axis=1)
+    
+    dropped_count = initial_count - len(df_clean)
+    if dropped_count > 0:
+        errors.append(f"Dropped {dropped_count} invalid rows (from {initial_count} total)")
+    
+    return df_clean, errors
+
+
+def messy_sites(n: int, invalid_fraction: float = 0.01, extra_columns: int = 2, seed: int = 0) -> pd.DataFrame:
+    """
+    Generated sites as read from a CSV with some bad rows.
+    
+    A share of rows gets missing values, non-numeric coordinates or
+    out-of-range coordinates. Bad text values make lat/lon object columns,
+    as read_csv would return them.
+    """
+    df = generate_frame(n, 'metro', seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    for i in range(extra_columns):
+        df[f'extra_{i}'] = rng.integers(0, 1000, n)
+    
+    if invalid_fraction > 0:
+        bad = rng.choice(n, int(n * invalid_fraction), replace=False)
+        kinds = bad % 4
+        lat = df['lat'].astype(object)
+        lon = df['lon'].astype(object)
+        lat[bad[kinds == 0]] = 'n/a'
+        lon[bad[kinds == 1]] = 'bad'
+        lat[bad[kinds == 2]] = 95.0
+        df.loc[bad[kinds == 3], 'cluster_id'] = None
+        df['lat'], df['lon'] = lat, lon
+    return df
+
+
+def same_result(df: pd.DataFrame) -> bool:
+    """Whether validate_csv and legacy_validate_csv keep the same rows, values and messages."""
+    new_df, new_errors = validate_csv(df)
+    old_df, old_errors = legacy_validate_csv(df)
+    try:
+        pd.testing.assert_frame_equal(new_df, old_df, check_dtype=False)
+    except AssertionError:
+        return False
+    return new_errors == old_errors
+
+
+def measure(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """Fastest wall time of fn over repeats runs and its tracemalloc peak."""
+    walls = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        walls.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'wall_s': min(walls), 'peak_memory_bytes': peak}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command-line entry point; returns 1 if the two implementations disagree."""
+    parser = argparse.ArgumentParser(description="Benchmark validate_csv against its previous implementation.")
+    parser.add_argument('--sizes', default='100k,1M', help="Comma-separated row counts")
+    parser.add_argument('--invalid-fraction', type=float, default=0.01, help="Share of bad rows (0 for a clean file)")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+    # validate_csv logs a warning per drop message on every run
+    logging.getLogger('logic').setLevel(logging.ERROR)
+    
+    status = 0
+    for n in (parse_size(size) for size in args.sizes.split(',')):
+        df = messy_sites(n, args.invalid_fraction)
+        if not same_result(df):
+            print(f"{n:>10,} rows: results differ from the previous implementation")
+            status = 1
+        old = measure(lambda: legacy_validate_csv(df), args.repeats)
+        new = measure(lambda: validate_csv(df), args.repeats)
+        print(
+            f"{n:>10,} rows: previous {old['wall_s']:.3f} s / {old['peak_memory_bytes'] / 1e6:.0f} MB, "
+            f"single-pass {new['wall_s']:.3f} s / {new['peak_memory_bytes'] / 1e6:.0f} MB "
+            f"({old['wall_s'] / new['wall_s']:.1f}x faster)"
+        )
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for analysis results.
+Entries are keyed on a hash of the uploaded bytes plus the normalized
+analysis parameters, so repeat uploads are served without reprocessing.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+DEFAULT_SPILL_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+DEFAULT_MAX_DISK_BYTES = int(os.environ.get('RESULT_CACHE_MAX_DISK_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+
+def make_cache_key(upload_digest: str, params: Dict[str, Any]) -> str:
+    """
+    Build a cache key from an upload's content hash and analysis parameters.
+    
+    Args:
+        upload_digest: Hex digest of the uploaded file bytes
+        params: Analysis parameters (JSON-serializable)
+    
+    Returns:
+        Hex digest identifying this (file, parameters) pair
+    """
+    digest = hashlib.blake2b(upload_digest.encode('ascii'), digest_size=32)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache with a byte-size budget and optional disk spill.
+    
+    Entries evicted from memory are pickled to spill_dir (when set) and
+    promoted back into memory on their next hit. The spill directory has
+    its own byte budget; the oldest files are removed first.
+    """
+    
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        spill_dir: Optional[str] = DEFAULT_SPILL_DIR,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES
+    ):
+        """
+        Args:
+            max_bytes: Memory budget for cached values
+            spill_dir: Optional directory for entries evicted from memory
+            max_disk_bytes: Budget for the spill directory
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        
+        self._entries: 'OrderedDict[str, Tuple[Any, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        
+        loaded = self._load_spilled(key)
+        with self._lock:
+            if loaded is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        
+        value, size = loaded
+        self.put(key, value, size)
+        return value
+    
+    def put(self, key: str, value: Any, size: int) -> None:
+        """
+        Store value under key.
+        
+        Args:
+            key: Cache key (see make_cache_key)
+            value: Value to cache
+            size: Approximate size of value in bytes
+        """
+        if size > self.max_bytes:
+            self._spill(key, value, size)
+            return
+        
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, (old_value, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append((old_key, old_value, old_size))
+        
+        for old_key, old_value, old_size in evicted:
+            self._spill(old_key, old_value, old_size)
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+    
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.pkl")
+    
+    def _spill(self, key: str, value: Any, size: int) -> None:
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((value, size), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not spill cache entry {key}: {str(e)}")
+            return
+        self._trim_spill_dir()
+    
+    def _load_spilled(self, key: str) -> Optional[Tuple[Any, int]]:
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as f:
+                loaded = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {str(e)}")
+            self._remove(path)
+            return None
+        # Entry lives in memory again; drop the file
+        self._remove(path)
+        return loaded
+    
+    def _trim_spill_dir(self) -> None:
+        files = []
+        for name in os.listdir(self.spill_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+    
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
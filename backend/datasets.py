@@ -0,0 +1,516 @@
+"""
+Stateful site datasets with incremental updates.
+A dataset holds the analyzed sites and keeps the analysis current as sites
+are added or removed, recomputing only what the change can reach instead
+of re-running the full pipeline.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from logic import (
+    AREA_CLASSES,
+    SpatialIndex,
+    build_spatial_index,
+    classify_sites,
+    component_group_ids,
+    validate_csv
+)
+
+logger = logging.getLogger(__name__)
+
+# Appended sites go to a small delta index next to the main one; once it
+# holds more than this fraction of the main index, the dataset is compacted
+DELTA_MAX_FRACTION = 0.05
+
+# Removed sites stay in the arrays as tombstones until they make up more
+# than this fraction of the stored rows, then the dataset is compacted
+MAX_DEAD_FRACTION = 0.25
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_STORED_DATASETS = int(os.environ.get('DATASET_MAX_STORED', '8'))
+
+
+class UnionFind:
+    """
+    Disjoint-set forest over integer ids (path halving, union by size).
+    """
+    
+    def __init__(self, n: int = 0):
+        """
+        Args:
+            n: Number of initial singleton sets (ids 0..n-1)
+        """
+        self.parent = np.arange(n, dtype=np.int64)
+        self.size = np.ones(n, dtype=np.int64)
+    
+    def __len__(self) -> int:
+        return len(self.parent)
+    
+    def add(self, count: int) -> np.ndarray:
+        """Add count singleton sets and return their ids."""
+        ids = np.arange(len(self.parent), len(self.parent) + count, dtype=np.int64)
+        self.parent = np.concatenate([self.parent, ids])
+        self.size = np.concatenate([self.size, np.ones(count, dtype=np.int64)])
+        return ids
+    
+    def find(self, x: int) -> int:
+        """Root of the set containing x."""
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return int(x)
+    
+    def union(self, a: int, b: int) -> int:
+        """Merge the sets containing a and b and return the new root."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+    
+    def roots(self) -> np.ndarray:
+        """Root of every id, by vectorized pointer jumping (also flattens the forest)."""
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        self.parent = parent
+        return parent
+
+
+class SiteDataset:
+    """
+    Analyzed sites that can be updated in place.
+    
+    Holds the same result as process_sites with the exact haversine engine
+    (density, co-location groups, area classes) and keeps it current as
+    sites are added or removed:
+    
+    - neighbor counts change only for sites within radius_km of a changed
+      site, found with radius queries around the changed sites;
+    - co-location components are merged with a union-find when sites are
+      added; a component that loses a site is re-split from its remaining
+      members only;
+    - only the clusters containing a changed density are reclassified
+      (only the changed sites in threshold mode).
+    
+    Rows keep their insertion order. Appended sites are indexed in a small
+    delta BallTree next to the main one and removed sites are kept as
+    tombstones; both are folded into a fresh main index (compaction) once
+    they pass DELTA_MAX_FRACTION / MAX_DEAD_FRACTION.
+    
+    The validated sites and their spatial indexes can also be reused for
+    full analyses with other parameters (see sites()).
+    
+    Attributes:
+        messages: Validation and processing messages from the initial build
+        version: Incremented on every update that changes the sites
+    """
+    
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        radius_km: float = 2.0,
+        co_location_threshold_m: float = 100.0,
+        classification_mode: str = 'quantile',
+        classification_thresholds: Optional[Dict[str, float]] = None
+    ):
+        """
+        Validate and analyze the initial sites.
+        
+        Args:
+            df: Input DataFrame (see validate_csv)
+            radius_km: Radius for density calculation (km)
+            co_location_threshold_m: Threshold for co-location grouping (meters)
+            classification_mode: 'quantile' or 'threshold'
+            classification_thresholds: Optional thresholds for threshold mode
+        
+        Raises:
+            ValueError: If no rows survive validation
+        """
+        self.radius_km = radius_km
+        self.co_location_threshold_m = co_location_threshold_m
+        self.classification_mode = classification_mode
+        self.classification_thresholds = classification_thresholds
+        self.version = 0
+        self._lock = threading.Lock()
+        self._index_cache: Dict[str, SpatialIndex] = {}
+        
+        df_clean, errors = validate_csv(df)
+        self.messages = list(errors)
+        if len(df_clean) == 0:
+            raise ValueError("No valid rows after validation. Check CSV format and data quality.")
+        
+        n = len(df_clean)
+        self._frame = df_clean.reset_index(drop=True)
+        self._site_ids = self._frame['site_id'].to_numpy(dtype=object)
+        self._lat = self._frame['lat'].to_numpy(dtype=np.float64)
+        self._lon = self._frame['lon'].to_numpy(dtype=np.float64)
+        self._cluster_lookup: Dict[str, int] = {}
+        self._cluster_codes = self._encode_clusters(self._frame['cluster_id'])
+        self._alive = np.ones(n, dtype=bool)
+        
+        self._main = SpatialIndex(self._lat, self._lon)
+        self._main_size = n
+        self._delta: Optional[SpatialIndex] = None
+        
+        # Neighbors within radius_km, self excluded
+        self._counts = self._main.query_radius(radius_km, count_only=True).astype(np.int64) - 1
+        
+        # Co-location components; labels are ids in the union-find
+        n_components, labels = connected_components(
+            self._main.neighbor_graph(self._threshold_km), directed=False
+        )
+        self._components = UnionFind(n_components)
+        self._labels = labels.astype(np.int64)
+        
+        self._group_id = np.empty(n, dtype=object)
+        self._group_size = np.zeros(n, dtype=np.int64)
+        self._area_class = np.empty(n, dtype=object)
+        everything = np.arange(n)
+        self._update_groups(everything)
+        self._reclassify(everything)
+        
+        self.messages.append(f"Processed {n} sites successfully")
+    
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    @property
+    def _threshold_km(self) -> float:
+        return self.co_location_threshold_m / 1000.0
+    
+    def add_sites(self, df: pd.DataFrame) -> List[str]:
+        """
+        Validate and add sites, updating only the affected results.
+        
+        Args:
+            df: New sites (same columns as the initial upload)
+        
+        Returns:
+            List of validation and processing messages
+        """
+        df_clean, messages = validate_csv(df)
+        if len(df_clean) == 0:
+            messages.append("No valid rows to add")
+            return messages
+        
+        with self._lock:
+            added = self._append(df_clean)
+            lat, lon = self._lat[added], self._lon[added]
+            
+            # New sites count every live neighbor; existing neighbors gain one per new site
+            query, positions = self._neighbors(lat, lon, self.radius_km)
+            self._counts[added] = np.bincount(query, minlength=len(added)) - 1
+            touched, gained = np.unique(positions[positions < added[0]], return_counts=True)
+            self._counts[touched] += gained
+            
+            # Merge each new site's component with those of its co-located neighbors
+            query, positions = self._neighbors(lat, lon, self._threshold_km)
+            components = self._components
+            for a, b in zip(self._labels[added[query]].tolist(), self._labels[positions].tolist()):
+                components.union(a, b)
+            self._update_groups(self._component_members(added))
+            
+            self._reclassify(np.concatenate([touched, added]))
+            self._maybe_compact()
+            self._changed()
+        
+        messages.append(
+            f"Added {len(added)} sites; updated density for {len(touched)} existing sites"
+        )
+        return messages
+    
+    def remove_sites(self, site_ids: Iterable[str]) -> List[str]:
+        """
+        Remove every site with one of the given IDs, updating only the affected results.
+        
+        Args:
+            site_ids: IDs of the sites to remove
+        
+        Returns:
+            List of processing messages
+        """
+        requested = pd.Index([str(site_id) for site_id in site_ids]).unique()
+        messages = []
+        
+        with self._lock:
+            removed = np.flatnonzero(self._alive & pd.Series(self._site_ids).isin(requested).to_numpy())
+            unknown = len(requested.difference(pd.Index(self._site_ids[removed])))
+            if unknown:
+                messages.append(f"Ignored {unknown} unknown site IDs")
+            if len(removed) == 0:
+                messages.append("No sites removed")
+                return messages
+            
+            # Survivors lose one neighbor per removed site within radius_km
+            self._alive[removed] = False
+            lat, lon = self._lat[removed], self._lon[removed]
+            query, positions = self._neighbors(lat, lon, self.radius_km)
+            touched, lost = np.unique(positions, return_counts=True)
+            self._counts[touched] -= lost
+            
+            # Components that lost a site may split; re-split them from their survivors
+            members = self._component_members(removed)
+            self._split_components(members)
+            self._update_groups(members)
+            
+            self._reclassify(np.concatenate([touched, removed]))
+            self._maybe_compact()
+            self._changed()
+        
+        messages.append(f"Removed {len(removed)} sites; updated density for {len(touched)} sites")
+        return messages
+    
+    def sites(self, spatial_engine: str = 'haversine') -> Tuple[int, pd.DataFrame, SpatialIndex]:
+        """
+        Validated input columns of the current sites, with a spatial index over them.
+        
+        The version is read under the same lock as the sites, so it always
+        identifies the returned rows even while updates run concurrently.
+        
+        The index is cached per engine until the next update; for the
+        haversine engine the dataset's own index is reused when it has no
+        pending additions or removals.
+        
+        Args:
+            spatial_engine: Engine for the index (see build_spatial_index)
+        
+        Returns:
+            Tuple of (version, validated DataFrame, SpatialIndex over its rows)
+        """
+        with self._lock:
+            compact = self._delta is None and bool(self._alive.all())
+            frame = self._frame if compact else self._frame.iloc[np.flatnonzero(self._alive)].reset_index(drop=True)
+            
+            index = self._index_cache.get(spatial_engine)
+            if index is None:
+                if spatial_engine == 'haversine' and compact:
+                    index = self._main
+                else:
+                    index = build_spatial_index(frame, engine=spatial_engine)
+                self._index_cache[spatial_engine] = index
+            version = self.version
+        return version, frame, index
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Enriched DataFrame of the current sites, in the layout of process_sites."""
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            result = self._frame.iloc[rows].reset_index(drop=True)
+            result['density'] = self._density(rows)
+            result['group_id'] = self._group_id[rows]
+            result['group_size'] = self._group_size[rows]
+            result['area_class'] = self._area_class[rows]
+        return result
+    
+    def class_counts(self) -> Dict[str, int]:
+        """Number of current sites per area class."""
+        with self._lock:
+            classes = pd.Series(self._area_class[self._alive]).value_counts()
+        return {area_class: int(classes.get(area_class, 0)) for area_class in AREA_CLASSES}
+    
+    def _changed(self) -> None:
+        self.version += 1
+        self._index_cache.clear()
+    
+    def _encode_clusters(self, cluster_ids: pd.Series) -> np.ndarray:
+        # Stable integer code per cluster_id across appends
+        codes, uniques = pd.factorize(cluster_ids)
+        lookup = self._cluster_lookup
+        mapping = np.array([lookup.setdefault(c, len(lookup)) for c in uniques], dtype=np.int64)
+        return mapping[codes]
+    
+    def _density(self, rows: np.ndarray) -> np.ndarray:
+        # Same expression as calculate_density, so values match bit for bit
+        area_km2 = np.pi * np.asarray([self.radius_km], dtype=np.float64) ** 2
+        return self._counts[rows] / area_km2[0]
+    
+    def _indexes(self) -> List[Tuple[SpatialIndex, int]]:
+        # (index, position of its first row) for the main and delta indexes
+        indexes = [(self._main, 0)]
+        if self._delta is not None:
+            indexes.append((self._delta, self._main_size))
+        return indexes
+    
+    def _neighbors(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        radius_km: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(query row, position) pairs of live sites within radius_km of each query point."""
+        query_parts = [np.empty(0, dtype=np.int64)]
+        position_parts = [np.empty(0, dtype=np.int64)]
+        if len(lat) > 0:
+            for index, offset in self._indexes():
+                neighbors = index.query_points(lat, lon, radius_km)
+                counts = np.fromiter((len(a) for a in neighbors), dtype=np.int64, count=len(neighbors))
+                query_parts.append(np.repeat(np.arange(len(neighbors)), counts))
+                position_parts.append(np.concatenate(neighbors).astype(np.int64) + offset)
+        
+        query = np.concatenate(query_parts)
+        positions = np.concatenate(position_parts)
+        live = self._alive[positions]
+        return query[live], positions[live]
+    
+    def _append(self, df_clean: pd.DataFrame) -> np.ndarray:
+        """Store validated sites as new rows and index them; returns their positions."""
+        start = len(self._alive)
+        m = len(df_clean)
+        frame = df_clean.reset_index(drop=True)
+        
+        self._frame = pd.concat([self._frame, frame], ignore_index=True)
+        self._site_ids = np.concatenate([self._site_ids, frame['site_id'].to_numpy(dtype=object)])
+        self._lat = np.concatenate([self._lat, frame['lat'].to_numpy(dtype=np.float64)])
+        self._lon = np.concatenate([self._lon, frame['lon'].to_numpy(dtype=np.float64)])
+        self._cluster_codes = np.concatenate([self._cluster_codes, self._encode_clusters(frame['cluster_id'])])
+        self._alive = np.concatenate([self._alive, np.ones(m, dtype=bool)])
+        self._counts = np.concatenate([self._counts, np.zeros(m, dtype=np.int64)])
+        self._labels = np.concatenate([self._labels, self._components.add(m)])
+        self._group_id = np.concatenate([self._group_id, np.empty(m, dtype=object)])
+        self._group_size = np.concatenate([self._group_size, np.zeros(m, dtype=np.int64)])
+        self._area_class = np.concatenate([self._area_class, np.empty(m, dtype=object)])
+        
+        # Rebuilding the delta index is cheap: it is kept small by compaction
+        self._delta = SpatialIndex(self._lat[self._main_size:], self._lon[self._main_size:])
+        return np.arange(start, start + m)
+    
+    def _component_members(self, positions: np.ndarray) -> np.ndarray:
+        """Live positions in the same component as any of the given positions."""
+        site_roots = self._components.roots()[self._labels]
+        return np.flatnonzero(self._alive & np.isin(site_roots, site_roots[positions]))
+    
+    def _split_components(self, members: np.ndarray) -> None:
+        """Recompute connected components among members (whole former components)."""
+        if len(members) == 0:
+            return
+        
+        # Co-located neighbors of a member belong to the same former component
+        query, positions = self._neighbors(self._lat[members], self._lon[members], self._threshold_km)
+        local = np.searchsorted(members, positions)
+        adjacency = coo_matrix(
+            (np.ones(len(query), dtype=np.int8), (query, local)),
+            shape=(len(members), len(members))
+        )
+        n_components, labels = connected_components(adjacency, directed=False)
+        self._labels[members] = self._components.add(n_components)[labels]
+    
+    def _update_groups(self, members: np.ndarray) -> None:
+        """Recompute group_id and group_size for members (whole components)."""
+        if len(members) == 0:
+            return
+        codes, uniques = pd.factorize(self._components.roots()[self._labels[members]])
+        self._group_id[members] = component_group_ids(self._site_ids[members], codes, len(uniques))
+        self._group_size[members] = np.bincount(codes, minlength=len(uniques))[codes]
+    
+    def _reclassify(self, changed: np.ndarray) -> None:
+        """Reclassify the sites whose class may depend on the changed positions."""
+        if self.classification_mode == 'quantile':
+            # Quartile cut points are per cluster: redo every cluster that changed
+            clusters = np.unique(self._cluster_codes[changed])
+            rows = np.flatnonzero(self._alive & np.isin(self._cluster_codes, clusters))
+        else:
+            rows = changed[self._alive[changed]]
+        if len(rows) == 0:
+            return
+        
+        frame = pd.DataFrame({
+            'density': self._density(rows),
+            'cluster_id': self._cluster_codes[rows]
+        })
+        self._area_class[rows] = classify_sites(
+            frame,
+            mode=self.classification_mode,
+            thresholds=self.classification_thresholds
+        ).to_numpy()
+    
+    def _maybe_compact(self) -> None:
+        stored = len(self._alive)
+        live = int(self._alive.sum())
+        if live == 0:
+            return
+        if stored - live > MAX_DEAD_FRACTION * stored or stored - self._main_size > DELTA_MAX_FRACTION * self._main_size:
+            self._compact()
+    
+    def _compact(self) -> None:
+        """Drop tombstones and rebuild the main index over every live site."""
+        keep = np.flatnonzero(self._alive)
+        
+        self._frame = self._frame.iloc[keep].reset_index(drop=True)
+        for name in (
+            '_site_ids', '_lat', '_lon', '_cluster_codes', '_counts',
+            '_group_id', '_group_size', '_area_class'
+        ):
+            setattr(self, name, getattr(self, name)[keep])
+        
+        # Relabel components 0..k-1 and start a fresh union-find
+        codes, uniques = pd.factorize(self._components.roots()[self._labels[keep]])
+        self._labels = codes.astype(np.int64)
+        self._components = UnionFind(len(uniques))
+        
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._main = SpatialIndex(self._lat, self._lon)
+        self._main_size = len(keep)
+        self._delta = None
+        logger.info(f"Compacted dataset to {len(keep)} sites")
+
+
+class DatasetStore:
+    """
+    Registered datasets by ID.
+    
+    At most max_stored datasets are kept; the least recently used are
+    evicted first.
+    """
+    
+    def __init__(self, max_stored: int = DEFAULT_MAX_STORED_DATASETS):
+        """
+        Args:
+            max_stored: Maximum number of datasets kept in memory
+        """
+        self._max_stored = max_stored
+        self._datasets: 'OrderedDict[str, SiteDataset]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def add(self, dataset: SiteDataset) -> str:
+        """Store a dataset and return its new ID."""
+        dataset_id = uuid.uuid4().hex
+        with self._lock:
+            self._datasets[dataset_id] = dataset
+            while len(self._datasets) > self._max_stored:
+                evicted_id, _ = self._datasets.popitem(last=False)
+                logger.info(f"Evicted dataset {evicted_id}")
+        return dataset_id
+    
+    def get(self, dataset_id: str) -> Optional[SiteDataset]:
+        """Return the dataset with this ID, or None if unknown or evicted."""
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+        return dataset
@@ -0,0 +1,303 @@
+"""
+Worker pool, job queue and result store for analysis runs.
+CPU-bound pipeline runs go to a process pool (or a thread pool for small
+inputs) so the event loop stays responsive; finished results are kept in
+memory so they can be fetched any number of times without reprocessing.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# Defaults, overridable through the environment
+DEFAULT_PROCESS_WORKERS = int(os.environ.get('PIPELINE_PROCESS_WORKERS', str(os.cpu_count() or 1)))
+DEFAULT_THREAD_WORKERS = int(os.environ.get('PIPELINE_THREAD_WORKERS', '4'))
+DEFAULT_MAX_PENDING = int(os.environ.get('PIPELINE_MAX_PENDING', '16'))
+DEFAULT_PROCESS_MIN_ROWS = int(os.environ.get('PIPELINE_PROCESS_MIN_ROWS', '50000'))
+DEFAULT_MAX_STORED_JOBS = int(os.environ.get('JOB_MAX_STORED', '50'))
+DEFAULT_MAX_STORED_BYTES = int(os.environ.get('JOB_MAX_STORED_BYTES', str(1024 * 1024 * 1024)))
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the worker pool already has max_pending tasks."""
+
+
+class WorkerPool:
+    """
+    Bounded pool for CPU-bound pipeline runs.
+    
+    Inputs with at least process_min_rows rows run in a process pool so
+    they use separate cores; smaller inputs run in a thread pool to avoid
+    the cost of pickling data to another process. At most max_pending
+    tasks may be queued or running at once; further submissions raise
+    PoolSaturatedError instead of queueing without bound.
+    """
+    
+    def __init__(
+        self,
+        process_workers: int = DEFAULT_PROCESS_WORKERS,
+        thread_workers: int = DEFAULT_THREAD_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        process_min_rows: int = DEFAULT_PROCESS_MIN_ROWS
+    ):
+        """
+        Args:
+            process_workers: Worker processes (0 runs everything on threads)
+            thread_workers: Worker threads for small inputs
+            max_pending: Maximum number of queued or running tasks
+            process_min_rows: Row count from which tasks use the process pool
+        """
+        self.process_workers = process_workers
+        self.thread_workers = thread_workers
+        self.max_pending = max_pending
+        self.process_min_rows = process_min_rows
+        
+        self._thread_pool = ThreadPoolExecutor(
+            max_workers=thread_workers, thread_name_prefix='analysis-worker'
+        )
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        
+        # Submissions refused with PoolSaturatedError
+        self.rejected = 0
+    
+    @property
+    def pending(self) -> int:
+        """Number of tasks currently queued or running."""
+        return self._pending
+    
+    def submit(self, fn: Callable[..., Any], *args, rows: int = 0, **kwargs) -> Future:
+        """
+        Schedule fn(*args, **kwargs) and return its Future.
+        
+        Args:
+            fn: Picklable callable (module-level function)
+            rows: Input size, used to choose between processes and threads
+        
+        Raises:
+            PoolSaturatedError: If max_pending tasks are already in flight
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturatedError(
+                    f"Worker pool is saturated ({self._pending} tasks pending)"
+                )
+            self._pending += 1
+        
+        try:
+            future = self._executor_for(rows).submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool and retry once
+            logger.warning("Process pool is broken, restarting it")
+            broken, self._process_pool = self._process_pool, None
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+            try:
+                future = self._executor_for(rows).submit(fn, *args, **kwargs)
+            except BaseException:
+                self._release(None)
+                raise
+        except BaseException:
+            self._release(None)
+            raise
+        
+        future.add_done_callback(self._release)
+        return future
+    
+    async def run(self, fn: Callable[..., Any], *args, rows: int = 0, **kwargs) -> Any:
+        """Await fn(*args, **kwargs) on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, rows=rows, **kwargs))
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop all worker threads and processes."""
+        self._thread_pool.shutdown(wait=wait)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+    
+    def _executor_for(self, rows: int) -> Executor:
+        if self.process_workers <= 0 or rows < self.process_min_rows:
+            return self._thread_pool
+        if self._process_pool is None:
+            # spawn: forking a process that already runs threads is unsafe
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._process_pool
+    
+    def _release(self, _future: Optional[Future]) -> None:
+        with self._lock:
+            self._pending -= 1
+
+
+@dataclass
+class Job:
+    """State and result of a single analysis job."""
+    job_id: str
+    status: str = JOB_QUEUED
+    created_at: float = 0.0
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+    size: int = 0
+    
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+
+class JobManager:
+    """
+    Runs jobs on a WorkerPool and stores their results.
+    
+    At most max_stored_jobs jobs are retained, and finished results may
+    take at most max_stored_bytes (as measured by result_size); when either
+    limit is exceeded the oldest finished jobs are evicted first. The most
+    recently finished job is always kept, so its result can be fetched even
+    if it alone exceeds the byte budget.
+    """
+    
+    def __init__(
+        self,
+        pool: WorkerPool,
+        max_stored_jobs: int = DEFAULT_MAX_STORED_JOBS,
+        max_stored_bytes: int = DEFAULT_MAX_STORED_BYTES,
+        result_size: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            pool: Worker pool that runs the jobs
+            max_stored_jobs: Maximum number of jobs kept in the store
+            max_stored_bytes: Memory budget for stored results
+            result_size: Size of a result in bytes (default: results count as 0)
+        """
+        self._pool = pool
+        self._max_stored_jobs = max_stored_jobs
+        self._max_stored_bytes = max_stored_bytes
+        self._result_size = result_size
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def stored_bytes(self) -> int:
+        """Total size of the stored results."""
+        return self._bytes
+    
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        rows: int = 0,
+        on_result: Optional[Callable[[Any], None]] = None,
+        **kwargs
+    ) -> Job:
+        """
+        Queue fn(*args, **kwargs) on the pool and return its Job.
+        
+        The return value of fn becomes job.result; any exception marks the
+        job as failed with its message in job.error.
+        
+        Args:
+            rows: Input size, passed to the pool
+            on_result: Optional callback invoked with the result on success
+        
+        Raises:
+            PoolSaturatedError: If the pool cannot accept more work
+        """
+        job = Job(job_id=uuid.uuid4().hex, created_at=time.time())
+        job.future = self._pool.submit(fn, *args, rows=rows, **kwargs)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict()
+        job.future.add_done_callback(lambda future: self._finish(job, future, on_result))
+        return job
+    
+    def add_completed(self, result: Any) -> Job:
+        """Store an already computed result as a completed job."""
+        now = time.time()
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            status=JOB_COMPLETED,
+            created_at=now,
+            finished_at=now,
+            result=result,
+            size=self._size_of(result)
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._bytes += job.size
+            self._evict(keep=job)
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return the job with this ID, or None if unknown or evicted."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == JOB_QUEUED and job.future.running():
+                job.status = JOB_RUNNING
+        return job
+    
+    def _finish(
+        self,
+        job: Job,
+        future: Future,
+        on_result: Optional[Callable[[Any], None]]
+    ) -> None:
+        try:
+            result, error, status = future.result(), None, JOB_COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {str(e)}", exc_info=True)
+            result, error, status = None, str(e), JOB_FAILED
+        
+        if status == JOB_COMPLETED and on_result is not None:
+            try:
+                on_result(result)
+            except Exception as e:
+                logger.warning(f"Result callback for job {job.job_id} failed: {str(e)}")
+        
+        size = self._size_of(result)
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+            if job.job_id in self._jobs:
+                job.size = size
+                self._bytes += size
+                self._evict(keep=job)
+    
+    def _size_of(self, result: Any) -> int:
+        if result is None or self._result_size is None:
+            return 0
+        return int(self._result_size(result))
+    
+    def _evict(self, keep: Optional[Job] = None) -> None:
+        # Caller holds the lock; drop oldest finished jobs beyond either limit
+        finished = (j for j in list(self._jobs.values()) if j.done and j is not keep)
+        while len(self._jobs) > self._max_stored_jobs or self._bytes > self._max_stored_bytes:
+            job = next(finished, None)
+            if job is None:
+                return
+            del self._jobs[job.job_id]
+            self._bytes -= job.size
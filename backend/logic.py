@@ -3,19 +3,577 @@ Core business logic for site analysis.
 Pure functions for spatial analysis, density calculation, and classification.
 """
 
+import hashlib
+import json
 import logging
-from typing import List, Dict, Tuple, Optional
+import multiprocessing
+import pickle
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+from typing import Iterator, List, Dict, Tuple, Optional, Sequence, Union
 import pandas as pd
 import numpy as np
 from sklearn.neighbors import BallTree
-from scipy.sparse import csr_matrix
-from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
 
 logger = logging.getLogger(__name__)
 
 # Earth's radius in kilometers for Haversine distance
 EARTH_RADIUS_KM = 6371.0
 
+# Working-memory budget for radius queries that return distances; the
+# number of points per chunk is derived from the expected neighbor count
+QUERY_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+# Approximate working bytes per returned neighbor (index, distance and
+# bucketing temporaries)
+BYTES_PER_NEIGHBOR = 40
+
+# From this many radii, calculate_density buckets one distance query instead
+# of running one count-only query per radius. A distance query costs about
+# 3-4x a count-only query at the same radius, so for a few radii the
+# count-only queries on the shared tree are cheaper.
+SINGLE_QUERY_MIN_RADII = 8
+
+# Density engines: exact haversine BallTree counts, or approximate grid counts
+DENSITY_ENGINES = ('balltree', 'grid')
+
+# Grid cells per radius for the grid density engine (see grid_neighbor_counts)
+GRID_RESOLUTION = 4
+
+# Inputs smaller than this always use serial radius queries; below it the
+# cost of starting worker processes outweighs the parallel speedup
+PARALLEL_QUERY_MIN_ROWS = 200000
+
+# Spatial index engines: exact haversine BallTree, or planar KD-tree over a
+# local projection (see ProjectedIndex)
+SPATIAL_ENGINES = ('haversine', 'projected')
+
+# Largest relative distance error accepted by the projected engine before
+# falling back to haversine, and the widest longitude span it will project
+PROJECTED_MAX_DISTORTION = 0.005
+PROJECTED_MAX_LON_SPAN_DEG = 90.0
+
+# Columns every uploaded dataset must provide
+REQUIRED_COLUMNS = ['site_id', 'lat', 'lon', 'cluster_id']
+
+# Area classes from least to most dense
+AREA_CLASSES = ('Rural', 'Suburban', 'Urban', 'Dense')
+
+# Per-cluster percentiles separating the area classes in quantile mode
+QUANTILE_CUTS = (0.25, 0.50, 0.75)
+
+# Default density thresholds (sites per km²) for threshold mode
+DEFAULT_CLASSIFICATION_THRESHOLDS = {
+    'rural': 10.0,
+    'suburban': 50.0,
+    'urban': 200.0
+}
+
+
+@dataclass
+class StageTiming:
+    """Resource use of one pipeline stage."""
+    stage: str
+    wall_s: float
+    cpu_s: float
+    rows: int
+    peak_memory_bytes: Optional[int] = None
+
+
+class _MemoryTracing:
+    """
+    Process-wide reference count of profiles tracing memory.
+    
+    tracemalloc is global to the process, so concurrent profiles (e.g. jobs
+    on worker threads) share one tracing session: it is started by the
+    first profile and stopped by the last, unless something else started
+    it. Resetting the peak would corrupt the other profiles' stages, so
+    peaks are only measured while a single profile is tracing.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+        self._entries = 0
+        self._started = False
+    
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._users += 1
+            self._entries += 1
+    
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+    
+    def start_stage(self) -> Optional[Tuple[int, int]]:
+        """(entry count, traced memory) if this is the only tracing profile, else None."""
+        with self._lock:
+            if self._users != 1 or not tracemalloc.is_tracing():
+                return None
+            tracemalloc.reset_peak()
+            return self._entries, tracemalloc.get_traced_memory()[0]
+    
+    def stage_peak(self, started: Optional[Tuple[int, int]]) -> Optional[int]:
+        """Peak above the stage's start, or None if another profile traced meanwhile."""
+        if started is None:
+            return None
+        entries, start_memory = started
+        with self._lock:
+            if self._users != 1 or self._entries != entries or not tracemalloc.is_tracing():
+                return None
+            return max(tracemalloc.get_traced_memory()[1] - start_memory, 0)
+
+
+_memory_tracing = _MemoryTracing()
+
+
+class PipelineProfile:
+    """
+    Per-stage wall time, CPU time, row counts and peak memory of a pipeline run.
+    
+    Pass one to process_sites (or analyze_sites) and read .stages afterwards.
+    Each finished stage is also logged as a structured 'stage_timing' record.
+    
+    CPU time is process CPU time, so it includes any other threads running
+    in the same process. Peak memory is only measured when trace_memory is
+    set and the profile is used as a context manager (which starts
+    tracemalloc); it is the tracemalloc peak above the memory traced when
+    the stage started. tracemalloc is process-wide, so stages that overlap
+    another tracing profile in the same process report no peak. Tracing
+    slows the pipeline by roughly 30%.
+    
+    Attributes:
+        stages: StageTiming records in completion order
+        counts: Sizes measured along the way, e.g. 'co_location_edges'
+    """
+    
+    def __init__(self, trace_memory: bool = False):
+        """
+        Args:
+            trace_memory: Record per-stage peak memory with tracemalloc
+        """
+        self.trace_memory = trace_memory
+        self.stages: List[StageTiming] = []
+        self.counts: Dict[str, int] = {}
+        self._tracing = False
+    
+    def __enter__(self) -> 'PipelineProfile':
+        if self.trace_memory and not self._tracing:
+            _memory_tracing.acquire()
+            self._tracing = True
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        if self._tracing:
+            _memory_tracing.release()
+            self._tracing = False
+    
+    def count(self, name: str, value: int) -> None:
+        """Record a size measured during the run (summed if recorded repeatedly)."""
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+    
+    @contextmanager
+    def stage(self, name: str, rows: int) -> Iterator[None]:
+        """Measure the enclosed block as one stage over rows rows."""
+        started = _memory_tracing.start_stage() if self._tracing else None
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            peak_memory = _memory_tracing.stage_peak(started)
+            record = StageTiming(
+                stage=name,
+                wall_s=time.perf_counter() - start_wall,
+                cpu_s=time.process_time() - start_cpu,
+                rows=int(rows),
+                peak_memory_bytes=peak_memory
+            )
+            self.stages.append(record)
+            logger.info(
+                f"stage_timing {json.dumps(asdict(record))}",
+                extra={'stage_timing': asdict(record)}
+            )
+
+
+def _stage(profile: Optional[PipelineProfile], name: str, rows: int):
+    """profile.stage(name, rows), or a no-op context without a profile."""
+    if profile is None:
+        return nullcontext()
+    return profile.stage(name, rows)
+
+
+class SpatialIndex:
+    """
+    Haversine BallTree over a set of site coordinates.
+    
+    Built once per dataset and shared by every spatial stage of the
+    pipeline (density, co-location, ...), so coordinates are converted to
+    radians and the tree is constructed exactly once per run.
+    
+    Attributes:
+        coords_rad: (N, 2) array of [lat, lon] in radians
+        tree: BallTree with the haversine metric over coords_rad
+    """
+    
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        """
+        Args:
+            lat: Latitudes in degrees
+            lon: Longitudes in degrees
+        """
+        self.coords_rad = np.radians(
+            np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+        )
+        self.tree = BallTree(self.coords_rad, metric='haversine')
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'SpatialIndex':
+        """
+        Build an index from a DataFrame with 'lat' and 'lon' columns.
+        
+        Args:
+            df: DataFrame with 'lat' and 'lon' columns
+            
+        Returns:
+            SpatialIndex over the rows of df (in row order)
+        """
+        return cls(df['lat'].values, df['lon'].values)
+    
+    def __len__(self) -> int:
+        return len(self.coords_rad)
+    
+    def query_radius(
+        self,
+        radius_km: float,
+        count_only: bool = False,
+        return_distance: bool = False,
+        rows: Optional[np.ndarray] = None
+    ):
+        """
+        Query indexed points against the tree within a radius.
+        
+        Args:
+            radius_km: Search radius in kilometers
+            count_only: Return only neighbor counts (self included)
+            return_distance: Also return distances (in radians)
+            rows: Optional row positions to query (default: all points)
+            
+        Returns:
+            Result of BallTree.query_radius for the queried points
+        """
+        radius_rad = radius_km / EARTH_RADIUS_KM
+        query = self.coords_rad if rows is None else self.coords_rad[rows]
+        if count_only:
+            return self.tree.query_radius(query, r=radius_rad, count_only=True)
+        return self.tree.query_radius(
+            query, r=radius_rad, return_distance=return_distance
+        )
+    
+    def query_radius_pairs(
+        self,
+        radius_km: float,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Neighbors of indexed points within a radius, as flat pair arrays.
+        
+        Args:
+            radius_km: Search radius in kilometers
+            rows: Optional row positions to query (default: all points)
+            
+        Returns:
+            Tuple of (owner, neighbor, distance) arrays with one entry per
+            pair, self-pairs included, in no particular order: the position
+            of the queried point within rows, the neighbor's row and their
+            distance in radians
+        """
+        neighbors, distances = self.query_radius(radius_km, return_distance=True, rows=rows)
+        if len(neighbors) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        counts = np.fromiter((len(a) for a in neighbors), dtype=np.int64, count=len(neighbors))
+        owner = np.repeat(np.arange(len(neighbors)), counts)
+        return owner, np.concatenate(neighbors), np.concatenate(distances)
+    
+    def query_points(self, lat: np.ndarray, lon: np.ndarray, radius_km: float) -> np.ndarray:
+        """
+        Indexed points within a radius of arbitrary coordinates.
+        
+        Args:
+            lat: Query latitudes in degrees
+            lon: Query longitudes in degrees
+            radius_km: Search radius in kilometers
+            
+        Returns:
+            Object array of neighbor index arrays, one per query point
+        """
+        query = np.radians(
+            np.column_stack([np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)])
+        )
+        return self.tree.query_radius(query, r=radius_km / EARTH_RADIUS_KM)
+    
+    def neighbor_graph(self, radius_km: float, chunk_size: Optional[int] = None) -> csr_matrix:
+        """
+        Adjacency matrix of all site pairs within radius_km.
+        
+        Points are queried in chunks and only each chunk's upper-triangle
+        pairs are kept, so the per-point neighbor arrays (which hold every
+        edge twice plus self-pairs) never exist for all points at once.
+        
+        Args:
+            radius_km: Neighbor radius in kilometers
+            chunk_size: Points queried per chunk (default: from query_chunk_size)
+            
+        Returns:
+            (N, N) CSR matrix with one entry per undirected edge (i < j)
+        """
+        n = len(self)
+        if n == 0:
+            return csr_matrix((0, 0), dtype=np.int8)
+        if chunk_size is None:
+            chunk_size = query_chunk_size(self, radius_km)
+        
+        row_parts, col_parts = [], []
+        for start in range(0, n, chunk_size):
+            chunk = np.arange(start, min(start + chunk_size, n), dtype=np.int32)
+            rows, cols = _upper_pairs(self.query_radius(radius_km, rows=chunk), chunk)
+            row_parts.append(rows)
+            col_parts.append(cols)
+        
+        rows = np.concatenate(row_parts)
+        cols = np.concatenate(col_parts)
+        data = np.ones(len(rows), dtype=np.int8)
+        return coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+
+
+class ProjectedIndex(SpatialIndex):
+    """
+    Euclidean KD-tree over a local planar projection of the sites.
+    
+    Sites are projected with a local equirectangular projection around the
+    middle of their latitude range: north-south distances are exact and
+    east-west distances are scaled by cos(lat0) / cos(lat). For regionally
+    compact datasets this scale error is tiny and Euclidean cKDTree queries
+    are much cheaper than haversine BallTree queries. Use
+    build_spatial_index to fall back to the haversine index when the
+    distortion is too large.
+    
+    Distances returned by query_radius are in radians (km / Earth radius),
+    matching SpatialIndex.
+    
+    Attributes:
+        xy: (N, 2) array of projected coordinates in kilometers
+        tree: cKDTree over xy
+        distortion: Maximum relative east-west scale error over the sites
+    """
+    
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        """
+        Args:
+            lat: Latitudes in degrees
+            lon: Longitudes in degrees
+        """
+        lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+        lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+        self.lat0, self.lon0 = self._projection_center(lat_rad, lon_rad)
+        
+        self.xy = self._project(lat_rad, lon_rad)
+        self.tree = cKDTree(self.xy)
+        self.distortion = projection_distortion(lat, lon)
+    
+    @staticmethod
+    def _projection_center(lat_rad: np.ndarray, lon_rad: np.ndarray) -> Tuple[float, float]:
+        if len(lat_rad) == 0:
+            return 0.0, 0.0
+        return (lat_rad.min() + lat_rad.max()) / 2, float(np.median(lon_rad))
+    
+    def _project(self, lat_rad: np.ndarray, lon_rad: np.ndarray) -> np.ndarray:
+        dlon = (lon_rad - self.lon0 + np.pi) % (2 * np.pi) - np.pi
+        return EARTH_RADIUS_KM * np.column_stack([dlon * np.cos(self.lat0), lat_rad - self.lat0])
+    
+    def __len__(self) -> int:
+        return len(self.xy)
+    
+    def query_radius(
+        self,
+        radius_km: float,
+        count_only: bool = False,
+        return_distance: bool = False,
+        rows: Optional[np.ndarray] = None
+    ):
+        """
+        Query indexed points within a radius (same contract as SpatialIndex).
+        """
+        query = self.xy if rows is None else self.xy[rows]
+        if count_only:
+            return self.tree.query_ball_point(query, r=radius_km, return_length=True)
+        
+        # Group the flat pairs by queried point, neighbors ascending
+        owner, neighbor, distance = self.query_radius_pairs(radius_km, rows)
+        order = np.lexsort((neighbor, owner))
+        splits = np.cumsum(np.bincount(owner, minlength=len(query)))[:-1]
+        neighbors = np.empty(len(query), dtype=object)
+        neighbors[:] = np.split(neighbor[order], splits) if len(query) else []
+        if not return_distance:
+            return neighbors
+        
+        distances = np.empty(len(query), dtype=object)
+        distances[:] = np.split(distance[order], splits) if len(query) else []
+        return neighbors, distances
+    
+    def query_radius_pairs(
+        self,
+        radius_km: float,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Flat neighbor pairs within a radius (same contract as SpatialIndex).
+        
+        A single sparse_distance_matrix call between a tree over the queried
+        points and the index tree yields every pair with its distance, with
+        no per-point Python objects.
+        """
+        query_tree = self.tree if rows is None else cKDTree(self.xy[rows])
+        pairs = query_tree.sparse_distance_matrix(self.tree, radius_km, output_type='ndarray')
+        return pairs['i'], pairs['j'], pairs['v'] / EARTH_RADIUS_KM
+    
+    def query_points(self, lat: np.ndarray, lon: np.ndarray, radius_km: float) -> np.ndarray:
+        """
+        Indexed points within a radius of arbitrary coordinates (same contract as SpatialIndex).
+        """
+        query = self._project(
+            np.radians(np.asarray(lat, dtype=np.float64)),
+            np.radians(np.asarray(lon, dtype=np.float64))
+        )
+        neighbors = np.empty(len(query), dtype=object)
+        neighbors[:] = [
+            np.asarray(ids, dtype=np.intp) for ids in self.tree.query_ball_point(query, r=radius_km)
+        ]
+        return neighbors
+    
+    def neighbor_graph(self, radius_km: float, chunk_size: Optional[int] = None) -> csr_matrix:
+        """
+        Adjacency matrix of all site pairs within radius_km.
+        
+        cKDTree.query_pairs already yields each pair once with i < j, so no
+        per-point neighbor arrays are materialized and chunk_size is unused.
+        """
+        n = len(self)
+        pairs = self.tree.query_pairs(radius_km, output_type='ndarray').astype(np.int32)
+        data = np.ones(len(pairs), dtype=np.int8)
+        return coo_matrix((data, (pairs[:, 0], pairs[:, 1])), shape=(n, n)).tocsr()
+
+
+def projection_distortion(lat: np.ndarray, lon: np.ndarray) -> float:
+    """
+    Maximum relative distance error of ProjectedIndex's projection for a dataset.
+    
+    The local equirectangular projection is exact north-south; east-west it
+    uses the scale at the middle latitude lat0, so the error at latitude lat
+    is |cos(lat0) / cos(lat) - 1|. Datasets spanning more than
+    PROJECTED_MAX_LON_SPAN_DEG of longitude are treated as unprojectable
+    (infinite distortion), since the cut opposite the central meridian
+    would split neighbors.
+    
+    Args:
+        lat: Latitudes in degrees
+        lon: Longitudes in degrees
+        
+    Returns:
+        Maximum relative scale error (0.01 = 1%)
+    """
+    if len(lat) == 0:
+        return 0.0
+    
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    
+    dlon = (lon_rad - np.median(lon_rad) + np.pi) % (2 * np.pi) - np.pi
+    if np.degrees(dlon.max() - dlon.min()) > PROJECTED_MAX_LON_SPAN_DEG:
+        return float('inf')
+    
+    lat0 = (lat_rad.min() + lat_rad.max()) / 2
+    cos_lat = np.cos(lat_rad)
+    if cos_lat.min() <= 0:
+        return float('inf')
+    return float(np.abs(np.cos(lat0) / cos_lat - 1).max())
+
+
+def build_spatial_index(
+    df: pd.DataFrame,
+    engine: str = 'haversine',
+    max_distortion: float = PROJECTED_MAX_DISTORTION
+) -> SpatialIndex:
+    """
+    Build the spatial index for a dataset with the requested engine.
+    
+    The 'projected' engine falls back to the haversine index when the
+    dataset's projection distortion exceeds max_distortion.
+    
+    Args:
+        df: DataFrame with 'lat' and 'lon' columns
+        engine: 'haversine' (BallTree, default) or 'projected' (planar KD-tree)
+        max_distortion: Largest acceptable relative distance error
+        
+    Returns:
+        SpatialIndex (a ProjectedIndex when the projected engine applies)
+    """
+    if engine not in SPATIAL_ENGINES:
+        raise ValueError(f"Invalid spatial engine: {engine}. Must be one of {SPATIAL_ENGINES}")
+    
+    if engine == 'projected':
+        distortion = projection_distortion(df['lat'].values, df['lon'].values)
+        if distortion <= max_distortion:
+            return ProjectedIndex.from_dataframe(df)
+        logger.info(
+            f"Projection distortion {distortion:.3%} exceeds {max_distortion:.3%}; "
+            f"using haversine index"
+        )
+    
+    return SpatialIndex.from_dataframe(df)
+
+
+def _resolve_index(df: pd.DataFrame, index: Optional[SpatialIndex]) -> SpatialIndex:
+    """Return the given index after checking it matches df, or build one."""
+    if index is None:
+        return SpatialIndex.from_dataframe(df)
+    if len(index) != len(df):
+        raise ValueError(
+            f"Spatial index has {len(index)} points but DataFrame has {len(df)} rows"
+        )
+    return index
+
+
+def _as_str_values(series: pd.Series) -> Tuple[np.ndarray, type, bool]:
+    """
+    Values of a column as Python strings (object array), converting only if needed.
+    
+    Returns:
+        Tuple of (values, object dtype, whether values is a new array rather
+        than the column's own)
+    """
+    values = series.to_numpy()
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        # A categorical column (as read by the Arrow CSV reader) is expanded
+        # into a new array by to_numpy
+        return values, object, isinstance(series.dtype, pd.CategoricalDtype)
+    return series.astype(str).to_numpy(), object, True
+
 
 def validate_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     """
@@ -23,6 +581,13 @@ def validate_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     
     Required columns: site_id, lat, lon, cluster_id
     
+    All checks build one row mask in a single vectorized pass; each
+    coordinate column is parsed once and the output is the only copy made.
+    Each check only counts rows that passed the earlier ones (missing
+    values, non-numeric lat, non-numeric lon, then coordinate ranges).
+    lat and lon come back as float64, site_id and cluster_id as str, and
+    other columns unchanged after the required ones.
+    
     Args:
         df: Input DataFrame
         
@@ -30,7 +595,7 @@ def validate_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
         Tuple of (cleaned DataFrame, list of error messages)
     """
     errors = []
-    required_columns = ['site_id', 'lat', 'lon', 'cluster_id']
+    required_columns = REQUIRED_COLUMNS
     
     # Check for required columns
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -40,40 +605,59 @@ def validate_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
     
     initial_count = len(df)
     
-    # Drop rows with missing values in required columns
-    df_clean = df[required_columns].copy()
-    df_clean = df_clean.dropna(subset=required_columns)
+    # Rows with missing values in required columns
+    keep = np.ones(initial_count, dtype=bool)
+    for col in required_columns:
+        keep &= ~df[col].isna().to_numpy()
     
-    # Validate numeric types first
+    # Parse coordinates once; unparseable values become NaN
+    coords = {}
     for col in ['lat', 'lon']:
-        non_numeric = pd.to_numeric(df_clean[col], errors='coerce').isna()
-        if non_numeric.any():
-            invalid_count = non_numeric.sum()
+        parsed = pd.to_numeric(df[col], errors='coerce')
+        if isinstance(parsed.dtype, pd.api.extensions.ExtensionDtype):
+            values = parsed.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            values = parsed.to_numpy(dtype=np.float64)
+        non_numeric = keep & np.isnan(values)
+        invalid_count = int(non_numeric.sum())
+        if invalid_count:
             errors.append(f"Dropped {invalid_count} rows with non-numeric {col}")
-            df_clean = df_clean[~non_numeric]
-    
-    # Convert to proper types
-    df_clean['lat'] = pd.to_numeric(df_clean['lat'])
-    df_clean['lon'] = pd.to_numeric(df_clean['lon'])
-    df_clean['site_id'] = df_clean['site_id'].astype(str)
-    df_clean['cluster_id'] = df_clean['cluster_id'].astype(str)
+            keep &= ~non_numeric
+        coords[col] = values
     
     # Validate lat/lon ranges
-    invalid_lat = (df_clean['lat'] < -90) | (df_clean['lat'] > 90)
-    invalid_lon = (df_clean['lon'] < -180) | (df_clean['lon'] > 180)
-    invalid_coords = invalid_lat | invalid_lon
-    
-    if invalid_coords.any():
-        invalid_count = invalid_coords.sum()
+    lat, lon = coords['lat'], coords['lon']
+    invalid_coords = keep & ((lat < -90) | (lat > 90) | (lon < -180) | (lon > 180))
+    invalid_count = int(invalid_coords.sum())
+    if invalid_count:
         errors.append(f"Dropped {invalid_count} rows with invalid coordinates")
-        df_clean = df_clean[~invalid_coords]
+        keep &= ~invalid_coords
     
-    # Restore other columns if they exist
-    other_columns = [col for col in df.columns if col not in required_columns]
-    if other_columns:
-        # Reindex to match original indices
-        df_other = df[other_columns].loc[df_clean.index]
-        df_clean = pd.concat([df_clean, df_other], axis=1)
+    # Build the output in one copy: kept rows of every column, required
+    # columns first, other columns after them. Arrays created above are
+    # used as they are when no rows were dropped.
+    rows = None if keep.all() else np.flatnonzero(keep)
+    index = df.index if rows is None else df.index[rows]
+    
+    def column(values, dtype, fresh=False) -> pd.Series:
+        if rows is None:
+            values = values if fresh else values.copy()
+        else:
+            values = values[rows]
+        # An explicit dtype skips pandas' type inference on object columns,
+        # which allocates several temporary arrays per column
+        return pd.Series(values, index=index, dtype=dtype, copy=False)
+    
+    columns = {
+        'site_id': column(*_as_str_values(df['site_id'])),
+        'lat': column(lat, np.float64, fresh=df['lat'].dtype != np.float64),
+        'lon': column(lon, np.float64, fresh=df['lon'].dtype != np.float64),
+        'cluster_id': column(*_as_str_values(df['cluster_id']))
+    }
+    for col in df.columns:
+        if col not in required_columns:
+            columns[col] = column(df[col].array, df[col].dtype)
+    df_clean = pd.DataFrame(columns, copy=False)
     
     dropped_count = initial_count - len(df_clean)
     if dropped_count > 0:
@@ -120,49 +704,463 @@ def haversine_distance(
     return distance
 
 
+# Index unpickled from shared memory in each radius-query worker process
+_worker_index: Optional[SpatialIndex] = None
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+
+
+def _init_query_worker(shm_name: str, payload_size: int, buffer_spans: List[Tuple[int, int]]) -> None:
+    """Attach to the shared index and rebuild it with zero-copy array buffers."""
+    global _worker_index, _worker_shm
+    # Keep the segment open for the worker's lifetime; the index's arrays are views into it
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    buf = _worker_shm.buf
+    buffers = [buf[start:start + size] for start, size in buffer_spans]
+    _worker_index = pickle.loads(buf[:payload_size], buffers=buffers)
+
+
+def _count_chunk(radius_km: float, start: int, stop: int) -> np.ndarray:
+    """Neighbor counts for rows [start, stop) of the worker's shared index."""
+    return _worker_index.query_radius(
+        radius_km, count_only=True, rows=np.arange(start, stop)
+    )
+
+
+def parallel_neighbor_counts(
+    index: SpatialIndex,
+    radii_km: Sequence[float],
+    workers: int,
+    chunk_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Count neighbors (self included) for several radii across a process pool.
+    
+    The index is pickled once (protocol 5, with its coordinate and tree
+    arrays out-of-band) into a single shared-memory block. Each worker
+    rebuilds it from views into that block in its initializer, so neither
+    the coordinates nor the tree are copied per chunk; tasks only carry
+    (radius, start, stop). Results are identical to the serial
+    index.query_radius(..., count_only=True).
+    
+    Args:
+        index: SpatialIndex (or ProjectedIndex) over the sites
+        radii_km: Radii in kilometers
+        workers: Number of worker processes
+        chunk_size: Points per task (default: about 4 tasks per worker)
+        
+    Returns:
+        (N, len(radii_km)) int64 array of counts
+    """
+    n = len(index)
+    radii_km = list(radii_km)
+    if chunk_size is None:
+        chunk_size = max(1, -(-n // (workers * 4)))
+    
+    buffers = []
+    payload = pickle.dumps(index, protocol=5, buffer_callback=buffers.append)
+    payload_size = len(payload)
+    raws = [b.raw() for b in buffers]
+    
+    # Lay out [payload | buffer | buffer ...] with 64-byte aligned buffers
+    spans = []
+    offset = payload_size
+    for raw in raws:
+        offset = -(-offset // 64) * 64
+        spans.append((offset, raw.nbytes))
+        offset += raw.nbytes
+    
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        shm.buf[:payload_size] = payload
+        for (start, size), raw in zip(spans, raws):
+            shm.buf[start:start + size] = raw
+        del payload, buffers, raws
+        
+        counts = np.zeros((n, len(radii_km)), dtype=np.int64)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_query_worker,
+            initargs=(shm.name, payload_size, spans)
+        ) as pool:
+            tasks = {
+                pool.submit(_count_chunk, radius, start, min(start + chunk_size, n)): (k, start)
+                for k, radius in enumerate(radii_km)
+                for start in range(0, n, chunk_size)
+            }
+            for future, (k, start) in tasks.items():
+                chunk_counts = future.result()
+                counts[start:start + len(chunk_counts), k] = chunk_counts
+        return counts
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def density_column(radius_km: float) -> str:
+    """Column name for density at a given radius, e.g. 'density_0.5km'."""
+    return f"density_{radius_km:g}km"
+
+
+def query_chunk_size(
+    index: SpatialIndex,
+    radius_km: float,
+    budget_bytes: int = QUERY_MEMORY_BUDGET_BYTES
+) -> int:
+    """
+    Number of points to query per chunk so neighbor arrays fit a memory budget.
+    
+    Args:
+        index: SpatialIndex over the sites
+        radius_km: Query radius in kilometers
+        budget_bytes: Working-memory budget per chunk
+        
+    Returns:
+        Points per chunk (at least 1)
+    """
+    n = len(index)
+    if n == 0:
+        return 1
+    mean_neighbors = 2 * estimate_edge_count(index, radius_km, sample_size=2000) / n + 1
+    return int(max(1, min(n, budget_bytes // (mean_neighbors * BYTES_PER_NEIGHBOR))))
+
+
+def count_neighbors_multi_radius(
+    index: SpatialIndex,
+    radii_km: Sequence[float],
+    chunk_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Count neighbors (self included) within several radii in one tree query.
+    
+    Each point is queried once at the largest radius with distances, and
+    every neighbor is bucketed by the smallest radius that contains it; a
+    cumulative sum over the buckets then gives the count for every radius.
+    Points are processed in chunks to bound the size of the distance arrays.
+    
+    Args:
+        index: SpatialIndex over the sites
+        radii_km: Radii in kilometers (any order)
+        chunk_size: Points queried per chunk (default: from query_chunk_size)
+        
+    Returns:
+        (N, len(radii_km)) int64 array of counts, columns in radii_km order
+    """
+    radii_km = np.asarray(radii_km, dtype=np.float64)
+    order = np.argsort(radii_km)
+    sorted_radii_rad = radii_km[order] / EARTH_RADIUS_KM
+    n = len(index)
+    k = len(radii_km)
+    
+    if chunk_size is None:
+        chunk_size = query_chunk_size(index, radii_km.max())
+    
+    counts = np.zeros((n, k), dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, n))
+        owner, _, distance = index.query_radius_pairs(radii_km.max(), rows=rows)
+        
+        # Smallest radius containing each neighbor (distance <= radius)
+        bucket = np.searchsorted(sorted_radii_rad, distance, side='left')
+        per_bucket = np.bincount(owner * k + bucket, minlength=len(rows) * k)
+        counts[rows[:, None], order[None, :]] = per_bucket.reshape(len(rows), k).cumsum(axis=1)
+    
+    return counts
+
+
+def grid_neighbor_counts(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    radius_km: float,
+    resolution: int = GRID_RESOLUTION
+) -> np.ndarray:
+    """
+    Approximate neighbor counts (self excluded) by binning sites into a grid.
+    
+    Sites are projected with an equal-area sinusoidal projection centred on
+    the data's median longitude and binned into square cells of side
+    s = radius_km / resolution. For each occupied cell, the counts of all
+    cells whose centres lie within radius_km of its centre (a disk-shaped
+    stencil of cell offsets) are summed with vectorized hash lookups, so
+    the cost is O(N log N) and independent of how many neighbors each
+    site has.
+    
+    Error bound: a site and its cell centre are at most s·√2/2 apart, so
+    the centre-to-centre distance of two sites differs from theirs by at
+    most √2·s, and a neighbor can only be misclassified if its distance lies
+    within radius_km ± √2·s (about ±0.35·radius_km at the default
+    resolution of 4).
+    The raw stencil count therefore differs from the exact count by at most
+    the number of sites in that annulus. The returned count is rescaled by
+    π·resolution² / |stencil| (about 1.03 at resolution 4), which removes
+    the stencil's area bias for locally uniform density. Projection
+    distortion is small for regional data, but grows for sites far from the
+    median meridian at high latitudes and across the antimeridian.
+    
+    Args:
+        lat: Latitudes in degrees
+        lon: Longitudes in degrees
+        radius_km: Neighbor radius in kilometers
+        resolution: Grid cells per radius; higher is tighter but slower
+        
+    Returns:
+        Float array of approximate neighbor counts
+    """
+    n = len(lat)
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    
+    # Sinusoidal (equal-area) projection around the median meridian
+    dlon = (lon_rad - np.median(lon_rad) + np.pi) % (2 * np.pi) - np.pi
+    x = EARTH_RADIUS_KM * dlon * np.cos(lat_rad)
+    y = EARTH_RADIUS_KM * lat_rad
+    
+    cell_km = radius_km / resolution
+    ix = np.floor(x / cell_km).astype(np.int64)
+    iy = np.floor(y / cell_km).astype(np.int64)
+    ix -= ix.min()
+    iy -= iy.min()
+    
+    # Pad by the stencil reach so row offsets never wrap into another column
+    k = resolution
+    width = int(iy.max()) + 2 * k + 1
+    keys = (ix + k) * width + (iy + k)
+    cell_keys, point_cell, cell_counts = np.unique(
+        keys, return_inverse=True, return_counts=True
+    )
+    
+    # Cell offsets whose centres are within the radius
+    offsets = [
+        (dx, dy)
+        for dx in range(-k, k + 1)
+        for dy in range(-k, k + 1)
+        if dx * dx + dy * dy <= k * k
+    ]
+    
+    totals = np.zeros(len(cell_keys), dtype=np.int64)
+    last = len(cell_keys) - 1
+    for dx, dy in offsets:
+        target = cell_keys + (dx * width + dy)
+        pos = np.minimum(np.searchsorted(cell_keys, target), last)
+        hit = cell_keys[pos] == target
+        totals += np.where(hit, cell_counts[pos], 0)
+    
+    area_correction = np.pi * k * k / len(offsets)
+    return (totals[point_cell] - 1) * area_correction
+
+
 def calculate_density(
     df: pd.DataFrame,
-    radius_km: float = 2.0
-) -> pd.Series:
+    radius_km: Union[float, Sequence[float]] = 2.0,
+    index: Optional[SpatialIndex] = None,
+    engine: str = 'balltree',
+    query_workers: int = 1
+) -> Union[pd.Series, pd.DataFrame]:
     """
     Calculate site density using spatial indexing.
     
     Density = (number of neighbors within radius) / (π * radius²)
     Excludes self from neighbor count.
     
+    Several radii can be evaluated at once against the same tree. For many
+    radii (SINGLE_QUERY_MIN_RADII or more) this runs a single distance query
+    at the largest radius and buckets the results (see
+    count_neighbors_multi_radius), so the cost does not grow with the number
+    of radii; for a few radii one count-only query per radius is cheaper.
+    
+    The 'grid' engine replaces exact counts with fast approximate ones for
+    exploratory runs over very large datasets (see grid_neighbor_counts for
+    its error bound); it does not use the spatial index.
+    
+    With query_workers > 1 and at least PARALLEL_QUERY_MIN_ROWS sites, the
+    count queries are split into chunks across worker processes that share
+    the index through shared memory (see parallel_neighbor_counts).
+    
     Args:
         df: DataFrame with 'lat' and 'lon' columns
-        radius_km: Search radius in kilometers (default 2.0)
+        radius_km: Search radius in kilometers (default 2.0), or a list of radii
+        index: Optional prebuilt SpatialIndex over df (built if omitted)
+        engine: 'balltree' (exact, default) or 'grid' (approximate)
+        query_workers: Worker processes for exact radius queries (1 = serial)
         
     Returns:
-        Series with density values (sites per km²)
+        Series with density values (sites per km²) for a single radius, or a
+        DataFrame with one density_column(r) column per radius for a list
     """
+    multi = not np.isscalar(radius_km)
+    radii = list(radius_km) if multi else [radius_km]
+    
     if len(df) == 0:
+        if multi:
+            return pd.DataFrame(columns=[density_column(r) for r in radii], dtype=float)
         return pd.Series(dtype=float)
     
-    # Convert lat/lon to radians for BallTree
-    coords_rad = np.radians(df[['lat', 'lon']].values)
+    if engine not in DENSITY_ENGINES:
+        raise ValueError(f"Invalid density engine: {engine}. Must be one of {DENSITY_ENGINES}")
     
-    # Create BallTree with Haversine metric
-    tree = BallTree(coords_rad, metric='haversine')
-    
-    # Query all points within radius (in radians)
-    radius_rad = radius_km / EARTH_RADIUS_KM
-    neighbor_counts = tree.query_radius(coords_rad, r=radius_rad, count_only=True)
+    if engine == 'grid':
+        lat = df['lat'].values
+        lon = df['lon'].values
+        # Grid counts already exclude self; add it back for the shared step below
+        neighbor_counts = np.column_stack([
+            grid_neighbor_counts(lat, lon, r) + 1 for r in radii
+        ])
+    elif query_workers > 1 and len(df) >= PARALLEL_QUERY_MIN_ROWS:
+        index = _resolve_index(df, index)
+        neighbor_counts = parallel_neighbor_counts(index, radii, query_workers)
+    elif len(radii) >= SINGLE_QUERY_MIN_RADII:
+        index = _resolve_index(df, index)
+        neighbor_counts = count_neighbors_multi_radius(index, radii)
+    elif multi:
+        index = _resolve_index(df, index)
+        neighbor_counts = np.column_stack([
+            index.query_radius(r, count_only=True) for r in radii
+        ])
+    else:
+        index = _resolve_index(df, index)
+        # Query all points within radius
+        neighbor_counts = index.query_radius(radius_km, count_only=True)[:, None]
     
     # Exclude self from count
     neighbor_counts = neighbor_counts - 1
     
     # Calculate density: neighbors / (π * radius²)
-    area_km2 = np.pi * (radius_km ** 2)
+    area_km2 = np.pi * np.asarray(radii, dtype=np.float64) ** 2
     density = neighbor_counts / area_km2
     
-    return pd.Series(density, index=df.index, name='density')
+    if multi:
+        return pd.DataFrame(
+            density, index=df.index, columns=[density_column(r) for r in radii]
+        )
+    return pd.Series(density[:, 0], index=df.index, name='density')
+
+
+def estimate_edge_count(
+    index: SpatialIndex,
+    radius_km: float,
+    sample_size: int = 10000
+) -> int:
+    """
+    Estimate the number of undirected edges in the neighbor graph.
+    
+    Counts neighbors for an evenly strided sample of points (all points when
+    the dataset is small) and extrapolates, so memory for the graph can be
+    predicted before any neighbor arrays are materialized.
+    
+    Args:
+        index: SpatialIndex over the sites
+        radius_km: Neighbor radius in kilometers
+        sample_size: Maximum number of points to query
+        
+    Returns:
+        Estimated number of undirected edges (self-pairs excluded)
+    """
+    n = len(index)
+    if n == 0:
+        return 0
+    
+    if n <= sample_size:
+        rows = None
+        scale = 1.0
+    else:
+        rows = np.linspace(0, n - 1, sample_size).astype(np.int64)
+        scale = n / sample_size
+    
+    counts = index.query_radius(radius_km, count_only=True, rows=rows)
+    directed_edges = (counts - 1).sum() * scale
+    return int(round(directed_edges / 2))
+
+
+def _upper_pairs(neighbors: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    int32 (row, col) pairs with row < col from the neighbor arrays of rows.
+    
+    query_radius is symmetric, so the upper triangle holds every edge once
+    and drops self-pairs.
+    """
+    counts = np.fromiter((len(a) for a in neighbors), dtype=np.int64, count=len(rows))
+    cols = np.concatenate(neighbors).astype(np.int32, copy=False) if len(rows) else np.empty(0, dtype=np.int32)
+    rows = np.repeat(rows.astype(np.int32, copy=False), counts)
+    upper = rows < cols
+    return rows[upper], cols[upper]
+
+
+def build_neighbor_graph(neighbors: np.ndarray, n: int) -> csr_matrix:
+    """
+    Build a sparse adjacency matrix from query_radius neighbor arrays.
+    
+    Fully vectorized: the neighbor arrays are flattened into int32 COO
+    arrays and only the upper triangle (i < j) is kept, which drops
+    self-pairs and stores each undirected edge once.
+    
+    Args:
+        neighbors: Object array of neighbor index arrays (one per point)
+        n: Number of points
+        
+    Returns:
+        (n, n) CSR matrix with one entry per undirected edge
+    """
+    if n == 0:
+        return csr_matrix((0, 0), dtype=np.int8)
+    
+    rows, cols = _upper_pairs(neighbors, np.arange(n, dtype=np.int32))
+    data = np.ones(len(rows), dtype=np.int8)
+    return coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+
+
+def component_group_ids(
+    site_ids: np.ndarray,
+    labels: np.ndarray,
+    n_components: int
+) -> np.ndarray:
+    """
+    Compute a deterministic group_id for every site from component labels.
+    
+    The ID is a BLAKE2b digest of the component's sorted member site_ids, so
+    the same members always give the same ID regardless of row order, worker
+    process or interpreter restart (unlike the salted built-in hash()).
+    Members are gathered with one sort over (label, site_id).
+    
+    Args:
+        site_ids: Array of site_id strings
+        labels: Component label per site (0..n_components-1)
+        n_components: Number of components
+        
+    Returns:
+        Object array with the group_id of each site
+    """
+    n = len(labels)
+    if n == 0:
+        return np.empty(0, dtype=object)
+    
+    # Rank site_ids so the sort is over integers, then order by (label, site_id)
+    id_codes, _ = pd.factorize(site_ids, sort=True)
+    order = np.lexsort((id_codes, labels))
+    sorted_labels = labels[order]
+    sorted_ids = site_ids[order].tolist()
+    
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    ends = np.r_[starts[1:], n]
+    
+    digests = np.empty(n_components, dtype=object)
+    digests[sorted_labels[starts]] = [
+        hashlib.blake2b(
+            '\x00'.join(sorted_ids[start:end]).encode('utf-8'), digest_size=8
+        ).hexdigest()
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+    
+    return digests[labels]
 
 
 def find_co_location_groups(
     df: pd.DataFrame,
-    threshold_m: float = 100.0
+    threshold_m: float = 100.0,
+    index: Optional[SpatialIndex] = None,
+    profile: Optional[PipelineProfile] = None
 ) -> Tuple[pd.Series, pd.Series]:
     """
     Find co-location groups using graph-based connected components.
@@ -174,6 +1172,9 @@ def find_co_location_groups(
     Args:
         df: DataFrame with 'lat' and 'lon' columns
         threshold_m: Distance threshold in meters (default 100.0)
+        index: Optional prebuilt SpatialIndex over df (built if omitted)
+        profile: Optional PipelineProfile to record the graph, component
+                 and group ID stages in
         
     Returns:
         Series with group_id (deterministic hash of sorted member IDs)
@@ -183,71 +1184,313 @@ def find_co_location_groups(
     
     threshold_km = threshold_m / 1000.0
     
-    # Convert lat/lon to radians for BallTree
-    coords_rad = np.radians(df[['lat', 'lon']].values)
-    
-    # Create BallTree
-    tree = BallTree(coords_rad, metric='haversine')
-    
-    # Query all points within threshold
-    threshold_rad = threshold_km / EARTH_RADIUS_KM
-    neighbors = tree.query_radius(coords_rad, r=threshold_rad)
-    
-    # Build sparse adjacency matrix for efficient connected components
+    index = _resolve_index(df, index)
     n = len(df)
-    row_indices = []
-    col_indices = []
-    
-    for i, neighbor_indices in enumerate(neighbors):
-        for j in neighbor_indices:
-            if i != j:  # Exclude self
-                row_indices.append(i)
-                col_indices.append(j)
-    
-    # Create sparse CSR matrix (symmetric, undirected graph)
-    if len(row_indices) > 0:
-        # Add symmetric edges (undirected graph) - use 1.0 for edge weights
-        all_rows = row_indices + col_indices
-        all_cols = col_indices + row_indices
-        adjacency = csr_matrix((np.ones(len(all_rows), dtype=np.float64), (all_rows, all_cols)), shape=(n, n))
-    else:
-        # No edges, each node is its own component
-        adjacency = csr_matrix((n, n), dtype=np.float64)
+    
+    with _stage(profile, 'co_location_graph', n):
+        # Build sparse adjacency matrix of all pairs within threshold, querying
+        # in chunks sized to QUERY_MEMORY_BUDGET_BYTES
+        adjacency = index.neighbor_graph(threshold_km)
+        graph_bytes = adjacency.data.nbytes + adjacency.indices.nbytes + adjacency.indptr.nbytes
+        logger.info(f"Co-location graph: {adjacency.nnz} edges ({graph_bytes / 1e6:.1f} MB)")
+        if profile is not None:
+            profile.count('co_location_edges', adjacency.nnz)
     
     # Find connected components using scipy (fast and non-recursive)
-    n_components, labels = connected_components(csgraph=adjacency, directed=False, return_labels=True)
-    
-    # Group nodes by component label
-    components = {}
-    for i, label in enumerate(labels):
-        if label not in components:
-            components[label] = []
-        components[label].append(i)
-    
-    # Create group_id as deterministic hash of sorted member site_ids
-    group_ids = {}
-    for label, component_indices in components.items():
-        # Get site_ids for this component
-        component_site_ids = sorted([df.iloc[i]['site_id'] for i in component_indices])
-        # Create deterministic hash (using hash of sorted tuple)
-        group_id = str(hash(tuple(component_site_ids)))
-        for i in component_indices:
-            group_ids[i] = group_id
+    with _stage(profile, 'connected_components', n):
+        n_components, labels = connected_components(csgraph=adjacency, directed=False, return_labels=True)
+    
+    # Create group_id as a stable content hash of sorted member site_ids
+    with _stage(profile, 'group_ids', n):
+        site_ids = df['site_id'].astype(str).to_numpy()
+        group_ids = component_group_ids(site_ids, labels, n_components)
     
     # Create Series with group_id and group_size
-    group_id_series = pd.Series(
-        [group_ids.get(i, '') for i in range(len(df))],
-        index=df.index,
-        name='group_id'
-    )
+    group_id_series = pd.Series(group_ids, index=df.index, name='group_id')
     
     # Calculate group sizes
-    group_sizes = group_id_series.value_counts()
-    group_size_series = group_id_series.map(group_sizes).rename('group_size')
+    group_sizes = np.bincount(labels, minlength=n_components)
+    group_size_series = pd.Series(group_sizes[labels], index=df.index, name='group_size')
     
     return group_id_series, group_size_series
 
 
+class CoLocationHierarchy:
+    """
+    Single-linkage hierarchy of co-location groups up to a maximum threshold.
+    
+    Built once from the minimum spanning forest of the neighbor graph at
+    max_threshold_m. For any threshold t <= max_threshold_m, the connected
+    components of the forest's edges no longer than t are exactly the
+    co-location groups at t (components of all pairs within t), so groups
+    for a new threshold are a cut of the sorted edges instead of a new
+    radius query.
+    
+    Attributes:
+        site_ids: site_id of every site, in row order
+        edges: (E, 2) int32 forest edges (row positions), sorted by length
+        lengths_rad: (E,) ascending edge lengths in radians
+        max_threshold_m: Largest threshold the hierarchy can be cut at
+    """
+    
+    def __init__(
+        self,
+        site_ids: np.ndarray,
+        edges: np.ndarray,
+        lengths_rad: np.ndarray,
+        max_threshold_m: float
+    ):
+        order = np.argsort(lengths_rad, kind='stable')
+        self.site_ids = site_ids
+        self.edges = edges[order]
+        self.lengths_rad = lengths_rad[order]
+        self.max_threshold_m = max_threshold_m
+    
+    def __len__(self) -> int:
+        return len(self.site_ids)
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the hierarchy's arrays."""
+        return int(self.edges.nbytes + self.lengths_rad.nbytes + self.site_ids.nbytes)
+    
+    def labels(self, threshold_m: float) -> Tuple[int, np.ndarray]:
+        """
+        Component labels at a threshold.
+        
+        Args:
+            threshold_m: Co-location threshold in meters (<= max_threshold_m)
+            
+        Returns:
+            Tuple of (number of groups, group label per site)
+        """
+        if threshold_m > self.max_threshold_m:
+            raise ValueError(
+                f"Threshold {threshold_m} m exceeds the hierarchy maximum of {self.max_threshold_m} m"
+            )
+        
+        n = len(self)
+        # Same comparison as the radius query: distance <= threshold
+        cut = np.searchsorted(self.lengths_rad, threshold_m / 1000.0 / EARTH_RADIUS_KM, side='right')
+        edges = self.edges[:cut]
+        adjacency = coo_matrix(
+            (np.ones(cut, dtype=np.int8), (edges[:, 0], edges[:, 1])), shape=(n, n)
+        ).tocsr()
+        return connected_components(csgraph=adjacency, directed=False, return_labels=True)
+    
+    def groups(
+        self,
+        threshold_m: float,
+        profile: Optional[PipelineProfile] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        group_id and group_size of every site at a threshold.
+        
+        Args:
+            threshold_m: Co-location threshold in meters (<= max_threshold_m)
+            profile: Optional PipelineProfile to record the cut and group ID stages in
+            
+        Returns:
+            Tuple of (group_id array, group_size array), as find_co_location_groups
+        """
+        with _stage(profile, 'connected_components', len(self)):
+            n_components, labels = self.labels(threshold_m)
+        with _stage(profile, 'group_ids', len(self)):
+            group_ids = component_group_ids(self.site_ids, labels, n_components)
+        group_sizes = np.bincount(labels, minlength=n_components)[labels]
+        return group_ids, group_sizes
+
+
+def build_co_location_hierarchy(
+    df: pd.DataFrame,
+    max_threshold_m: float,
+    index: Optional[SpatialIndex] = None,
+    profile: Optional[PipelineProfile] = None,
+    chunk_size: Optional[int] = None
+) -> CoLocationHierarchy:
+    """
+    Build the single-linkage co-location hierarchy up to max_threshold_m.
+    
+    Runs one radius query at the maximum threshold, in chunks of rows that
+    fit QUERY_MEMORY_BUDGET_BYTES, and keeps only the minimum spanning
+    forest of the resulting neighbor graph.
+    
+    Args:
+        df: DataFrame with 'site_id', 'lat' and 'lon' columns
+        max_threshold_m: Largest threshold the hierarchy can be cut at (meters)
+        index: Optional prebuilt SpatialIndex over df (built if omitted)
+        profile: Optional PipelineProfile to record the pair count
+                 ('co_location_edges') in
+        chunk_size: Points queried per chunk (default: from query_chunk_size)
+        
+    Returns:
+        CoLocationHierarchy over the rows of df
+    """
+    site_ids = df['site_id'].astype(str).to_numpy()
+    n = len(df)
+    if n == 0:
+        return CoLocationHierarchy(
+            site_ids, np.empty((0, 2), dtype=np.int32), np.empty(0), max_threshold_m
+        )
+    
+    index = _resolve_index(df, index)
+    threshold_km = max_threshold_m / 1000.0
+    if chunk_size is None:
+        chunk_size = query_chunk_size(index, threshold_km)
+    
+    row_parts, col_parts, length_parts = [], [], []
+    for start in range(0, n, chunk_size):
+        chunk = np.arange(start, min(start + chunk_size, n), dtype=np.int32)
+        owner, cols, lengths = index.query_radius_pairs(threshold_km, rows=chunk)
+        rows = chunk[owner]
+        cols = cols.astype(np.int32, copy=False)
+        
+        # Each undirected pair once; self-pairs dropped
+        upper = rows < cols
+        row_parts.append(rows[upper])
+        col_parts.append(cols[upper])
+        length_parts.append(lengths[upper])
+    
+    rows = np.concatenate(row_parts)
+    cols = np.concatenate(col_parts)
+    lengths = np.concatenate(length_parts)
+    if profile is not None:
+        profile.count('co_location_edges', len(rows))
+    
+    # The spanning tree treats zero weights as missing edges, so coincident
+    # sites get the smallest positive length instead
+    weights = np.maximum(lengths, np.finfo(np.float64).tiny)
+    forest = minimum_spanning_tree(coo_matrix((weights, (rows, cols)), shape=(n, n)).tocsr()).tocoo()
+    
+    edges = np.column_stack([forest.row, forest.col]).astype(np.int32)
+    logger.info(f"Co-location hierarchy: {len(edges)} forest edges from {len(rows)} pairs")
+    return CoLocationHierarchy(site_ids, edges, forest.data, max_threshold_m)
+
+
+def cluster_quantiles(
+    values: np.ndarray,
+    codes: np.ndarray,
+    n_groups: int,
+    quantiles: Tuple[float, ...]
+) -> np.ndarray:
+    """
+    Compute quantiles of values for every group in one sorted pass.
+    
+    Matches pandas/numpy 'linear' interpolation. NaN values and negative
+    codes are ignored; groups with no values get NaN cut points.
+    
+    Args:
+        values: Value per row
+        codes: Group code per row (0..n_groups-1, negative = no group)
+        n_groups: Number of groups
+        quantiles: Quantiles to compute, each in [0, 1]
+        
+    Returns:
+        (n_groups, len(quantiles)) array of cut points
+    """
+    keep = (codes >= 0) & ~np.isnan(values)
+    values = values[keep]
+    codes = codes[keep]
+    
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    has_values = sizes > 0
+    
+    cuts = np.full((n_groups, len(quantiles)), np.nan)
+    if not has_values.any():
+        return cuts
+    
+    q = np.asarray(quantiles, dtype=np.float64)
+    positions = (sizes[has_values, None] - 1) * q[None, :]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    frac = positions - lower
+    
+    base = starts[has_values, None]
+    a = sorted_values[base + lower]
+    b = sorted_values[base + upper]
+    
+    # Same lerp as numpy.quantile so cut points match pandas exactly
+    diff = b - a
+    cuts[has_values] = np.where(frac >= 0.5, b - diff * (1 - frac), a + diff * frac)
+    return cuts
+
+
+def _band_cuts(cuts: np.ndarray) -> np.ndarray:
+    """
+    Ascending cuts that classify like the given ones band by band.
+    
+    Each cut is lowered to the smallest cut above it, so counting the cuts
+    below a density gives the highest band the density falls in.
+    """
+    return np.minimum.accumulate(cuts[..., ::-1], axis=-1)[..., ::-1]
+
+
+def _classes_from_cuts(density: np.ndarray, cuts: np.ndarray) -> np.ndarray:
+    """
+    Map densities to area classes given (rural, suburban, urban) cuts.
+    
+    Classes are half-open on the left: Rural <= cut0 < Suburban <= cut1 <
+    Urban <= cut2 < Dense. Cuts that are not ascending keep the band-by-band
+    meaning, where a higher band wins: above the urban cut is Dense, else
+    above the suburban cut is Urban, and so on. Rows with NaN density or NaN
+    cuts get NaN.
+    
+    Args:
+        density: Density per row
+        cuts: Either 3 shared cut points or an (N, 3) array of per-row cuts
+        
+    Returns:
+        Object array of area_class labels
+    """
+    cuts = _band_cuts(np.broadcast_to(cuts, (len(density), len(AREA_CLASSES) - 1)))
+    class_codes = (density[:, None] > cuts).sum(axis=1)
+    
+    area_classes = np.asarray(AREA_CLASSES, dtype=object)[class_codes]
+    undefined = np.isnan(density) | np.isnan(cuts).any(axis=1)
+    area_classes[undefined] = np.nan
+    return area_classes
+
+
+def class_counts_for_thresholds(
+    density: np.ndarray,
+    threshold_sets: Sequence[Dict[str, float]]
+) -> np.ndarray:
+    """
+    Count sites per area class for many threshold sets at once.
+    
+    Equivalent to classify_sites in threshold mode followed by counting
+    classes, for every threshold set, but the densities are sorted once
+    and each set costs only three binary searches.
+    
+    Args:
+        density: Density per site (NaN densities are not counted)
+        threshold_sets: Dicts with 'rural', 'suburban' and 'urban' keys
+        
+    Returns:
+        (len(threshold_sets), len(AREA_CLASSES)) int64 array of counts
+    """
+    sorted_density = np.sort(density[~np.isnan(density)])
+    
+    # A site's class is the number of band cuts below its density
+    cuts = _band_cuts(np.array(
+        [[t['rural'], t['suburban'], t['urban']] for t in threshold_sets],
+        dtype=np.float64
+    ).reshape(-1, len(AREA_CLASSES) - 1))
+    
+    # Sites at or below each cut; class k lies between cuts k-1 and k
+    at_or_below = np.searchsorted(sorted_density, cuts, side='right')
+    bounds = np.column_stack([
+        np.zeros(len(cuts), dtype=np.int64),
+        at_or_below,
+        np.full(len(cuts), len(sorted_density), dtype=np.int64)
+    ])
+    return np.diff(bounds, axis=1)
+
+
 def classify_sites(
     df: pd.DataFrame,
     mode: str = 'quantile',
@@ -269,109 +1512,199 @@ def classify_sites(
         raise ValueError("DataFrame must have 'density' column")
     
     if mode == 'quantile':
-        # Calculate percentiles per cluster_id
-        area_classes = pd.Series(index=df.index, dtype=str)
+        # Per-cluster quartile cut points from a single sort over all sites
+        cluster_codes, cluster_labels = pd.factorize(df['cluster_id'])
+        cuts = cluster_quantiles(
+            df['density'].to_numpy(dtype=np.float64),
+            cluster_codes,
+            len(cluster_labels),
+            QUANTILE_CUTS
+        )
         
-        for cluster_id in df['cluster_id'].unique():
-            cluster_mask = df['cluster_id'] == cluster_id
-            cluster_densities = df.loc[cluster_mask, 'density']
-            
-            if len(cluster_densities) == 0:
-                continue
-            
-            # Calculate percentiles
-            q25 = cluster_densities.quantile(0.25)
-            q50 = cluster_densities.quantile(0.50)
-            q75 = cluster_densities.quantile(0.75)
-            
-            # Classify based on percentiles
-            cluster_classes = pd.Series(index=cluster_densities.index, dtype=str)
-            cluster_classes[cluster_densities <= q25] = 'Rural'
-            cluster_classes[(cluster_densities > q25) & (cluster_densities <= q50)] = 'Suburban'
-            cluster_classes[(cluster_densities > q50) & (cluster_densities <= q75)] = 'Urban'
-            cluster_classes[cluster_densities > q75] = 'Dense'
-            
-            area_classes.loc[cluster_mask] = cluster_classes
+        # Clusters that could not be factorized (NaN) keep no class
+        row_cuts = np.full((len(df), len(QUANTILE_CUTS)), np.nan)
+        assigned = cluster_codes >= 0
+        row_cuts[assigned] = cuts[cluster_codes[assigned]]
         
-        return area_classes.rename('area_class')
+        area_classes = _classes_from_cuts(df['density'].to_numpy(dtype=np.float64), row_cuts)
+        return pd.Series(area_classes, index=df.index, name='area_class')
     
     elif mode == 'threshold':
         if thresholds is None:
-            # Default thresholds (sites per km²)
-            thresholds = {
-                'rural': 10.0,
-                'suburban': 50.0,
-                'urban': 200.0
-            }
-        
-        area_classes = pd.Series(index=df.index, dtype=str)
-        density = df['density']
-        
-        area_classes[density <= thresholds['rural']] = 'Rural'
-        area_classes[
-            (density > thresholds['rural']) & (density <= thresholds['suburban'])
-        ] = 'Suburban'
-        area_classes[
-            (density > thresholds['suburban']) & (density <= thresholds['urban'])
-        ] = 'Urban'
-        area_classes[density > thresholds['urban']] = 'Dense'
+            thresholds = DEFAULT_CLASSIFICATION_THRESHOLDS
         
-        return area_classes.rename('area_class')
+        cuts = np.array([thresholds['rural'], thresholds['suburban'], thresholds['urban']])
+        area_classes = _classes_from_cuts(df['density'].to_numpy(dtype=np.float64), cuts)
+        return pd.Series(area_classes, index=df.index, name='area_class')
     
     else:
         raise ValueError(f"Invalid mode: {mode}. Must be 'quantile' or 'threshold'")
 
 
-def process_sites(
-    df: pd.DataFrame,
+def analyze_sites(
+    df_clean: pd.DataFrame,
     radius_km: float = 2.0,
     co_location_threshold_m: float = 100.0,
     classification_mode: str = 'quantile',
-    classification_thresholds: Optional[Dict[str, float]] = None
-) -> Tuple[pd.DataFrame, List[str]]:
+    classification_thresholds: Optional[Dict[str, float]] = None,
+    density_radii_km: Optional[Sequence[float]] = None,
+    density_engine: str = 'balltree',
+    spatial_engine: str = 'haversine',
+    query_workers: int = 1,
+    co_location_max_threshold_m: Optional[float] = None,
+    return_hierarchy: bool = False,
+    index: Optional[SpatialIndex] = None,
+    profile: Optional[PipelineProfile] = None
+):
     """
-    Complete processing pipeline for site analysis.
+    Density, co-location and classification steps of process_sites.
+    
+    For sites that already passed validate_csv, e.g. a registered dataset
+    analyzed again with new parameters. A prebuilt index (such as one
+    cached with the dataset) skips the index build.
     
     Args:
-        df: Input DataFrame
-        radius_km: Radius for density calculation (km)
-        co_location_threshold_m: Threshold for co-location grouping (meters)
-        classification_mode: 'quantile' or 'threshold'
-        classification_thresholds: Optional thresholds for threshold mode
+        df_clean: Validated DataFrame (output of validate_csv)
+        index: Optional prebuilt SpatialIndex over df_clean (built with
+               spatial_engine if omitted)
+        (other arguments as process_sites)
         
     Returns:
-        Tuple of (enriched DataFrame, list of processing messages)
+        Same as process_sites
     """
-    messages = []
+    if co_location_max_threshold_m is not None and co_location_max_threshold_m < co_location_threshold_m:
+        raise ValueError(
+            f"co_location_max_threshold_m ({co_location_max_threshold_m}) must be at least "
+            f"co_location_threshold_m ({co_location_threshold_m})"
+        )
     
-    # Step 1: Validate
-    df_clean, validation_errors = validate_csv(df)
-    messages.extend(validation_errors)
+    messages = []
+    hierarchy = None
+    n = len(df_clean)
     
-    if len(df_clean) == 0:
-        messages.append("No valid rows after validation")
-        return df_clean, messages
+    # Build the spatial index once and share it across spatial stages
+    if index is None:
+        with _stage(profile, 'spatial_index', n):
+            index = build_spatial_index(df_clean, engine=spatial_engine)
+    else:
+        index = _resolve_index(df_clean, index)
+    if spatial_engine == 'projected' and not isinstance(index, ProjectedIndex):
+        messages.append(
+            "Dataset extent too large for the projected spatial engine; used haversine"
+        )
     
     # Step 2: Calculate density
-    density = calculate_density(df_clean, radius_km=radius_km)
     df_clean = df_clean.copy()
-    df_clean['density'] = density
+    with _stage(profile, 'density', n):
+        if density_radii_km:
+            # Main radius first; repeated radii are computed once
+            radii = list(dict.fromkeys([radius_km, *density_radii_km]))
+            densities = calculate_density(
+                df_clean, radius_km=radii, index=index, engine=density_engine,
+                query_workers=query_workers
+            )
+            df_clean['density'] = densities[density_column(radius_km)]
+            for r in radii[1:]:
+                df_clean[density_column(r)] = densities[density_column(r)]
+        else:
+            df_clean['density'] = calculate_density(
+                df_clean, radius_km=radius_km, index=index, engine=density_engine,
+                query_workers=query_workers
+            )
     
     # Step 3: Find co-location groups
-    group_id, group_size = find_co_location_groups(
-        df_clean, threshold_m=co_location_threshold_m
-    )
+    if co_location_max_threshold_m is not None:
+        with _stage(profile, 'co_location_hierarchy', n):
+            hierarchy = build_co_location_hierarchy(
+                df_clean, max_threshold_m=co_location_max_threshold_m, index=index,
+                profile=profile
+            )
+        group_id, group_size = hierarchy.groups(co_location_threshold_m, profile=profile)
+    else:
+        group_id, group_size = find_co_location_groups(
+            df_clean, threshold_m=co_location_threshold_m, index=index, profile=profile
+        )
     df_clean['group_id'] = group_id
     df_clean['group_size'] = group_size
     
     # Step 4: Classify
-    area_class = classify_sites(
-        df_clean,
-        mode=classification_mode,
-        thresholds=classification_thresholds
-    )
+    with _stage(profile, 'classify', n):
+        area_class = classify_sites(
+            df_clean,
+            mode=classification_mode,
+            thresholds=classification_thresholds
+        )
     df_clean['area_class'] = area_class
     
     messages.append(f"Processed {len(df_clean)} sites successfully")
     
+    if return_hierarchy:
+        return df_clean, messages, hierarchy
     return df_clean, messages
+
+
+def process_sites(
+    df: pd.DataFrame,
+    radius_km: float = 2.0,
+    co_location_threshold_m: float = 100.0,
+    classification_mode: str = 'quantile',
+    classification_thresholds: Optional[Dict[str, float]] = None,
+    density_radii_km: Optional[Sequence[float]] = None,
+    density_engine: str = 'balltree',
+    spatial_engine: str = 'haversine',
+    query_workers: int = 1,
+    co_location_max_threshold_m: Optional[float] = None,
+    return_hierarchy: bool = False,
+    profile: Optional[PipelineProfile] = None
+):
+    """
+    Complete processing pipeline for site analysis.
+    
+    Args:
+        df: Input DataFrame
+        radius_km: Radius for density calculation (km)
+        co_location_threshold_m: Threshold for co-location grouping (meters)
+        classification_mode: 'quantile' or 'threshold'
+        classification_thresholds: Optional thresholds for threshold mode
+        density_radii_km: Optional extra radii (km); each adds a
+                          density_column(r) column, computed in the same
+                          tree query as the main density
+        density_engine: 'balltree' (exact) or 'grid' (approximate)
+        spatial_engine: 'haversine' or 'projected' (planar KD-tree for
+                        regionally compact data, with haversine fallback)
+        query_workers: Worker processes for exact density queries (1 = serial)
+        co_location_max_threshold_m: Optional maximum threshold (meters); when
+                                     set, co-location groups come from a
+                                     CoLocationHierarchy that can later be
+                                     cut at any threshold up to this value
+        return_hierarchy: Also return the CoLocationHierarchy (or None)
+        profile: Optional PipelineProfile that records wall time, CPU time,
+                 rows and (if tracing) peak memory of each stage
+        
+    Returns:
+        Tuple of (enriched DataFrame, list of processing messages), plus the
+        hierarchy as a third element when return_hierarchy is set
+    """
+    # Step 1: Validate
+    with _stage(profile, 'validate', len(df)):
+        df_clean, validation_errors = validate_csv(df)
+    
+    if len(df_clean) == 0:
+        messages = validation_errors + ["No valid rows after validation"]
+        return (df_clean, messages, None) if return_hierarchy else (df_clean, messages)
+    
+    result_df, messages, *hierarchy = analyze_sites(
+        df_clean,
+        radius_km=radius_km,
+        co_location_threshold_m=co_location_threshold_m,
+        classification_mode=classification_mode,
+        classification_thresholds=classification_thresholds,
+        density_radii_km=density_radii_km,
+        density_engine=density_engine,
+        spatial_engine=spatial_engine,
+        query_workers=query_workers,
+        co_location_max_threshold_m=co_location_max_threshold_m,
+        return_hierarchy=return_hierarchy,
+        profile=profile
+    )
+    return (result_df, validation_errors + messages, *hierarchy)
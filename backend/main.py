@@ -3,17 +3,65 @@ FastAPI application entry point.
 Service-layer architecture with clear separation of concerns.
 """
 
+import hashlib
 import logging
-from typing import Optional
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any, Callable, List, Optional
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import pandas as pd
-import io
 
-from schemas import AnalysisRequest, AnalysisResponse, AnalysisSummary
-from logic import process_sites
-from utils import dataframe_to_csv_bytes, dataframe_to_dict_list
+from schemas import (
+    AnalysisRequest,
+    AnalysisResponse,
+    AnalysisSummary,
+    ClassificationRequest,
+    DatasetResponse,
+    JobResponse,
+    ReclassifyBatchRequest,
+    ReclassifyBatchResponse,
+    SiteRemovalRequest,
+    StageTimingResponse
+)
+from analysis import (
+    AnalysisResult,
+    build_dataset,
+    reclassify_result,
+    run_analysis,
+    run_dataset_analysis,
+    summaries_for_thresholds
+)
+from datasets import DatasetStore, SiteDataset
+from jobs import JobManager, WorkerPool, PoolSaturatedError, JOB_COMPLETED, JOB_FAILED
+from cache import ResultCache, make_cache_key
+from logic import DEFAULT_CLASSIFICATION_THRESHOLDS, REQUIRED_COLUMNS
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    SIZE_BUCKETS,
+    STAGE_BUCKETS,
+    MetricsRegistry,
+    process_peak_rss_bytes,
+    process_rss_bytes
+)
+from utils import (
+    COLUMNAR_FORMATS_AVAILABLE,
+    DOWNLOAD_FORMATS,
+    ENCODED_DOWNLOAD_FORMATS,
+    choose_content_encoding,
+    dataframe_to_dict_list,
+    iter_columnar_chunks,
+    iter_csv_chunks,
+    iter_encoded,
+    read_columnar_upload,
+    read_csv_upload,
+    upload_compression,
+    upload_format
+)
 
 # Configure logging
 logging.basicConfig(
@@ -22,10 +70,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Upload limits, overridable through the environment
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Keep non-required CSV columns in the output (set to 0 to parse only the
+# required columns, which is faster and smaller for wide inventories)
+UPLOAD_KEEP_EXTRA_COLUMNS = os.environ.get('UPLOAD_KEEP_EXTRA_COLUMNS', '1') != '0'
+
+# Parse uploads with the multithreaded Arrow CSV reader when pyarrow is
+# installed (set to 0 to always use the pandas reader)
+UPLOAD_ARROW_CSV = os.environ.get('UPLOAD_ARROW_CSV', '1') != '0'
+
+# Names of the upload formats in error messages
+UPLOAD_FORMAT_NAMES = {'csv': 'CSV', 'parquet': 'Parquet', 'arrow': 'Arrow IPC'}
+
+# CPU-bound pipeline runs go to this pool so the event loop stays responsive
+worker_pool = WorkerPool()
+
+# Result store for analysis jobs, bounded by count and by result bytes
+job_manager = JobManager(worker_pool, result_size=lambda result: result.nbytes)
+
+# Repeat uploads with the same parameters are served from this cache
+result_cache = ResultCache()
+
+# Registered datasets, updated incrementally as sites are added or removed
+dataset_store = DatasetStore()
+
+# Service metrics, served at /metrics in the Prometheus text format
+metrics = MetricsRegistry()
+http_requests = metrics.counter(
+    'http_requests_total', 'HTTP requests by endpoint and status code',
+    ('method', 'endpoint', 'status')
+)
+http_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Time until response headers are sent, by endpoint',
+    ('method', 'endpoint')
+)
+pipeline_runs = metrics.counter(
+    'pipeline_runs_total', 'Completed pipeline runs (cache hits not included)'
+)
+pipeline_rows = metrics.counter(
+    'pipeline_rows_processed_total', 'Valid rows analyzed by completed pipeline runs'
+)
+stage_latency = metrics.histogram(
+    'pipeline_stage_duration_seconds', 'Wall time of each pipeline stage',
+    ('stage',), buckets=STAGE_BUCKETS
+)
+stage_cpu = metrics.counter(
+    'pipeline_stage_cpu_seconds_total', 'CPU time spent in each pipeline stage', ('stage',)
+)
+co_location_edges = metrics.histogram(
+    'pipeline_co_location_edges', 'Site pairs within the co-location threshold per run',
+    buckets=SIZE_BUCKETS
+)
+metrics.counter_function(
+    'result_cache_requests_total', 'Result cache lookups by outcome',
+    lambda: {
+        ('hit',): result_cache.hits,
+        ('disk_hit',): result_cache.disk_hits,
+        ('miss',): result_cache.misses
+    },
+    ('result',)
+)
+metrics.gauge(
+    'result_cache_hit_ratio', 'Share of result cache lookups served from memory or disk',
+    lambda: cache_hit_ratio(result_cache.stats())
+)
+metrics.gauge('result_cache_bytes', 'Memory used by cached results', lambda: result_cache.stats()['bytes'])
+metrics.gauge('worker_pool_pending_tasks', 'Pipeline runs queued or running', lambda: worker_pool.pending)
+metrics.gauge('worker_pool_max_pending_tasks', 'Pending runs at which the pool refuses work', lambda: worker_pool.max_pending)
+metrics.counter_function(
+    'worker_pool_rejected_tasks_total', 'Pipeline runs refused because the pool was saturated',
+    lambda: worker_pool.rejected
+)
+metrics.gauge('process_resident_memory_bytes', 'Resident set size of the API process', process_rss_bytes)
+metrics.gauge('process_peak_resident_memory_bytes', 'Peak resident set size of the API process', process_peak_rss_bytes)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    worker_pool.shutdown(wait=False)
+
+
 app = FastAPI(
     title="Site Analysis API",
     description="AI/ML Intern Take-Home Assignment - Site Density and Classification API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS for Docker (allow all origins for development)
@@ -38,6 +171,41 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject requests whose declared size exceeds the upload limit before reading the body."""
+    content_length = request.headers.get('content-length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"File exceeds the maximum upload size of {UPLOAD_MAX_BYTES} bytes"}
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and time them, labelled by route template rather than raw path."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        endpoint = route.path if route is not None else 'unmatched'
+        http_requests.inc(method=request.method, endpoint=endpoint, status=str(status))
+        http_latency.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+
+
+def cache_hit_ratio(stats: dict) -> Optional[float]:
+    """Share of cache lookups that hit, or None before the first lookup."""
+    hits = stats['hits'] + stats['disk_hits']
+    lookups = hits + stats['misses']
+    return hits / lookups if lookups else None
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -50,90 +218,307 @@ async def health():
     return {"status": "healthy"}
 
 
-@app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_sites(
-    file: UploadFile = File(..., description="CSV file with site data"),
-    radius_km: float = Query(default=2.0, ge=0.1, le=100.0, description="Radius for density calculation (km)"),
-    co_location_threshold_m: float = Query(default=100.0, ge=1.0, le=10000.0, description="Co-location threshold (meters)"),
+@app.get("/metrics")
+async def get_metrics():
+    """Service metrics in the Prometheus text exposition format."""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def classification_params(
     classification_mode: str = Query(default="quantile", pattern="^(quantile|threshold)$", description="Classification mode"),
     rural_threshold: Optional[float] = Query(default=None, ge=0.0, description="Rural threshold (for threshold mode)"),
     suburban_threshold: Optional[float] = Query(default=None, ge=0.0, description="Suburban threshold (for threshold mode)"),
     urban_threshold: Optional[float] = Query(default=None, ge=0.0, description="Urban threshold (for threshold mode)")
+) -> ClassificationRequest:
+    """Collect classification query parameters into a ClassificationRequest."""
+    # Prepare classification thresholds if in threshold mode
+    classification_thresholds = None
+    if classification_mode == "threshold":
+        if rural_threshold is not None or suburban_threshold is not None or urban_threshold is not None:
+            classification_thresholds = {}
+            if rural_threshold is not None:
+                classification_thresholds['rural'] = rural_threshold
+            if suburban_threshold is not None:
+                classification_thresholds['suburban'] = suburban_threshold
+            if urban_threshold is not None:
+                classification_thresholds['urban'] = urban_threshold
+    
+    return ClassificationRequest(
+        classification_mode=classification_mode,
+        classification_thresholds=classification_thresholds
+    )
+
+
+def analysis_params(
+    radius_km: float = Query(default=2.0, ge=0.1, le=100.0, description="Radius for density calculation (km)"),
+    co_location_threshold_m: float = Query(default=100.0, ge=1.0, le=10000.0, description="Co-location threshold (meters)"),
+    co_location_max_threshold_m: Optional[float] = Query(default=None, ge=1.0, le=10000.0, description="Maximum co-location threshold (meters) to keep a group hierarchy for"),
+    classification: ClassificationRequest = Depends(classification_params),
+    density_radii_km: Optional[List[float]] = Query(default=None, description="Extra density radii (km), repeatable"),
+    density_engine: str = Query(default="balltree", pattern="^(balltree|grid)$", description="Density engine: exact 'balltree' or approximate 'grid'"),
+    spatial_engine: str = Query(default="haversine", pattern="^(haversine|projected)$", description="Spatial index: exact 'haversine' or planar 'projected'")
+) -> AnalysisRequest:
+    """Collect analysis query parameters into an AnalysisRequest."""
+    if co_location_max_threshold_m is not None and co_location_max_threshold_m < co_location_threshold_m:
+        raise HTTPException(
+            status_code=422,
+            detail="co_location_max_threshold_m must be at least co_location_threshold_m"
+        )
+    
+    if density_radii_km:
+        invalid = [r for r in density_radii_km if not 0.1 <= r <= 100.0]
+        if invalid:
+            raise HTTPException(
+                status_code=422,
+                detail=f"density_radii_km values must be between 0.1 and 100.0: {invalid}"
+            )
+        density_radii_km = sorted(set(density_radii_km))
+    
+    return AnalysisRequest(
+        radius_km=radius_km,
+        co_location_threshold_m=co_location_threshold_m,
+        co_location_max_threshold_m=co_location_max_threshold_m,
+        classification_mode=classification.classification_mode,
+        classification_thresholds=classification.classification_thresholds,
+        density_radii_km=density_radii_km or None,
+        density_engine=density_engine,
+        spatial_engine=spatial_engine
+    )
+
+
+def check_upload_format(file: UploadFile) -> str:
+    """
+    Format of an upload from its file name ('csv', 'parquet' or 'arrow').
+    
+    Raises:
+        HTTPException: 400 for other file types, compressed files other than
+                       CSV, or Parquet and Arrow files when pyarrow is not
+                       installed
+    """
+    fmt = upload_format(file.filename or '')
+    if fmt is None:
+        raise HTTPException(
+            status_code=400,
+            detail="File must be a CSV (.csv, .csv.gz, .csv.zst), Parquet (.parquet) or Feather/Arrow IPC (.feather, .arrow) file"
+        )
+    if fmt != 'csv' and upload_compression(file.filename) is not None:
+        raise HTTPException(status_code=400, detail="Only CSV uploads can be compressed (.csv.gz, .csv.zst)")
+    if fmt != 'csv' and not COLUMNAR_FORMATS_AVAILABLE:
+        raise HTTPException(status_code=400, detail=f"{UPLOAD_FORMAT_NAMES[fmt]} uploads require pyarrow")
+    return fmt
+
+
+def download_format_param(
+    format: str = Query(default="csv", pattern="^(csv|parquet|feather|arrow)$", description="Result format: csv, parquet, feather or arrow (IPC stream)")
+) -> str:
+    """Validate the requested result format."""
+    if format != 'csv' and not COLUMNAR_FORMATS_AVAILABLE:
+        raise HTTPException(status_code=400, detail=f"The {format} format requires pyarrow")
+    return format
+
+
+def content_encoding_param(accept_encoding: Optional[str] = Header(default=None)) -> Optional[str]:
+    """Content encoding for downloads negotiated from Accept-Encoding (None for none)."""
+    return choose_content_encoding(accept_encoding)
+
+
+async def hash_upload(file: UploadFile) -> str:
+    """
+    Hash an upload in chunks, enforcing the upload size limit.
+    
+    The upload is already spooled to a temporary file by the server; it is
+    read back in fixed-size chunks so the whole payload is never held in
+    memory, then rewound for parsing.
+    
+    Returns:
+        Hex digest of the upload bytes
+        
+    Raises:
+        HTTPException: 400 for unsupported file types, 413 if it is too large
+    """
+    check_upload_format(file)
+    
+    digest = hashlib.blake2b(digest_size=32)
+    size = 0
+    
+    await file.seek(0)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds the maximum upload size of {UPLOAD_MAX_BYTES} bytes"
+            )
+        digest.update(chunk)
+    await file.seek(0)
+    
+    return digest.hexdigest()
+
+
+async def parse_upload(file: UploadFile) -> pd.DataFrame:
+    """
+    Parse an upload straight from its spooled file, off the event loop.
+    
+    CSV is parsed as text (decompressed on the fly for .csv.gz and
+    .csv.zst); Parquet and Arrow IPC files are read with the column types
+    they were written with.
+    
+    Raises:
+        HTTPException: 400 if the file type is unsupported, or the file is
+                       unreadable or empty
+    """
+    fmt = check_upload_format(file)
+    name = UPLOAD_FORMAT_NAMES[fmt]
+    usecols = None if UPLOAD_KEEP_EXTRA_COLUMNS else REQUIRED_COLUMNS
+    
+    try:
+        if fmt == 'csv':
+            compression = upload_compression(file.filename)
+            df = await run_in_threadpool(read_csv_upload, file.file, usecols, UPLOAD_ARROW_CSV, compression)
+        else:
+            df = await run_in_threadpool(read_columnar_upload, file.file, fmt, usecols)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading {name}: {str(e)}")
+    
+    if len(df) == 0:
+        raise HTTPException(status_code=400, detail=f"{name} file is empty")
+    
+    return df
+
+
+def cache_result(key: str, result: AnalysisResult) -> None:
+    """Store a pipeline result in the result cache."""
+    result_cache.put(key, result, result.nbytes)
+
+
+def record_pipeline_run(result: AnalysisResult) -> None:
+    """Add a freshly computed result's rows, stage timings and edge count to the metrics."""
+    pipeline_runs.inc()
+    pipeline_rows.inc(len(result.data))
+    for timing in result.timings or []:
+        stage_latency.observe(timing.wall_s, stage=timing.stage)
+        stage_cpu.inc(timing.cpu_s, stage=timing.stage)
+    if result.counts and 'co_location_edges' in result.counts:
+        co_location_edges.observe(result.counts['co_location_edges'])
+
+
+def finish_run(key: str, result: AnalysisResult) -> None:
+    """Record a freshly computed result in the metrics and the result cache."""
+    record_pipeline_run(result)
+    cache_result(key, result)
+
+
+async def analyze_upload(file: UploadFile, params: AnalysisRequest) -> AnalysisResult:
+    """
+    Analyze an uploaded CSV, serving repeat (file, parameters) pairs from cache.
+    
+    Raises:
+        HTTPException: On invalid uploads or pipeline errors (see run_in_pool)
+    """
+    key = make_cache_key(await hash_upload(file), params.model_dump())
+    
+    cached = result_cache.get(key)
+    if cached is not None:
+        logger.info(f"Serving cached result for file: {file.filename}")
+        return cached
+    
+    df = await parse_upload(file)
+    
+    logger.info(f"Processing {len(df)} rows from file: {file.filename}")
+    
+    result = await run_in_pool(run_analysis, df, params)
+    finish_run(key, result)
+    return result
+
+
+async def run_in_pool(fn: Callable[..., Any], df: pd.DataFrame, *args) -> Any:
+    """
+    Run fn(df, *args) (run_analysis, build_dataset, ...) on the worker pool.
+    
+    Raises:
+        HTTPException: 400 if no rows are valid, 503 if the pool is saturated
+    """
+    try:
+        return await worker_pool.run(fn, df, *args, rows=len(df))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def download_response(
+    result_df: pd.DataFrame,
+    fmt: str = 'csv',
+    encoding: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Stream an enriched DataFrame as an attachment in a DOWNLOAD_FORMATS format, in row chunks.
+    
+    CSV and Arrow stream output is compressed chunk by chunk with the
+    negotiated content encoding, if any.
+    """
+    media_type, extension = DOWNLOAD_FORMATS[fmt]
+    chunks = iter_csv_chunks(result_df) if fmt == 'csv' else iter_columnar_chunks(result_df, fmt)
+    headers = {
+        "Content-Disposition": f"attachment; filename=analysis_results.{extension}"
+    }
+    if fmt in ENCODED_DOWNLOAD_FORMATS:
+        headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            chunks = iter_encoded(chunks, encoding)
+            headers["Content-Encoding"] = encoding
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+def job_result_url(job_id: str, fmt: str = 'csv') -> str:
+    """URL where a completed job's full results can be downloaded."""
+    url = f"/jobs/{job_id}/result"
+    return url if fmt == 'csv' else f"{url}?format={fmt}"
+
+
+def stage_timings(result: AnalysisResult) -> Optional[List[StageTimingResponse]]:
+    """Per-stage timings of a result for the API response (None if not recorded)."""
+    if result.timings is None:
+        return None
+    return [StageTimingResponse(**asdict(timing)) for timing in result.timings]
+
+
+@app.post("/analyze", response_model=AnalysisResponse)
+async def analyze_sites(
+    file: UploadFile = File(..., description="CSV, Parquet or Feather/Arrow IPC file with site data"),
+    params: AnalysisRequest = Depends(analysis_params),
+    fmt: str = Depends(download_format_param)
 ):
     """
-    Analyze sites from uploaded CSV file.
+    Analyze sites from an uploaded CSV, Parquet or Feather/Arrow IPC file.
+    
+    Required columns: site_id, lat, lon, cluster_id
     
-    Required CSV columns: site_id, lat, lon, cluster_id
+    The full result is kept in the job store, so download_url can be
+    fetched without reprocessing the file; it serves the format given in
+    the format parameter.
     
     Returns:
         Analysis results with summary, preview, and download URL
     """
     try:
-        # Read uploaded file
-        if not file.filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="File must be a CSV file")
+        result = await analyze_upload(file, params)
         
-        contents = await file.read()
-        
-        try:
-            df = pd.read_csv(io.BytesIO(contents))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading CSV: {str(e)}")
-        
-        if len(df) == 0:
-            raise HTTPException(status_code=400, detail="CSV file is empty")
-        
-        logger.info(f"Processing {len(df)} rows from file: {file.filename}")
-        
-        # Prepare classification thresholds if in threshold mode
-        classification_thresholds = None
-        if classification_mode == "threshold":
-            if rural_threshold is not None or suburban_threshold is not None or urban_threshold is not None:
-                classification_thresholds = {}
-                if rural_threshold is not None:
-                    classification_thresholds['rural'] = rural_threshold
-                if suburban_threshold is not None:
-                    classification_thresholds['suburban'] = suburban_threshold
-                if urban_threshold is not None:
-                    classification_thresholds['urban'] = urban_threshold
-        
-        # Process sites using core logic
-        result_df, messages = process_sites(
-            df=df,
-            radius_km=radius_km,
-            co_location_threshold_m=co_location_threshold_m,
-            classification_mode=classification_mode,
-            classification_thresholds=classification_thresholds
-        )
-        
-        if len(result_df) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="No valid rows after processing. Check CSV format and data quality."
-            )
-        
-        # Calculate summary statistics
-        area_class_counts = result_df['area_class'].value_counts().to_dict()
-        summary = AnalysisSummary(
-            Rural=area_class_counts.get('Rural', 0),
-            Suburban=area_class_counts.get('Suburban', 0),
-            Urban=area_class_counts.get('Urban', 0),
-            Dense=area_class_counts.get('Dense', 0)
-        )
+        job = job_manager.add_completed(result)
         
         # Create preview (first 50 rows)
-        preview = dataframe_to_dict_list(result_df, max_rows=50)
-        
-        # Generate download URL (simulated - in production, this would be a real URL)
-        # For this implementation, client will call /download with same parameters
-        download_url = "/download"
+        preview = dataframe_to_dict_list(result.data, max_rows=50)
         
         return AnalysisResponse(
-            summary=summary,
+            summary=result.summary,
             preview=preview,
-            total_rows=len(result_df),
-            messages=messages,
-            download_url=download_url
+            total_rows=len(result.data),
+            messages=result.messages,
+            download_url=job_result_url(job.job_id, fmt),
+            timings=stage_timings(result)
         )
     
     except HTTPException:
@@ -145,62 +530,423 @@ async def analyze_sites(
 
 @app.post("/download")
 async def download_results(
-    file: UploadFile = File(..., description="CSV file with site data"),
-    radius_km: float = Query(default=2.0, ge=0.1, le=100.0),
-    co_location_threshold_m: float = Query(default=100.0, ge=1.0, le=10000.0),
-    classification_mode: str = Query(default="quantile", pattern="^(quantile|threshold)$"),
-    rural_threshold: Optional[float] = Query(default=None, ge=0.0),
-    suburban_threshold: Optional[float] = Query(default=None, ge=0.0),
-    urban_threshold: Optional[float] = Query(default=None, ge=0.0)
+    file: UploadFile = File(..., description="CSV, Parquet or Feather/Arrow IPC file with site data"),
+    params: AnalysisRequest = Depends(analysis_params),
+    fmt: str = Depends(download_format_param),
+    encoding: Optional[str] = Depends(content_encoding_param)
 ):
     """
-    Download full analysis results as CSV.
+    Download full analysis results as CSV, Parquet, Feather or an Arrow IPC stream.
     
-    Note: In a production system, this would use a job queue and store results.
-    For this implementation, we reprocess the file with the same parameters.
+    CSV and Arrow stream output is gzip or zstd compressed when the client
+    accepts it (Accept-Encoding).
+    
+    Repeat requests for the same file and parameters are served from the
+    result cache. Prefer the download_url returned by /analyze, or the
+    /jobs endpoints, which avoid re-uploading the file.
     """
     try:
-        # Read uploaded file
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        # Prepare classification thresholds
-        classification_thresholds = None
-        if classification_mode == "threshold":
-            if rural_threshold is not None or suburban_threshold is not None or urban_threshold is not None:
-                classification_thresholds = {}
-                if rural_threshold is not None:
-                    classification_thresholds['rural'] = rural_threshold
-                if suburban_threshold is not None:
-                    classification_thresholds['suburban'] = suburban_threshold
-                if urban_threshold is not None:
-                    classification_thresholds['urban'] = urban_threshold
-        
-        # Process sites
-        result_df, _ = process_sites(
-            df=df,
-            radius_km=radius_km,
-            co_location_threshold_m=co_location_threshold_m,
-            classification_mode=classification_mode,
-            classification_thresholds=classification_thresholds
-        )
+        result = await analyze_upload(file, params)
         
-        # Convert to CSV bytes
-        csv_bytes = dataframe_to_csv_bytes(result_df)
-        
-        return Response(
-            content=csv_bytes,
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename=analysis_results.csv"
-            }
-        )
+        return download_response(result.data, fmt, encoding)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating download: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating download: {str(e)}")
 
 
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(
+    file: UploadFile = File(..., description="CSV, Parquet or Feather/Arrow IPC file with site data"),
+    params: AnalysisRequest = Depends(analysis_params)
+):
+    """
+    Queue an analysis job for the uploaded CSV, Parquet or Feather/Arrow IPC file.
+    
+    Returns:
+        Job ID and initial status; poll GET /jobs/{job_id} for progress
+    """
+    key = make_cache_key(await hash_upload(file), params.model_dump())
+    
+    cached = result_cache.get(key)
+    if cached is not None:
+        job = job_manager.add_completed(cached)
+        return JobResponse(job_id=job.job_id, status=job.status)
+    
+    df = await parse_upload(file)
+    
+    logger.info(f"Queueing job for {len(df)} rows from file: {file.filename}")
+    
+    try:
+        job = job_manager.submit(
+            run_analysis, df, params,
+            rows=len(df),
+            on_result=lambda result: finish_run(key, result)
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JobResponse(job_id=job.job_id, status=job.status)
+
+
+def get_job_or_404(job_id: str):
+    """Look up a job, raising 404 if it is unknown or has been evicted."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+def get_completed_job_or_409(job_id: str):
+    """Look up a job that must have completed (404 if unknown, 409 if not completed)."""
+    job = get_job_or_404(job_id)
+    if job.status != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status of an analysis job, with its summary once completed.
+    """
+    job = get_job_or_404(job_id)
+    
+    response = JobResponse(job_id=job.job_id, status=job.status)
+    if job.status == JOB_COMPLETED:
+        result: AnalysisResult = job.result
+        response.summary = result.summary
+        response.total_rows = len(result.data)
+        response.messages = result.messages
+        response.result_url = job_result_url(job.job_id)
+        response.timings = stage_timings(result)
+    elif job.status == JOB_FAILED:
+        response.error = job.error
+    
+    return response
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    fmt: str = Depends(download_format_param),
+    encoding: Optional[str] = Depends(content_encoding_param)
+):
+    """
+    Download the full results of a completed job (CSV unless format is given).
+    """
+    job = get_completed_job_or_409(job_id)
+    
+    return download_response(job.result.data, fmt, encoding)
+
+
+def dataset_result_url(dataset_id: str) -> str:
+    """URL where a dataset's current enriched data can be downloaded."""
+    return f"/datasets/{dataset_id}/result"
+
+
+def get_dataset_or_404(dataset_id: str) -> SiteDataset:
+    """Look up a dataset, raising 404 if it is unknown or has been evicted."""
+    dataset = dataset_store.get(dataset_id)
+    if dataset is None:
+        raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+    return dataset
+
+
+def dataset_response(dataset_id: str, dataset: SiteDataset, messages: List[str]) -> DatasetResponse:
+    """Summarize a dataset's current state."""
+    return DatasetResponse(
+        dataset_id=dataset_id,
+        summary=AnalysisSummary(**dataset.class_counts()),
+        total_rows=len(dataset),
+        messages=messages,
+        result_url=dataset_result_url(dataset_id)
+    )
+
+
+@app.post("/datasets", response_model=DatasetResponse, status_code=201)
+async def create_dataset(
+    file: UploadFile = File(..., description="CSV, Parquet or Feather/Arrow IPC file with site data"),
+    params: AnalysisRequest = Depends(analysis_params)
+):
+    """
+    Register an uploaded CSV as a dataset.
+    
+    The upload is parsed and validated once; the cleaned sites and their
+    spatial index are kept so later analyses by dataset_id skip upload,
+    parsing and validation. The dataset is also analyzed with the given
+    parameters (exact haversine engine, single density radius), and that
+    analysis is kept current as sites are added or removed.
+    """
+    if (
+        params.density_radii_km
+        or params.density_engine != 'balltree'
+        or params.spatial_engine != 'haversine'
+        or params.co_location_max_threshold_m is not None
+    ):
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                "Datasets support only the exact 'balltree'/'haversine' engines, a single radius_km "
+                "and no co_location_max_threshold_m"
+            )
+        )
+    
+    df = await parse_upload(file)
+    
+    logger.info(f"Building dataset from {len(df)} rows from file: {file.filename}")
+    
+    dataset = await run_in_pool(build_dataset, df, params)
+    dataset_id = dataset_store.add(dataset)
+    return dataset_response(dataset_id, dataset, dataset.messages)
+
+
+@app.get("/datasets/{dataset_id}", response_model=DatasetResponse)
+async def get_dataset(dataset_id: str):
+    """
+    Get the current summary of a dataset.
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    return dataset_response(dataset_id, dataset, [])
+
+
+@app.post("/datasets/{dataset_id}/sites", response_model=DatasetResponse)
+async def add_dataset_sites(
+    dataset_id: str,
+    file: UploadFile = File(..., description="CSV, Parquet or Feather/Arrow IPC file with the sites to add")
+):
+    """
+    Add the sites in an uploaded CSV to a dataset.
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    df = await parse_upload(file)
+    
+    messages = await run_in_threadpool(dataset.add_sites, df)
+    return dataset_response(dataset_id, dataset, messages)
+
+
+@app.post("/datasets/{dataset_id}/sites/remove", response_model=DatasetResponse)
+async def remove_dataset_sites(dataset_id: str, request: SiteRemovalRequest):
+    """
+    Remove sites from a dataset by site_id.
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    
+    messages = await run_in_threadpool(dataset.remove_sites, request.site_ids)
+    return dataset_response(dataset_id, dataset, messages)
+
+
+async def analyze_dataset(dataset_id: str, params: AnalysisRequest) -> AnalysisResult:
+    """
+    Analyze a registered dataset with new parameters, serving repeats from cache.
+    
+    Raises:
+        HTTPException: 404 for unknown datasets, or as run_in_pool
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    
+    def dataset_key(version: int) -> str:
+        return make_cache_key(f"dataset:{dataset_id}:{version}", params.model_dump())
+    
+    cached = result_cache.get(dataset_key(dataset.version))
+    if cached is not None:
+        logger.info(f"Serving cached result for dataset: {dataset_id}")
+        return cached
+    
+    # Key the result by the version the sites were read at, not the one
+    # looked up above, in case an update landed in between
+    version, df_clean, index = await run_in_threadpool(dataset.sites, params.spatial_engine)
+    key = dataset_key(version)
+    
+    logger.info(f"Processing {len(df_clean)} rows from dataset: {dataset_id}")
+    
+    result = await run_in_pool(run_dataset_analysis, df_clean, index, params)
+    finish_run(key, result)
+    return result
+
+
+@app.post("/datasets/{dataset_id}/analyze", response_model=AnalysisResponse)
+async def analyze_dataset_sites(
+    dataset_id: str,
+    params: AnalysisRequest = Depends(analysis_params),
+    fmt: str = Depends(download_format_param)
+):
+    """
+    Analyze a registered dataset with any analysis parameters.
+    
+    Same response as /analyze, without uploading or validating the data.
+    """
+    result = await analyze_dataset(dataset_id, params)
+    job = job_manager.add_completed(result)
+    
+    return AnalysisResponse(
+        summary=result.summary,
+        preview=dataframe_to_dict_list(result.data, max_rows=50),
+        total_rows=len(result.data),
+        messages=result.messages,
+        download_url=job_result_url(job.job_id, fmt),
+        timings=stage_timings(result)
+    )
+
+
+@app.get("/datasets/{dataset_id}/download")
+async def download_dataset_results(
+    dataset_id: str,
+    params: AnalysisRequest = Depends(analysis_params),
+    fmt: str = Depends(download_format_param),
+    encoding: Optional[str] = Depends(content_encoding_param)
+):
+    """
+    Download the analysis of a registered dataset (CSV unless format is given).
+    """
+    result = await analyze_dataset(dataset_id, params)
+    return download_response(result.data, fmt, encoding)
+
+
+@app.get("/datasets/{dataset_id}/result")
+async def get_dataset_result(
+    dataset_id: str,
+    fmt: str = Depends(download_format_param),
+    encoding: Optional[str] = Depends(content_encoding_param)
+):
+    """
+    Download the current enriched data of a dataset (CSV unless format is given).
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    
+    result_df = await run_in_threadpool(dataset.to_frame)
+    return download_response(result_df, fmt, encoding)
+
+
+@app.get("/jobs/{job_id}/co-location")
+async def get_job_co_location(
+    job_id: str,
+    threshold_m: float = Query(..., ge=1.0, le=10000.0, description="Co-location threshold (meters)"),
+    fmt: str = Depends(download_format_param),
+    encoding: Optional[str] = Depends(content_encoding_param)
+):
+    """
+    Download co-location groups of a completed job at another threshold (CSV unless format is given).
+    
+    Requires a job run with co_location_max_threshold_m; groups for any
+    threshold up to that maximum are cut from the stored hierarchy without
+    new spatial queries.
+    
+    Returns:
+        site_id, group_id and group_size per site, in result order
+    """
+    job = get_completed_job_or_409(job_id)
+    
+    hierarchy = job.result.hierarchy
+    if hierarchy is None:
+        raise HTTPException(status_code=409, detail="Job was run without co_location_max_threshold_m")
+    if threshold_m > hierarchy.max_threshold_m:
+        raise HTTPException(
+            status_code=422,
+            detail=f"threshold_m must be at most {hierarchy.max_threshold_m} for this job"
+        )
+    
+    group_id, group_size = await run_in_threadpool(hierarchy.groups, threshold_m)
+    groups_df = pd.DataFrame({
+        'site_id': hierarchy.site_ids,
+        'group_id': group_id,
+        'group_size': group_size
+    })
+    return download_response(groups_df, fmt, encoding)
+
+
+async def reclassify_to_job(result: AnalysisResult, classification: ClassificationRequest) -> JobResponse:
+    """
+    Reclassify an analyzed result and store it as a new completed job.
+    
+    Raises:
+        HTTPException: 422 if threshold mode is given only some thresholds
+    """
+    thresholds = classification.classification_thresholds
+    if classification.classification_mode == 'threshold' and thresholds is not None:
+        missing = [key for key in DEFAULT_CLASSIFICATION_THRESHOLDS if key not in thresholds]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Missing thresholds: {missing}")
+    
+    reclassified = await run_in_threadpool(
+        reclassify_result, result, classification.classification_mode, thresholds
+    )
+    job = job_manager.add_completed(reclassified)
+    return JobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        summary=reclassified.summary,
+        total_rows=len(reclassified.data),
+        messages=reclassified.messages,
+        result_url=job_result_url(job.job_id)
+    )
+
+
+async def batch_summaries(result_df: pd.DataFrame, request: ReclassifyBatchRequest) -> ReclassifyBatchResponse:
+    """Threshold-mode summaries of an analyzed result for every requested threshold set."""
+    summaries = await run_in_threadpool(
+        summaries_for_thresholds, result_df, [t.model_dump() for t in request.threshold_sets]
+    )
+    return ReclassifyBatchResponse(total_rows=len(result_df), summaries=summaries)
+
+
+@app.post("/jobs/{job_id}/reclassify", response_model=JobResponse)
+async def reclassify_job(
+    job_id: str,
+    classification: ClassificationRequest = Depends(classification_params)
+):
+    """
+    Apply new classification settings to a completed job's result.
+    
+    Density and co-location are reused; only area_class is recomputed. The
+    reclassified result is stored as a new completed job.
+    """
+    job = get_completed_job_or_409(job_id)
+    return await reclassify_to_job(job.result, classification)
+
+
+@app.post("/jobs/{job_id}/reclassify/batch", response_model=ReclassifyBatchResponse)
+async def reclassify_job_batch(job_id: str, request: ReclassifyBatchRequest):
+    """
+    Summaries of a completed job's result for many threshold sets in one call.
+    """
+    job = get_completed_job_or_409(job_id)
+    return await batch_summaries(job.result.data, request)
+
+
+@app.post("/datasets/{dataset_id}/reclassify", response_model=JobResponse)
+async def reclassify_dataset(
+    dataset_id: str,
+    classification: ClassificationRequest = Depends(classification_params)
+):
+    """
+    Apply new classification settings to a dataset's current analysis.
+    
+    The reclassified result is stored as a new completed job.
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    result_df = await run_in_threadpool(dataset.to_frame)
+    result = AnalysisResult(data=result_df, messages=[], summary=AnalysisSummary(**dataset.class_counts()))
+    return await reclassify_to_job(result, classification)
+
+
+@app.post("/datasets/{dataset_id}/reclassify/batch", response_model=ReclassifyBatchResponse)
+async def reclassify_dataset_batch(dataset_id: str, request: ReclassifyBatchRequest):
+    """
+    Summaries of a dataset's current analysis for many threshold sets in one call.
+    """
+    dataset = get_dataset_or_404(dataset_id)
+    result_df = await run_in_threadpool(dataset.to_frame)
+    return await batch_summaries(result_df, request)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result cache hit/miss counters and memory usage."""
+    return result_cache.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -15,6 +15,18 @@ class AnalysisRequest(BaseModel):
         default=None,
         description="Optional thresholds for threshold mode: {'rural': float, 'suburban': float, 'urban': float}"
     )
+    co_location_max_threshold_m: Optional[float] = Field(
+        default=None,
+        ge=1.0,
+        le=10000.0,
+        description="Optional maximum threshold (meters); keeps a co-location hierarchy that can be cut at any threshold up to it"
+    )
+    density_radii_km: Optional[List[float]] = Field(
+        default=None,
+        description="Optional extra radii (km); each adds a 'density_<r>km' column"
+    )
+    density_engine: str = Field(default="balltree", pattern="^(balltree|grid)$", description="Density engine: 'balltree' (exact) or 'grid' (approximate, fast)")
+    spatial_engine: str = Field(default="haversine", pattern="^(haversine|projected)$", description="Spatial index: 'haversine' (exact) or 'projected' (planar KD-tree for compact regions)")
 
 
 class AnalysisSummary(BaseModel):
@@ -25,6 +37,18 @@ class AnalysisSummary(BaseModel):
     Dense: int = Field(default=0, description="Number of dense sites")
 
 
+class StageTimingResponse(BaseModel):
+    """Resource use of one pipeline stage."""
+    stage: str = Field(description="Stage name, e.g. 'validate', 'density', 'classify'")
+    wall_s: float = Field(description="Wall-clock time (seconds)")
+    cpu_s: float = Field(description="Process CPU time (seconds)")
+    rows: int = Field(description="Rows the stage processed")
+    peak_memory_bytes: Optional[int] = Field(
+        default=None,
+        description="Peak traced memory above the stage's starting point (only when memory tracing is enabled)"
+    )
+
+
 class AnalysisResponse(BaseModel):
     """Response model for analysis endpoint."""
     summary: AnalysisSummary = Field(description="Summary statistics by area class")
@@ -32,3 +56,57 @@ class AnalysisResponse(BaseModel):
     total_rows: int = Field(description="Total number of processed rows")
     messages: List[str] = Field(description="Processing messages and warnings")
     download_url: Optional[str] = Field(default=None, description="URL to download full results (simulated)")
+    timings: Optional[List[StageTimingResponse]] = Field(default=None, description="Per-stage timings of the run")
+
+
+class JobResponse(BaseModel):
+    """Response model for job submission and status endpoints."""
+    job_id: str = Field(description="Job identifier")
+    status: str = Field(description="Job status: 'queued', 'running', 'completed' or 'failed'")
+    summary: Optional[AnalysisSummary] = Field(default=None, description="Summary statistics (once completed)")
+    total_rows: Optional[int] = Field(default=None, description="Total number of processed rows (once completed)")
+    messages: List[str] = Field(default_factory=list, description="Processing messages and warnings")
+    error: Optional[str] = Field(default=None, description="Error message if the job failed")
+    result_url: Optional[str] = Field(default=None, description="URL to download full results (once completed)")
+    timings: Optional[List[StageTimingResponse]] = Field(default=None, description="Per-stage timings (once completed)")
+
+
+class DatasetResponse(BaseModel):
+    """Response model for the dataset endpoints."""
+    dataset_id: str = Field(description="Dataset identifier")
+    summary: AnalysisSummary = Field(description="Summary statistics by area class")
+    total_rows: int = Field(description="Number of sites currently in the dataset")
+    messages: List[str] = Field(default_factory=list, description="Processing messages and warnings")
+    result_url: str = Field(description="URL to download the current enriched data")
+
+
+class SiteRemovalRequest(BaseModel):
+    """Request model for removing sites from a dataset."""
+    site_ids: List[str] = Field(min_length=1, description="IDs of the sites to remove")
+
+
+class ClassificationRequest(BaseModel):
+    """Request model for classification settings."""
+    classification_mode: str = Field(default="quantile", pattern="^(quantile|threshold)$", description="Classification mode: 'quantile' or 'threshold'")
+    classification_thresholds: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Optional thresholds for threshold mode: {'rural': float, 'suburban': float, 'urban': float}"
+    )
+
+
+class ThresholdSet(BaseModel):
+    """One set of density thresholds (sites per km²) for threshold mode."""
+    rural: float = Field(ge=0.0, description="Rural threshold")
+    suburban: float = Field(ge=0.0, description="Suburban threshold")
+    urban: float = Field(ge=0.0, description="Urban threshold")
+
+
+class ReclassifyBatchRequest(BaseModel):
+    """Request model for evaluating many threshold sets at once."""
+    threshold_sets: List[ThresholdSet] = Field(min_length=1, max_length=10000, description="Threshold sets to evaluate")
+
+
+class ReclassifyBatchResponse(BaseModel):
+    """Response model for batch reclassification."""
+    total_rows: int = Field(description="Number of classified sites")
+    summaries: List[AnalysisSummary] = Field(description="Summary statistics per threshold set, in request order")
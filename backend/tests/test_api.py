@@ -0,0 +1,224 @@
+"""
+API tests for the FastAPI application, through the TestClient.
+"""
+
+import gzip
+import io
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+# main.py uses the flat imports it is served with from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+# One exposition sample: name, optional labels, value
+SAMPLE_LINE = re.compile(
+    r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+    r'(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (\S+)$'
+)
+
+
+def make_sites(n, start=0, seed=0):
+    """n random sites in three clusters around New York."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'site_id': [f'S{i}' for i in range(start, start + n)],
+        'lat': 40.7 + rng.uniform(0, 0.05, n),
+        'lon': -74.0 + rng.uniform(0, 0.05, n),
+        'cluster_id': rng.integers(0, 3, n).astype(str)
+    })
+
+
+def csv_upload(df, name='sites.csv'):
+    """Multipart file field holding df as CSV."""
+    return {'file': (name, df.to_csv(index=False).encode(), 'text/csv')}
+
+
+def read_result(response):
+    """Downloaded CSV result as a DataFrame with string IDs."""
+    return pd.read_csv(io.BytesIO(response.content), dtype={'site_id': str, 'cluster_id': str})
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Not used as a context manager: the lifespan would shut down the shared worker pool
+    return TestClient(main.app)
+
+
+def wait_for_job(client, job_id, timeout=30.0):
+    """Poll a job until it leaves the queued and running states."""
+    deadline = time.time() + timeout
+    while True:
+        body = client.get(f'/jobs/{job_id}').json()
+        if body['status'] not in ('queued', 'running') or time.time() > deadline:
+            return body
+        time.sleep(0.05)
+
+
+class TestJobs:
+    """Tests for the job lifecycle endpoints."""
+    
+    def test_job_lifecycle(self, client):
+        """A submitted job completes and its result can be downloaded."""
+        sites = make_sites(300, seed=1)
+        response = client.post('/jobs', files=csv_upload(sites))
+        assert response.status_code == 202
+        job_id = response.json()['job_id']
+        
+        body = wait_for_job(client, job_id)
+        assert body['status'] == 'completed'
+        assert body['total_rows'] == 300
+        assert sum(body['summary'].values()) == 300
+        
+        result = client.get(body['result_url'])
+        assert result.status_code == 200
+        result_df = read_result(result)
+        assert result_df['site_id'].tolist() == sites['site_id'].tolist()
+        assert {'density', 'group_id', 'group_size', 'area_class'} <= set(result_df.columns)
+    
+    def test_unknown_ids_return_404(self, client):
+        """Unknown job and dataset IDs are 404s."""
+        for method, url in [
+            ('get', '/jobs/missing'),
+            ('get', '/jobs/missing/result'),
+            ('post', '/jobs/missing/reclassify'),
+            ('get', '/datasets/missing'),
+            ('get', '/datasets/missing/result'),
+            ('post', '/datasets/missing/analyze')
+        ]:
+            assert client.request(method, url).status_code == 404, url
+
+
+class TestDatasets:
+    """Tests for the dataset endpoints."""
+    
+    def test_create_add_remove_analyze(self, client):
+        """Sites added and removed through the API are reflected in analyses."""
+        response = client.post('/datasets', files=csv_upload(make_sites(200, seed=2)))
+        assert response.status_code == 201
+        dataset_id = response.json()['dataset_id']
+        assert response.json()['total_rows'] == 200
+        
+        response = client.post(f'/datasets/{dataset_id}/sites', files=csv_upload(make_sites(50, start=200, seed=3)))
+        assert response.status_code == 200
+        assert response.json()['total_rows'] == 250
+        
+        response = client.post(f'/datasets/{dataset_id}/sites/remove', json={'site_ids': ['S0', 'S1', 'S210']})
+        assert response.status_code == 200
+        assert response.json()['total_rows'] == 247
+        assert client.get(f'/datasets/{dataset_id}').json()['total_rows'] == 247
+        
+        response = client.post(f'/datasets/{dataset_id}/analyze', params={'radius_km': 1.0})
+        assert response.status_code == 200
+        analysis = response.json()
+        assert analysis['total_rows'] == 247
+        
+        result_df = read_result(client.get(analysis['download_url']))
+        assert {'S0', 'S1', 'S210'}.isdisjoint(result_df['site_id'])
+        assert len(result_df) == 247
+    
+    def test_create_rejects_unsupported_params(self, client):
+        """Parameters the live dataset analysis cannot honour are rejected."""
+        for params in [
+            {'density_radii_km': 1.0},
+            {'density_engine': 'grid'},
+            {'spatial_engine': 'projected'},
+            {'co_location_max_threshold_m': 300.0}
+        ]:
+            response = client.post('/datasets', params=params, files=csv_upload(make_sites(20, seed=7)))
+            assert response.status_code == 422, params
+
+
+class TestReclassify:
+    """Tests for the reclassification endpoints."""
+    
+    def test_batch_matches_single_reclassify(self, client):
+        """Each batch summary equals the summary of a single reclassify call."""
+        response = client.post('/analyze', files=csv_upload(make_sites(300, seed=4)))
+        job_id = response.json()['download_url'].split('/')[2]
+        threshold_sets = [
+            {'rural': 100.0, 'suburban': 400.0, 'urban': 800.0},
+            {'rural': 1.0, 'suburban': 4.0, 'urban': 2.0},
+            {'rural': 0.0, 'suburban': 0.0, 'urban': 0.0}
+        ]
+        
+        response = client.post(f'/jobs/{job_id}/reclassify/batch', json={'threshold_sets': threshold_sets})
+        assert response.status_code == 200
+        summaries = response.json()['summaries']
+        
+        assert len(summaries) == len(threshold_sets)
+        for summary, thresholds in zip(summaries, threshold_sets):
+            single = client.post(f'/jobs/{job_id}/reclassify', params={
+                'classification_mode': 'threshold',
+                'rural_threshold': thresholds['rural'],
+                'suburban_threshold': thresholds['suburban'],
+                'urban_threshold': thresholds['urban']
+            })
+            assert single.status_code == 200
+            assert single.json()['summary'] == summary
+
+
+class TestMetrics:
+    """Tests for the /metrics endpoint."""
+    
+    def test_prometheus_text_format(self, client):
+        """Every line is a HELP, TYPE or sample line, and samples belong to a declared family."""
+        client.get('/health')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/plain')
+        
+        types = {}
+        samples = []
+        for line in response.text.splitlines():
+            if line.startswith('# HELP '):
+                continue
+            if line.startswith('# TYPE '):
+                _, _, name, type_name = line.split(' ')
+                assert type_name in ('counter', 'gauge', 'histogram', 'summary', 'untyped')
+                types[name] = type_name
+                continue
+            match = SAMPLE_LINE.match(line)
+            assert match is not None, line
+            float(match.group(3))
+            samples.append(match.group(1))
+        
+        for name in samples:
+            family = re.sub(r'_(bucket|sum|count)$', '', name)
+            assert name in types or types.get(family) == 'histogram', name
+        assert 'http_requests_total' in samples
+
+
+class TestCompression:
+    """Tests for compressed uploads and content-encoded downloads."""
+    
+    def test_gzip_upload_matches_plain(self, client):
+        """A .csv.gz upload is analyzed like the plain CSV."""
+        sites = make_sites(200, seed=5)
+        plain = client.post('/analyze', files=csv_upload(sites))
+        compressed = client.post('/analyze', files={
+            'file': ('sites.csv.gz', gzip.compress(sites.to_csv(index=False).encode()), 'application/gzip')
+        })
+        
+        assert compressed.status_code == 200
+        assert compressed.json()['summary'] == plain.json()['summary']
+        assert compressed.json()['total_rows'] == 200
+    
+    def test_gzip_download_round_trips(self, client):
+        """A gzip-encoded download decodes to the same frame as the plain one."""
+        response = client.post('/analyze', files=csv_upload(make_sites(200, seed=6)))
+        url = response.json()['download_url']
+        
+        plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+        encoded = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        
+        assert 'content-encoding' not in plain.headers
+        assert encoded.headers['content-encoding'] == 'gzip'
+        assert encoded.headers['vary'] == 'Accept-Encoding'
+        pd.testing.assert_frame_equal(read_result(encoded), read_result(plain))
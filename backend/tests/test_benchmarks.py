@@ -0,0 +1,94 @@
+"""
+Unit tests for the site generator and the pipeline benchmark harness.
+"""
+
+import pandas as pd
+import pytest
+from backend.benchmarks.generate import PRESETS, generate_frame, generate_sites, parse_size, write_sites
+from backend.benchmarks.pipeline import PIPELINE_BENCHMARKS, compare_results, run_benchmarks
+from backend.logic import validate_csv
+
+
+def make_report(**records):
+    """Report with one process_sites record per size: {sites: (wall_s_min, peak_memory_bytes)}."""
+    return {'results': [
+        {'benchmark': 'process_sites', 'sites': int(n), 'preset': 'uniform_rural', 'wall_s_min': wall, 'peak_memory_bytes': memory}
+        for n, (wall, memory) in records.items()
+    ]}
+
+
+class TestSiteGenerator:
+    """Tests for the synthetic site generator."""
+    
+    def test_parse_size(self):
+        """Sizes accept k and M suffixes."""
+        assert [parse_size(s) for s in ('500', '10k', '1.5M')] == [500, 10_000, 1_500_000]
+    
+    @pytest.mark.parametrize('preset', sorted(PRESETS))
+    def test_presets_are_seeded_and_valid(self, preset):
+        """Every preset gives reproducible sites that pass validation unchanged."""
+        df = generate_frame(2000, preset, seed=3)
+        
+        assert df.equals(generate_frame(2000, preset, seed=3))
+        assert not df.equals(generate_frame(2000, preset, seed=4))
+        df_clean, errors = validate_csv(df)
+        assert len(df_clean) == 2000 and errors == []
+    
+    def test_chunks_cover_all_sites(self):
+        """Chunked generation yields every site once, in order."""
+        chunks = list(generate_sites(2500, 'dense_urban', chunk_rows=1000))
+        
+        assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+        site_ids = pd.concat(chunks)['site_id']
+        assert site_ids.is_unique and site_ids.is_monotonic_increasing
+    
+    def test_chains_form_large_groups(self):
+        """co_location_chains sites sit closer than the default co-location threshold."""
+        df = generate_frame(600, 'co_location_chains', seed=1)
+        step = df[['lat', 'lon']].iloc[:300].diff().abs().max()
+        assert step['lat'] < 0.001 and step['lon'] < 0.001
+    
+    def test_write_csv(self, tmp_path):
+        """CSV output has one header and every row."""
+        path = tmp_path / 'sites.csv'
+        rows = write_sites(generate_sites(1500, 'metro', chunk_rows=1000), str(path), 'csv')
+        
+        assert rows == 1500
+        assert len(pd.read_csv(path)) == 1500
+    
+    @pytest.mark.parametrize('fmt,suffix', [('parquet', '.parquet'), ('arrow', '.arrow')])
+    def test_write_columnar(self, tmp_path, fmt, suffix):
+        """Parquet and Arrow IPC output round-trip through pandas."""
+        pytest.importorskip('pyarrow')
+        path = tmp_path / f'sites{suffix}'
+        write_sites(generate_sites(1500, 'global', chunk_rows=1000), str(path), fmt)
+        
+        df = pd.read_parquet(path) if fmt == 'parquet' else pd.read_feather(path)
+        expected = pd.concat(generate_sites(1500, 'global', chunk_rows=1000), ignore_index=True)
+        pd.testing.assert_frame_equal(df, expected)
+
+
+class TestBenchmarkHarness:
+    """Tests for benchmark runs and baseline comparison."""
+    
+    def test_run_records_every_benchmark(self):
+        """A small run returns one record per benchmark, size and preset."""
+        report = run_benchmarks(
+            sizes=[200], presets=['uniform_rural', 'dense_urban'], benchmarks=PIPELINE_BENCHMARKS,
+            repeats=1, trace_memory=False, log=lambda line: None
+        )
+        
+        assert len(report['results']) == 2 * len(PIPELINE_BENCHMARKS)
+        assert all(r['wall_s_min'] > 0 and r['peak_memory_bytes'] is None for r in report['results'])
+    
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        """Slowdowns and memory growth beyond tolerance are flagged; noise is not."""
+        baseline = make_report(**{'1000': (0.001, 1000), '100000': (1.0, 10_000)})
+        current = make_report(**{'1000': (0.003, 1100), '100000': (1.5, 20_000)})
+        
+        regressions = compare_results(current, baseline, time_tolerance=0.2, memory_tolerance=0.2)
+        
+        assert {(r['sites'], r['metric']) for r in regressions} == {
+            (100000, 'wall_s_min'), (100000, 'peak_memory_bytes')
+        }
+        assert compare_results(baseline, baseline) == []
@@ -0,0 +1,56 @@
+"""
+Unit tests for the content-addressed result cache.
+"""
+
+from backend.cache import ResultCache, make_cache_key
+
+
+class TestCacheKey:
+    """Tests for cache key construction."""
+    
+    def test_key_depends_on_contents_and_params(self):
+        """Same upload digest and parameters give the same key; any change differs."""
+        params = {'radius_km': 2.0, 'classification_mode': 'quantile'}
+        key = make_cache_key('abc123', params)
+        
+        assert key == make_cache_key('abc123', dict(reversed(list(params.items()))))
+        assert key != make_cache_key('abc124', params)
+        assert key != make_cache_key('abc123', {**params, 'radius_km': 5.0})
+
+
+class TestResultCache:
+    """Tests for ResultCache."""
+    
+    def test_hit_and_miss_counters(self):
+        """Counters track hits and misses."""
+        cache = ResultCache(max_bytes=100)
+        assert cache.get('k') is None
+        cache.put('k', 'value', size=10)
+        assert cache.get('k') == 'value'
+        
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['bytes'] == 10
+    
+    def test_lru_eviction_by_bytes(self):
+        """Least recently used entries are evicted to stay within budget."""
+        cache = ResultCache(max_bytes=25)
+        cache.put('a', 'A', size=10)
+        cache.put('b', 'B', size=10)
+        cache.get('a')
+        cache.put('c', 'C', size=10)
+        
+        assert cache.get('b') is None
+        assert cache.get('a') == 'A'
+        assert cache.get('c') == 'C'
+        assert cache.stats()['bytes'] == 20
+    
+    def test_spill_to_disk(self, tmp_path):
+        """Entries evicted from memory are served from the spill directory."""
+        cache = ResultCache(max_bytes=15, spill_dir=str(tmp_path))
+        cache.put('a', {'rows': [1, 2]}, size=10)
+        cache.put('b', 'B', size=10)
+        
+        assert cache.get('a') == {'rows': [1, 2]}
+        assert cache.stats()['disk_hits'] == 1
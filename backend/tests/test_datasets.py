@@ -0,0 +1,141 @@
+"""
+Unit tests for incrementally updated site datasets.
+"""
+
+import pytest
+import pandas as pd
+import numpy as np
+from backend.datasets import SiteDataset, UnionFind, DatasetStore
+from backend.logic import process_sites
+
+
+def make_sites(n, start=0, seed=0):
+    """Random sites in a small area so densities and groups overlap."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'site_id': [f'S{i}' for i in range(start, start + n)],
+        'lat': 40.0 + rng.uniform(0, 0.05, n),
+        'lon': -74.0 + rng.uniform(0, 0.05, n),
+        'cluster_id': rng.integers(0, 4, n).astype(str)
+    })
+
+
+def assert_matches_full_run(dataset, **params):
+    """The dataset equals a full process_sites run over its current sites."""
+    current = dataset.to_frame()
+    expected, _ = process_sites(current[['site_id', 'lat', 'lon', 'cluster_id']], **params)
+    pd.testing.assert_frame_equal(current, expected.reset_index(drop=True), check_dtype=False)
+
+
+class TestUnionFind:
+    """Tests for UnionFind."""
+    
+    def test_union_and_roots(self):
+        """Unions merge sets; roots agree with find."""
+        forest = UnionFind(5)
+        forest.union(0, 1)
+        forest.union(3, 4)
+        forest.union(1, 4)
+        new_ids = forest.add(2)
+        
+        roots = forest.roots()
+        assert list(new_ids) == [5, 6]
+        assert len({roots[i] for i in (0, 1, 3, 4)}) == 1
+        assert roots[2] == 2
+        assert all(roots[i] == forest.find(i) for i in range(7))
+
+
+class TestSiteDataset:
+    """Tests for SiteDataset incremental updates."""
+    
+    PARAMS = {'radius_km': 0.5, 'co_location_threshold_m': 150.0}
+    
+    def test_initial_build_matches_pipeline(self):
+        """A fresh dataset holds the process_sites result."""
+        dataset = SiteDataset(make_sites(500), **self.PARAMS)
+        assert len(dataset) == 500
+        assert_matches_full_run(dataset, **self.PARAMS)
+    
+    @pytest.mark.parametrize('mode,thresholds', [
+        ('quantile', None),
+        ('threshold', {'rural': 100.0, 'suburban': 300.0, 'urban': 600.0})
+    ])
+    def test_updates_match_full_recompute(self, mode, thresholds):
+        """Adds and removes (including compactions) match a full re-run."""
+        params = {**self.PARAMS, 'classification_mode': mode, 'classification_thresholds': thresholds}
+        dataset = SiteDataset(make_sites(500), **params)
+        rng = np.random.default_rng(1)
+        
+        next_id = 500
+        for step in range(6):
+            dataset.add_sites(make_sites(30, start=next_id, seed=step + 10))
+            next_id += 30
+            assert_matches_full_run(dataset, **params)
+            
+            site_ids = rng.choice(dataset.to_frame()['site_id'].to_numpy(), 20, replace=False)
+            dataset.remove_sites(site_ids)
+            assert_matches_full_run(dataset, **params)
+    
+    def test_added_site_bridges_groups(self):
+        """A new site between two groups merges them into one."""
+        df = pd.DataFrame({
+            'site_id': ['A', 'B'],
+            'lat': [40.0, 40.0],
+            'lon': [-74.0, -74.0016],
+            'cluster_id': ['1', '1']
+        })
+        dataset = SiteDataset(df, radius_km=1.0, co_location_threshold_m=100.0)
+        assert dataset.to_frame()['group_size'].tolist() == [1, 1]
+        
+        dataset.add_sites(pd.DataFrame({
+            'site_id': ['C'], 'lat': [40.0], 'lon': [-74.0008], 'cluster_id': ['1']
+        }))
+        result = dataset.to_frame()
+        assert result['group_size'].tolist() == [3, 3, 3]
+        assert result['group_id'].nunique() == 1
+        
+        dataset.remove_sites(['C'])
+        assert dataset.to_frame()['group_size'].tolist() == [1, 1]
+    
+    def test_remove_reports_unknown_ids(self):
+        """Unknown site IDs are ignored with a message."""
+        dataset = SiteDataset(make_sites(20), **self.PARAMS)
+        messages = dataset.remove_sites(['S0', 'missing'])
+        
+        assert len(dataset) == 19
+        assert any('unknown' in msg for msg in messages)
+    
+    def test_sites_reuse_index_until_updated(self):
+        """sites() returns the current rows and caches indexes per version."""
+        dataset = SiteDataset(make_sites(50), **self.PARAMS)
+        version, frame, index = dataset.sites()
+        assert version == 0
+        assert len(frame) == len(index) == 50
+        assert dataset.sites()[2] is index
+        
+        dataset.remove_sites(['S0'])
+        version, frame, index = dataset.sites('projected')
+        assert version == dataset.version == 1
+        assert len(frame) == len(index) == 49
+        assert 'S0' not in set(frame['site_id'])
+    
+    def test_no_valid_rows_raises(self):
+        """Building from data with no valid rows raises ValueError."""
+        df = pd.DataFrame({'site_id': ['A'], 'lat': [100.0], 'lon': [0.0], 'cluster_id': ['1']})
+        with pytest.raises(ValueError):
+            SiteDataset(df)
+
+
+class TestDatasetStore:
+    """Tests for DatasetStore."""
+    
+    def test_evicts_least_recently_used(self):
+        """Datasets beyond the limit are evicted, least recently used first."""
+        store = DatasetStore(max_stored=2)
+        first = store.add(SiteDataset(make_sites(5)))
+        second = store.add(SiteDataset(make_sites(5)))
+        store.get(first)
+        store.add(SiteDataset(make_sites(5)))
+        
+        assert store.get(first) is not None
+        assert store.get(second) is None
@@ -0,0 +1,118 @@
+"""
+Unit tests for the in-process job queue and result store.
+"""
+
+import os
+import threading
+import time
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from backend.jobs import (
+    JobManager,
+    WorkerPool,
+    PoolSaturatedError,
+    JOB_COMPLETED,
+    JOB_FAILED
+)
+
+
+def wait_for(job, timeout=5.0):
+    """Poll until the job finishes."""
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def make_manager(**kwargs):
+    """JobManager on a thread-only pool."""
+    return JobManager(WorkerPool(process_workers=0, thread_workers=1), **kwargs)
+
+
+class TestWorkerPool:
+    """Tests for the bounded worker pool."""
+    
+    def test_rejects_work_beyond_max_pending(self):
+        """Submissions beyond max_pending raise instead of queueing."""
+        pool = WorkerPool(process_workers=0, thread_workers=1, max_pending=1)
+        release = threading.Event()
+        future = pool.submit(release.wait)
+        
+        with pytest.raises(PoolSaturatedError):
+            pool.submit(lambda: None)
+        assert pool.pending == 1
+        assert pool.rejected == 1
+        
+        release.set()
+        future.result(timeout=5)
+        time.sleep(0.01)
+        assert pool.pending == 0
+        assert pool.submit(lambda: 'ok').result(timeout=5) == 'ok'
+        pool.shutdown()
+    
+    def test_restarts_broken_process_pool(self, monkeypatch):
+        """After a worker dies, the broken pool is shut down and the next submission runs on a fresh one."""
+        pool = WorkerPool(process_workers=1, thread_workers=1, process_min_rows=0)
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result(timeout=30)
+        broken = pool._process_pool
+        shutdowns = []
+        monkeypatch.setattr(broken, 'shutdown', lambda **kwargs: shutdowns.append(kwargs))
+        
+        assert pool.submit(os.getpid).result(timeout=30) != os.getpid()
+        assert pool._process_pool is not broken
+        assert shutdowns == [{'wait': False, 'cancel_futures': True}]
+        pool.shutdown()
+
+
+class TestJobManager:
+    """Tests for JobManager."""
+    
+    def test_completed_job_keeps_result(self):
+        """A finished job exposes its return value via the store."""
+        manager = make_manager()
+        job = wait_for(manager.submit(lambda x: x * 2, 21))
+        
+        assert job.status == JOB_COMPLETED
+        assert manager.get(job.job_id).result == 42
+    
+    def test_failed_job_records_error(self):
+        """Exceptions mark the job failed with the error message."""
+        def boom():
+            raise ValueError("bad input")
+        
+        manager = make_manager()
+        job = wait_for(manager.submit(boom))
+        
+        assert job.status == JOB_FAILED
+        assert job.error == "bad input"
+    
+    def test_oldest_finished_jobs_evicted(self):
+        """The store keeps at most max_stored_jobs jobs."""
+        manager = make_manager(max_stored_jobs=2)
+        first = manager.add_completed('a')
+        second = manager.add_completed('b')
+        third = manager.add_completed('c')
+        
+        assert manager.get(first.job_id) is None
+        assert manager.get(second.job_id).result == 'b'
+        assert manager.get(third.job_id).result == 'c'
+    
+    def test_results_evicted_beyond_byte_budget(self):
+        """Finished results are evicted to fit max_stored_bytes, keeping the newest."""
+        manager = make_manager(max_stored_bytes=10, result_size=len)
+        first = manager.add_completed('aaaa')
+        second = manager.add_completed('bbbb')
+        assert manager.stored_bytes == 8
+        
+        third = manager.add_completed('cccc')
+        assert manager.get(first.job_id) is None
+        assert manager.get(second.job_id).result == 'bbbb'
+        assert manager.stored_bytes == 8
+        
+        # A result larger than the budget is still kept on its own
+        large = wait_for(manager.submit(lambda: 'x' * 20))
+        assert manager.get(large.job_id).result == 'x' * 20
+        assert manager.get(second.job_id) is None
+        assert manager.get(third.job_id) is None
+        assert manager.stored_bytes == 20
@@ -10,10 +10,25 @@ from backend.logic import (
     validate_csv,
     haversine_distance,
     calculate_density,
+    count_neighbors_multi_radius,
+    parallel_neighbor_counts,
+    density_column,
+    grid_neighbor_counts,
     find_co_location_groups,
+    build_co_location_hierarchy,
+    build_neighbor_graph,
+    estimate_edge_count,
     classify_sites,
+    class_counts_for_thresholds,
     process_sites,
-    EARTH_RADIUS_KM
+    analyze_sites,
+    PipelineProfile,
+    SpatialIndex,
+    ProjectedIndex,
+    build_spatial_index,
+    projection_distortion,
+    EARTH_RADIUS_KM,
+    AREA_CLASSES
 )
 
 
@@ -65,6 +80,44 @@ class TestValidation:
         df_clean, errors = validate_csv(df)
         assert len(df_clean) == 1
         assert df_clean.iloc[0]['site_id'] == 'A'
+    
+    def test_drop_messages_count_each_row_once(self):
+        """Test each bad row is counted by the first check it fails."""
+        df = pd.DataFrame({
+            'site_id': ['A', 'B', 'C', 'D', 'E', 'F'],
+            'lat': ['40.0', 'n/a', None, 'n/a', '95.0', '41.0'],
+            'lon': ['-74.0', 'bad', '-75.0', '-75.0', '-75.0', 'bad'],
+            'cluster_id': ['1', '1', '1', '2', '2', '2']
+        })
+        df_clean, errors = validate_csv(df)
+        assert list(df_clean['site_id']) == ['A']
+        assert errors == [
+            "Dropped 2 rows with non-numeric lat",
+            "Dropped 1 rows with non-numeric lon",
+            "Dropped 1 rows with invalid coordinates",
+            "Dropped 5 invalid rows (from 6 total)"
+        ]
+    
+    def test_output_types_and_extra_columns(self):
+        """Test output column order and types, and that the input is not shared."""
+        df = pd.DataFrame({
+            'note': ['x', 'y', 'z'],
+            'site_id': [1, 2, 3],
+            'lat': [40, 41, 95],
+            'lon': [-74, -75, -76],
+            'cluster_id': [7, 7, 8]
+        })
+        df_clean, _ = validate_csv(df)
+        assert list(df_clean.columns) == ['site_id', 'lat', 'lon', 'cluster_id', 'note']
+        assert list(df_clean.index) == [0, 1]
+        assert df_clean['lat'].dtype == np.float64
+        assert df_clean['lon'].dtype == np.float64
+        assert list(df_clean['site_id']) == ['1', '2']
+        assert list(df_clean['note']) == ['x', 'y']
+        
+        df_all, _ = validate_csv(df.iloc[:2])
+        df_all.loc[0, 'note'] = 'changed'
+        assert df.loc[0, 'note'] == 'x'
 
 
 class TestHaversineDistance:
@@ -214,6 +267,118 @@ class TestDensityCalculation:
         assert all(d == pytest.approx(expected_density, abs=1e-3) for d in density)
 
 
+class TestMultiRadiusDensity:
+    """Tests for density at several radii."""
+    
+    def make_sites(self):
+        rng = np.random.default_rng(3)
+        return pd.DataFrame({
+            'lat': 40.0 + rng.uniform(-0.05, 0.05, 300),
+            'lon': -74.0 + rng.uniform(-0.05, 0.05, 300)
+        })
+    
+    def test_list_of_radii_matches_single_radius(self):
+        """Each density column equals the single-radius result."""
+        df = self.make_sites()
+        radii = [0.5, 1.0, 2.0]
+        densities = calculate_density(df, radius_km=radii)
+        
+        assert list(densities.columns) == ['density_0.5km', 'density_1km', 'density_2km']
+        for r in radii:
+            np.testing.assert_array_equal(
+                densities[density_column(r)].values,
+                calculate_density(df, radius_km=r).values
+            )
+    
+    def test_single_query_bucketing_matches_count_only(self):
+        """Bucketed distance query gives the same counts as count-only queries."""
+        df = self.make_sites()
+        index = SpatialIndex.from_dataframe(df)
+        radii = [2.0, 0.25, 1.0]
+        
+        counts = count_neighbors_multi_radius(index, radii, chunk_size=70)
+        
+        for k, r in enumerate(radii):
+            np.testing.assert_array_equal(counts[:, k], index.query_radius(r, count_only=True))
+    
+    def test_pipeline_adds_density_columns(self):
+        """process_sites adds one column per extra radius."""
+        df = self.make_sites().assign(
+            site_id=[f'S{i}' for i in range(300)], cluster_id='1'
+        )
+        result_df, _ = process_sites(df, radius_km=1.0, density_radii_km=[0.5, 1.0, 2.0])
+        
+        assert 'density_0.5km' in result_df.columns
+        assert 'density_2km' in result_df.columns
+        assert 'density_1km' not in result_df.columns
+        np.testing.assert_array_equal(
+            result_df['density'].values, calculate_density(df, radius_km=1.0).values
+        )
+    
+    def test_pipeline_repeated_radii_added_once(self):
+        """Repeated extra radii give a single column each."""
+        df = self.make_sites().assign(
+            site_id=[f'S{i}' for i in range(300)], cluster_id='1'
+        )
+        result_df, _ = process_sites(df, radius_km=1.0, density_radii_km=[2.0, 2.0, 1.0])
+        
+        assert result_df.columns.is_unique
+        assert [c for c in result_df.columns if c.startswith('density_')] == ['density_2km']
+    
+    def test_parallel_counts_match_serial(self):
+        """Chunked queries across worker processes give the serial counts."""
+        df = self.make_sites()
+        radii = [0.5, 2.0]
+        
+        for index in (SpatialIndex.from_dataframe(df), ProjectedIndex.from_dataframe(df)):
+            counts = parallel_neighbor_counts(index, radii, workers=2, chunk_size=70)
+            
+            for k, r in enumerate(radii):
+                np.testing.assert_array_equal(counts[:, k], index.query_radius(r, count_only=True))
+
+
+class TestGridDensity:
+    """Tests for the approximate grid density engine."""
+    
+    def test_error_within_documented_bound(self):
+        """Raw grid counts only differ from exact counts by sites near the radius."""
+        rng = np.random.default_rng(11)
+        df = pd.DataFrame({
+            'lat': 13.0 + rng.uniform(-0.1, 0.1, 2000),
+            'lon': 77.5 + rng.uniform(-0.1, 0.1, 2000)
+        })
+        radius_km = 1.0
+        resolution = 4
+        index = SpatialIndex.from_dataframe(df)
+        
+        exact = index.query_radius(radius_km, count_only=True) - 1
+        approx = grid_neighbor_counts(df['lat'].values, df['lon'].values, radius_km, resolution)
+        
+        # Undo the area correction to recover raw stencil counts
+        stencil = sum(
+            1 for dx in range(-resolution, resolution + 1)
+            for dy in range(-resolution, resolution + 1)
+            if dx * dx + dy * dy <= resolution * resolution
+        )
+        raw = np.rint(approx * stencil / (np.pi * resolution ** 2))
+        
+        band = np.sqrt(2) * radius_km / resolution
+        inner = index.query_radius(radius_km - band, count_only=True)
+        outer = index.query_radius(radius_km + band, count_only=True)
+        assert np.all(np.abs(raw - exact) <= outer - inner)
+        
+        # Aggregate error is small for roughly uniform data
+        assert abs(approx.sum() - exact.sum()) / exact.sum() < 0.05
+    
+    def test_grid_engine_selected_by_parameter(self):
+        """calculate_density uses the grid engine when requested."""
+        df = pd.DataFrame({'lat': [40.0, 50.0], 'lon': [-74.0, -75.0]})
+        density = calculate_density(df, radius_km=2.0, engine='grid')
+        assert list(density) == [0.0, 0.0]
+        with pytest.raises(ValueError):
+            calculate_density(df, engine='exact')
+
+
 class TestCoLocationGroups:
     """Tests for co-location grouping."""
     
@@ -291,6 +456,221 @@ class TestCoLocationGroups:
         assert group_id.iloc[0] == group_id.iloc[1]  # A and B
         assert group_id.iloc[2] == group_id.iloc[3]  # C and D
         assert group_id.iloc[0] != group_id.iloc[2]  # Different groups
+    
+    def test_group_ids_stable_across_processes(self):
+        """Group IDs are content hashes, independent of row order and hash salt."""
+        import hashlib
+        km_per_degree = 111.0
+        df = pd.DataFrame({
+            'site_id': ['B', 'A', 'C'],
+            'lat': [40.0, 40.0 + 0.05 / km_per_degree, 45.0],
+            'lon': [-74.0, -74.0, -74.0]
+        })
+        group_id, _ = find_co_location_groups(df, threshold_m=100.0)
+        expected = hashlib.blake2b(b'A\x00B', digest_size=8).hexdigest()
+        assert group_id.iloc[0] == expected
+        assert group_id.iloc[1] == expected
+        
+        shuffled_id, _ = find_co_location_groups(df.iloc[::-1], threshold_m=100.0)
+        assert shuffled_id.loc[0] == expected
+    
+    def test_chain_forms_single_group(self):
+        """Sites linked only through intermediate neighbors share one group."""
+        km_per_degree = 111.0
+        # 5 sites 80m apart: each only touches its direct neighbors at 100m
+        df = pd.DataFrame({
+            'site_id': list('ABCDE'),
+            'lat': [40.0 + i * 0.08 / km_per_degree for i in range(5)],
+            'lon': [-74.0] * 5
+        })
+        group_id, group_size = find_co_location_groups(df, threshold_m=100.0)
+        assert group_id.nunique() == 1
+        assert all(group_size == 5)
+
+
+class TestCoLocationHierarchy:
+    """Tests for the single-linkage co-location hierarchy."""
+    
+    def make_sites(self):
+        rng = np.random.default_rng(5)
+        df = pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(400)],
+            'lat': 40.0 + rng.uniform(0, 0.02, 400),
+            'lon': -74.0 + rng.uniform(0, 0.02, 400)
+        })
+        # Coincident sites must still be grouped
+        df.loc[1, ['lat', 'lon']] = df.loc[0, ['lat', 'lon']].values
+        return df
+    
+    def test_cuts_match_direct_grouping(self):
+        """Groups cut at each threshold equal find_co_location_groups."""
+        df = self.make_sites()
+        hierarchy = build_co_location_hierarchy(df, max_threshold_m=300.0)
+        
+        for threshold_m in [1.0, 50.0, 100.0, 200.0, 300.0]:
+            group_id, group_size = find_co_location_groups(df, threshold_m=threshold_m)
+            cut_id, cut_size = hierarchy.groups(threshold_m)
+            np.testing.assert_array_equal(cut_id, group_id.values)
+            np.testing.assert_array_equal(cut_size, group_size.values)
+    
+    def test_chunked_query_matches(self):
+        """Querying in chunks builds the same spanning forest."""
+        df = self.make_sites()
+        expected = build_co_location_hierarchy(df, max_threshold_m=300.0)
+        hierarchy = build_co_location_hierarchy(df, max_threshold_m=300.0, chunk_size=70)
+        
+        for threshold_m in [1.0, 100.0, 300.0]:
+            np.testing.assert_array_equal(hierarchy.groups(threshold_m)[0], expected.groups(threshold_m)[0])
+    
+    def test_threshold_above_maximum_raises(self):
+        """Cutting above the maximum threshold is rejected."""
+        hierarchy = build_co_location_hierarchy(self.make_sites(), max_threshold_m=100.0)
+        with pytest.raises(ValueError):
+            hierarchy.groups(150.0)
+    
+    def test_pipeline_returns_hierarchy(self):
+        """process_sites uses and returns the hierarchy when a maximum is given."""
+        df = self.make_sites().assign(cluster_id='1')
+        result_df, _, hierarchy = process_sites(
+            df, co_location_threshold_m=100.0, co_location_max_threshold_m=300.0,
+            return_hierarchy=True
+        )
+        expected_df, _ = process_sites(df, co_location_threshold_m=100.0)
+        
+        pd.testing.assert_frame_equal(result_df, expected_df)
+        assert hierarchy.max_threshold_m == 300.0
+
+
+class TestNeighborGraph:
+    """Tests for vectorized co-location graph construction."""
+    
+    def test_upper_triangle_int32(self):
+        """Graph stores each undirected edge once with int32 indices."""
+        neighbors = np.empty(3, dtype=object)
+        neighbors[0] = np.array([0, 1])
+        neighbors[1] = np.array([1, 0, 2])
+        neighbors[2] = np.array([2, 1])
+        graph = build_neighbor_graph(neighbors, 3)
+        
+        assert graph.shape == (3, 3)
+        assert graph.nnz == 2
+        assert graph.indices.dtype == np.int32
+        coo = graph.tocoo()
+        assert sorted(zip(coo.row.tolist(), coo.col.tolist())) == [(0, 1), (1, 2)]
+    
+    def test_chunked_index_graph_matches(self):
+        """Querying the index in chunks gives the same graph as one query."""
+        rng = np.random.default_rng(9)
+        index = SpatialIndex(40.0 + rng.uniform(0, 0.02, 300), -74.0 + rng.uniform(0, 0.02, 300))
+        expected = build_neighbor_graph(index.query_radius(0.2), 300)
+        
+        graph = index.neighbor_graph(0.2, chunk_size=37)
+        
+        assert graph.nnz == expected.nnz > 0
+        assert (graph != expected).nnz == 0
+    
+    def test_edge_count_estimate(self):
+        """Estimate is exact for small datasets and counts each pair once."""
+        df = pd.DataFrame({
+            'lat': [40.0, 40.0005, 40.001, 50.0],
+            'lon': [-74.0, -74.0, -74.0, -75.0]
+        })
+        index = SpatialIndex.from_dataframe(df)
+        # 3 mutually close points -> 3 undirected edges; the far one adds none
+        assert estimate_edge_count(index, radius_km=0.5) == 3
+
+
+class TestSpatialIndex:
+    """Tests for the shared spatial index."""
+    
+    def test_shared_index_matches_per_stage_build(self):
+        """Passing a prebuilt index gives the same results as building one per stage."""
+        df = pd.DataFrame({
+            'site_id': ['A', 'B', 'C', 'D'],
+            'lat': [40.0, 40.0005, 40.01, 50.0],
+            'lon': [-74.0, -74.0, -74.0, -75.0]
+        })
+        index = SpatialIndex.from_dataframe(df)
+        
+        pd.testing.assert_series_equal(
+            calculate_density(df, radius_km=2.0, index=index),
+            calculate_density(df, radius_km=2.0)
+        )
+        shared_ids, shared_sizes = find_co_location_groups(df, threshold_m=100.0, index=index)
+        own_ids, own_sizes = find_co_location_groups(df, threshold_m=100.0)
+        pd.testing.assert_series_equal(shared_ids, own_ids)
+        pd.testing.assert_series_equal(shared_sizes, own_sizes)
+    
+    def test_index_size_mismatch(self):
+        """An index built over different rows is rejected."""
+        df = pd.DataFrame({'lat': [40.0, 41.0], 'lon': [-74.0, -75.0]})
+        index = SpatialIndex.from_dataframe(df.iloc[:1])
+        with pytest.raises(ValueError):
+            calculate_density(df, index=index)
+
+
+class TestProjectedIndex:
+    """Tests for the planar projected spatial engine."""
+    
+    def make_sites(self):
+        rng = np.random.default_rng(5)
+        return pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(400)],
+            'lat': 13.0 + rng.uniform(-0.05, 0.05, 400),
+            'lon': 77.5 + rng.uniform(-0.05, 0.05, 400)
+        })
+    
+    def test_counts_close_to_haversine(self):
+        """For a compact region, counts match haversine up to boundary sites."""
+        df = self.make_sites()
+        projected = build_spatial_index(df, engine='projected')
+        assert isinstance(projected, ProjectedIndex)
+        assert projected.distortion < 0.001
+        
+        exact = SpatialIndex.from_dataframe(df).query_radius(1.0, count_only=True)
+        approx = projected.query_radius(1.0, count_only=True)
+        assert np.abs(approx - exact).max() <= 1
+        assert (approx != exact).mean() < 0.05
+    
+    def test_radius_pairs_match_per_point_query(self):
+        """Flat pairs hold each point's ball-point neighbors with their planar distances."""
+        df = self.make_sites()
+        projected = ProjectedIndex(df['lat'].values, df['lon'].values)
+        rows = np.arange(50, 150)
+        
+        neighbors, distances = projected.query_radius(1.0, return_distance=True, rows=rows)
+        owner, neighbor, distance = projected.query_radius_pairs(1.0, rows=rows)
+        
+        for k, row in enumerate(rows):
+            expected = sorted(projected.tree.query_ball_point(projected.xy[row], r=1.0))
+            assert neighbors[k].tolist() == expected
+            assert sorted(neighbor[owner == k].tolist()) == expected
+            np.testing.assert_allclose(
+                distances[k], np.hypot(*(projected.xy[expected] - projected.xy[row]).T) / EARTH_RADIUS_KM
+            )
+        assert len(owner) == len(neighbor) == len(distance) == sum(len(a) for a in neighbors)
+    
+    def test_co_location_groups_via_pairs(self):
+        """Co-location with the projected index finds the same chain group."""
+        km_per_degree = 111.0
+        df = pd.DataFrame({
+            'site_id': list('ABCD'),
+            'lat': [40.0, 40.0 + 0.08 / km_per_degree, 40.0 + 0.16 / km_per_degree, 40.5],
+            'lon': [-74.0] * 4
+        })
+        index = build_spatial_index(df, engine='projected')
+        group_id, group_size = find_co_location_groups(df, threshold_m=100.0, index=index)
+        
+        assert list(group_size) == [3, 3, 3, 1]
+        expected_id, _ = find_co_location_groups(df, threshold_m=100.0)
+        pd.testing.assert_series_equal(group_id, expected_id)
+    
+    def test_falls_back_for_large_extent(self):
+        """Wide datasets exceed the distortion limit and use haversine."""
+        df = pd.DataFrame({'lat': [0.0, 60.0], 'lon': [0.0, 10.0]})
+        assert projection_distortion(df['lat'].values, df['lon'].values) > 0.005
+        index = build_spatial_index(df, engine='projected')
+        assert not isinstance(index, ProjectedIndex)
 
 
 class TestClassification:
@@ -329,6 +709,25 @@ class TestClassification:
         assert set(cluster1_classes.unique()) == {'Rural', 'Suburban', 'Urban', 'Dense'}
         assert set(cluster2_classes.unique()) == {'Rural', 'Suburban', 'Urban', 'Dense'}
     
+    def test_quantile_mode_matches_pandas_quantiles(self):
+        """Per-cluster cut points match pandas quantile, including ties."""
+        rng = np.random.default_rng(7)
+        df = pd.DataFrame({
+            'density': rng.integers(0, 6, 200).astype(float),
+            'cluster_id': rng.integers(0, 7, 200).astype(str)
+        })
+        
+        area_class = classify_sites(df, mode='quantile')
+        
+        for _, cluster in df.groupby('cluster_id'):
+            q25, q50, q75 = cluster['density'].quantile([0.25, 0.50, 0.75])
+            expected = np.select(
+                [cluster['density'] <= q25, cluster['density'] <= q50, cluster['density'] <= q75],
+                ['Rural', 'Suburban', 'Urban'],
+                default='Dense'
+            )
+            assert list(area_class.loc[cluster.index]) == list(expected)
+    
     def test_threshold_mode(self):
         """Test threshold-based classification."""
         df = pd.DataFrame({
@@ -348,6 +747,159 @@ class TestClassification:
         assert area_class.iloc[1] == 'Suburban'   # 10.0 < 25.0 <= 50.0
         assert area_class.iloc[2] == 'Urban'      # 50.0 < 100.0 <= 200.0
         assert area_class.iloc[3] == 'Dense'      # 300.0 > 200.0
+    
+    def test_threshold_mode_non_ascending(self):
+        """Non-ascending thresholds classify band by band, higher bands winning."""
+        density = np.array([0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, np.nan])
+        df = pd.DataFrame({'density': density, 'cluster_id': '1'})
+        thresholds = {'rural': 1.0, 'suburban': 4.0, 'urban': 2.0}
+        
+        area_class = classify_sites(df, mode='threshold', thresholds=thresholds)
+        
+        expected = pd.Series(index=df.index, dtype=object)
+        expected[density <= 1.0] = 'Rural'
+        expected[(density > 1.0) & (density <= 4.0)] = 'Suburban'
+        expected[(density > 4.0) & (density <= 2.0)] = 'Urban'
+        expected[density > 2.0] = 'Dense'
+        assert area_class.iloc[4] == 'Dense'
+        assert area_class.iloc[:-1].tolist() == expected.iloc[:-1].tolist()
+        assert pd.isna(area_class.iloc[-1])
+
+
+class TestThresholdBatch:
+    """Tests for class counts over many threshold sets."""
+    
+    def test_counts_match_classify_sites(self):
+        """Each threshold set gives the class counts of classify_sites."""
+        rng = np.random.default_rng(2)
+        density = rng.gamma(2.0, 40.0, 1000)
+        density[:20] = 50.0
+        density[-5:] = np.nan
+        df = pd.DataFrame({'density': density, 'cluster_id': '1'})
+        threshold_sets = [
+            {'rural': 10.0, 'suburban': 50.0, 'urban': 200.0},
+            {'rural': 50.0, 'suburban': 50.0, 'urban': 50.0},
+            {'rural': 120.0, 'suburban': 30.0, 'urban': 80.0}
+        ]
+        
+        counts = class_counts_for_thresholds(density, threshold_sets)
+        
+        assert counts.shape == (3, 4)
+        for row, thresholds in zip(counts, threshold_sets):
+            expected = classify_sites(df, mode='threshold', thresholds=thresholds).value_counts()
+            assert row.tolist() == [expected.get(c, 0) for c in AREA_CLASSES]
+    
+    def test_non_ascending_counts(self):
+        """Non-ascending sets count sites band by band, higher bands winning."""
+        density = np.array([0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0])
+        
+        counts = class_counts_for_thresholds(
+            density, [{'rural': 1.0, 'suburban': 4.0, 'urban': 2.0}, {'rural': 3.0, 'suburban': 1.0, 'urban': 4.0}]
+        )
+        
+        # Rural, Suburban, Urban, Dense
+        assert counts.tolist() == [[2, 2, 0, 3], [2, 0, 4, 1]]
+
+
+class TestAnalyzeSites:
+    """Tests for analyzing validated sites with a prebuilt index."""
+    
+    def test_matches_process_sites(self):
+        """analyze_sites on validated rows and a prebuilt index equals process_sites."""
+        rng = np.random.default_rng(11)
+        df = pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(200)],
+            'lat': 40.0 + rng.uniform(0, 0.05, 200),
+            'lon': -74.0 + rng.uniform(0, 0.05, 200),
+            'cluster_id': rng.integers(0, 3, 200).astype(str)
+        })
+        df.loc[0, 'lat'] = 95.0
+        
+        expected_df, expected_messages = process_sites(df, radius_km=1.0)
+        df_clean, _ = validate_csv(df)
+        result_df, messages = analyze_sites(
+            df_clean, radius_km=1.0, index=SpatialIndex.from_dataframe(df_clean)
+        )
+        
+        pd.testing.assert_frame_equal(result_df, expected_df)
+        assert expected_messages[-1] == messages[-1]
+    
+    def test_rejects_mismatched_index(self):
+        """An index over different rows is rejected."""
+        df = pd.DataFrame({'site_id': ['A', 'B'], 'lat': [40.0, 40.1], 'lon': [-74.0, -74.0], 'cluster_id': ['1', '1']})
+        with pytest.raises(ValueError):
+            analyze_sites(df, index=SpatialIndex.from_dataframe(df.iloc[:1]))
+
+
+class TestPipelineProfile:
+    """Tests for per-stage pipeline instrumentation."""
+    
+    @staticmethod
+    def make_df():
+        rng = np.random.default_rng(5)
+        df = pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(300)],
+            'lat': 40.0 + rng.uniform(0, 0.05, 300),
+            'lon': -74.0 + rng.uniform(0, 0.05, 300),
+            'cluster_id': rng.integers(0, 3, 300).astype(str)
+        })
+        df.loc[0, 'lat'] = 95.0
+        return df
+    
+    def test_records_each_stage(self):
+        """Every stage is recorded with its row count; results are unchanged."""
+        df = self.make_df()
+        profile = PipelineProfile()
+        result_df, _ = process_sites(df, radius_km=1.0, profile=profile)
+        
+        assert [t.stage for t in profile.stages] == [
+            'validate', 'spatial_index', 'density', 'co_location_graph',
+            'connected_components', 'group_ids', 'classify'
+        ]
+        assert profile.stages[0].rows == 300
+        assert all(t.rows == 299 for t in profile.stages[1:])
+        assert all(t.wall_s >= 0 and t.cpu_s >= 0 for t in profile.stages)
+        assert all(t.peak_memory_bytes is None for t in profile.stages)
+        assert profile.counts['co_location_edges'] >= 0
+        pd.testing.assert_frame_equal(result_df, process_sites(df, radius_km=1.0)[0])
+    
+    def test_hierarchy_stages(self):
+        """With a co-location hierarchy, the hierarchy build and its cut are recorded."""
+        profile = PipelineProfile()
+        process_sites(self.make_df(), co_location_max_threshold_m=500.0, profile=profile)
+        
+        stages = [t.stage for t in profile.stages]
+        assert 'co_location_hierarchy' in stages
+        assert 'co_location_graph' not in stages
+        assert profile.counts['co_location_edges'] > 0
+        assert stages[-3:] == ['connected_components', 'group_ids', 'classify']
+    
+    def test_traces_peak_memory(self):
+        """With trace_memory, each stage reports its peak memory and tracing stops afterwards."""
+        import tracemalloc
+        with PipelineProfile(trace_memory=True) as profile:
+            process_sites(self.make_df(), profile=profile)
+        
+        assert not tracemalloc.is_tracing()
+        assert all(t.peak_memory_bytes is not None for t in profile.stages)
+        assert max(t.peak_memory_bytes for t in profile.stages) > 0
+    
+    def test_overlapping_profiles_share_tracing(self):
+        """Tracing lasts until the last profile exits; overlapping stages report no peak."""
+        import tracemalloc
+        with PipelineProfile(trace_memory=True) as outer:
+            with outer.stage('overlapped', 1):
+                with PipelineProfile(trace_memory=True) as inner:
+                    with inner.stage('inner', 1):
+                        pass
+            assert tracemalloc.is_tracing()
+            with outer.stage('alone', 1):
+                pass
+        
+        assert not tracemalloc.is_tracing()
+        assert inner.stages[0].peak_memory_bytes is None
+        assert outer.stages[0].peak_memory_bytes is None
+        assert outer.stages[1].peak_memory_bytes is not None
 
 
 class TestFullPipeline:
@@ -0,0 +1,67 @@
+"""
+Unit tests for the in-process metrics registry.
+"""
+
+import pytest
+from backend.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Tests for metric families and the text exposition format."""
+    
+    def test_counter_samples_per_label_set(self):
+        """Counters render one sample per label combination."""
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests', ('endpoint', 'status'))
+        requests.inc(endpoint='/analyze', status='200')
+        requests.inc(2, endpoint='/analyze', status='200')
+        requests.inc(endpoint='/jobs/{job_id}', status='404')
+        
+        lines = registry.render().splitlines()
+        assert '# TYPE requests_total counter' in lines
+        assert 'requests_total{endpoint="/analyze",status="200"} 3' in lines
+        assert 'requests_total{endpoint="/jobs/{job_id}",status="404"} 1' in lines
+    
+    def test_counter_rejects_bad_labels_and_decrements(self):
+        """Counters need exactly their label names and only increase."""
+        counter = MetricsRegistry().counter('c_total', 'C', ('stage',))
+        with pytest.raises(ValueError):
+            counter.inc(other='x')
+        with pytest.raises(ValueError):
+            counter.inc(-1, stage='x')
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Histogram buckets count observations at or below each bound."""
+        registry = MetricsRegistry()
+        latency = registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, stage='density')
+        
+        lines = registry.render().splitlines()
+        assert 'latency_seconds_bucket{stage="density",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{stage="density",le="1"} 3' in lines
+        assert 'latency_seconds_bucket{stage="density",le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum{stage="density"} 3.65' in lines
+        assert 'latency_seconds_count{stage="density"} 4' in lines
+    
+    def test_gauges_read_callbacks_on_render(self):
+        """Gauges are read at render time; None omits the sample."""
+        registry = MetricsRegistry()
+        state = {'pending': 1}
+        registry.gauge('pending_tasks', 'Pending', lambda: state['pending'])
+        registry.gauge('missing', 'Unavailable', lambda: None)
+        registry.counter_function('cache_total', 'Lookups', lambda: {('hit',): 4, ('miss',): 1}, ('result',))
+        
+        state['pending'] = 3
+        lines = registry.render().splitlines()
+        assert 'pending_tasks 3' in lines
+        assert not any(line.startswith('missing') for line in lines)
+        assert '# TYPE cache_total counter' in lines
+        assert 'cache_total{result="hit"} 4' in lines
+    
+    def test_duplicate_names_rejected(self):
+        """A metric name can only be registered once."""
+        registry = MetricsRegistry()
+        registry.counter('x_total', 'X')
+        with pytest.raises(ValueError):
+            registry.counter('x_total', 'X again')
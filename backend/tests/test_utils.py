@@ -0,0 +1,194 @@
+"""
+Unit tests for API utility functions.
+"""
+
+import gzip
+import io
+import tempfile
+import pytest
+import pandas as pd
+from backend.utils import (
+    choose_content_encoding,
+    dataframe_to_csv_bytes,
+    iter_columnar_chunks,
+    iter_csv_chunks,
+    iter_encoded,
+    read_columnar_upload,
+    read_csv_upload,
+    upload_compression,
+    upload_format
+)
+
+
+class TestCsvUpload:
+    """Tests for parsing uploads from file objects."""
+    
+    def test_identifiers_parsed_as_strings(self):
+        """site_id and cluster_id keep their text form (no int coercion)."""
+        csv_bytes = b"site_id,lat,lon,cluster_id,owner\n007,1.5,2.5,01,x\n"
+        df = read_csv_upload(io.BytesIO(csv_bytes))
+        
+        assert df['site_id'].iloc[0] == '007'
+        assert df['cluster_id'].iloc[0] == '01'
+        assert df['lat'].dtype == float
+        assert 'owner' in df.columns
+    
+    def test_usecols_skips_extra_columns(self):
+        """Only requested columns are parsed; missing ones are left out."""
+        csv_bytes = b"site_id,lat,owner\nA,1.5,x\n"
+        df = read_csv_upload(io.BytesIO(csv_bytes), usecols=['site_id', 'lat', 'lon'])
+        
+        assert list(df.columns) == ['site_id', 'lat']
+    
+    def test_arrow_schema(self):
+        """The Arrow reader applies the typed schema and pandas' missing-value markers."""
+        pytest.importorskip('pyarrow')
+        csv_bytes = b"site_id,lat,lon,cluster_id,owner\n007,1.5,2,01,x\nB,None,3,,<NA>\n"
+        df = read_csv_upload(io.BytesIO(csv_bytes))
+        
+        assert df['site_id'].tolist() == ['007', 'B']
+        assert df['lon'].dtype == float
+        assert isinstance(df['cluster_id'].dtype, pd.CategoricalDtype)
+        assert df['lat'].isna().tolist() == [False, True]
+        assert df['cluster_id'].isna().tolist() == [False, True]
+        assert df['owner'].isna().tolist() == [False, True]
+    
+    def test_spooled_upload_stays_in_memory(self):
+        """A spooled upload under its size limit is parsed without rolling over to disk."""
+        pytest.importorskip('pyarrow')
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spooled:
+            spooled.write(b"site_id,lat,lon,cluster_id\nA,1.5,2.5,1\n")
+            spooled.seek(0)
+            df = read_csv_upload(spooled)
+            
+            assert not spooled._rolled
+        assert df['site_id'].tolist() == ['A']
+    
+    @pytest.mark.parametrize('csv_bytes,usecols', [
+        (b"site_id,lat,lon,cluster_id\nA,n/a,2,1\nB,bad,2,1\n", None),
+        (b"site_id,lat,owner\nA,1.5,x\n", ['site_id', 'lat', 'lon']),
+        (b"site_id,lat,lon,cluster_id,installed\nA,1.5,2,1,2024-01-01T10:00:00\n", None)
+    ])
+    def test_falls_back_to_pandas_reader(self, csv_bytes, usecols):
+        """Files the Arrow reader cannot match are parsed as the pandas reader would."""
+        df = read_csv_upload(io.BytesIO(csv_bytes), usecols=usecols)
+        expected = read_csv_upload(io.BytesIO(csv_bytes), usecols=usecols, use_arrow=False)
+        
+        pd.testing.assert_frame_equal(df, expected)
+
+
+class TestCsvStreaming:
+    """Tests for chunked CSV rendering."""
+    
+    def test_chunks_match_full_render(self):
+        """Concatenated chunks equal the single-shot CSV output."""
+        df = pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(7)],
+            'density': [i / 3 for i in range(7)],
+            'group_size': list(range(7))
+        })
+        chunks = list(iter_csv_chunks(df, chunk_rows=3))
+        
+        assert len(chunks) == 3
+        assert b''.join(chunks) == dataframe_to_csv_bytes(df)
+    
+    def test_empty_frame_has_header(self):
+        """An empty result still streams its header row."""
+        df = pd.DataFrame(columns=['site_id', 'density'])
+        assert b''.join(iter_csv_chunks(df)) == dataframe_to_csv_bytes(df)
+
+
+class TestColumnarFormats:
+    """Tests for Parquet and Arrow IPC uploads and downloads."""
+    
+    @pytest.mark.parametrize('filename,fmt', [
+        ('sites.csv', 'csv'),
+        ('Sites.PARQUET', 'parquet'),
+        ('sites.feather', 'arrow'),
+        ('sites.arrows', 'arrow'),
+        ('sites.csv.gz', 'csv'),
+        ('sites.gz', None),
+        ('sites.xlsx', None)
+    ])
+    def test_upload_format(self, filename, fmt):
+        """Upload formats follow the file extension."""
+        assert upload_format(filename) == fmt
+    
+    @pytest.mark.parametrize('fmt,upload', [
+        ('parquet', 'parquet'),
+        ('feather', 'arrow'),
+        ('arrow', 'arrow')
+    ])
+    def test_round_trip(self, fmt, upload):
+        """Chunked output reads back as the same frame, without its index."""
+        pytest.importorskip('pyarrow')
+        df = pd.DataFrame({
+            'site_id': [f'S{i}' for i in range(7)],
+            'lat': [i / 3 for i in range(7)],
+            'group_size': list(range(7))
+        }, index=range(10, 17))
+        chunks = list(iter_columnar_chunks(df, fmt, chunk_rows=3))
+        
+        result = read_columnar_upload(io.BytesIO(b''.join(chunks)), upload)
+        pd.testing.assert_frame_equal(result, df.reset_index(drop=True))
+    
+    def test_usecols_skips_extra_columns(self):
+        """Only requested columns are read, and pandas index columns are dropped."""
+        pytest.importorskip('pyarrow')
+        df = pd.DataFrame({'site_id': ['A'], 'lat': [1.5], 'owner': ['x']}, index=[5])
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        buffer.seek(0)
+        
+        result = read_columnar_upload(buffer, 'parquet', usecols=['site_id', 'lat', 'lon'])
+        assert list(result.columns) == ['site_id', 'lat']
+        
+        buffer.seek(0)
+        assert list(read_columnar_upload(buffer, 'parquet').columns) == ['site_id', 'lat', 'owner']
+
+
+class TestCompression:
+    """Tests for compressed uploads and content-encoded downloads."""
+    
+    @pytest.mark.parametrize('filename,compression', [
+        ('sites.csv', None),
+        ('sites.csv.gz', 'gzip'),
+        ('SITES.CSV.ZST', 'zstd')
+    ])
+    def test_upload_compression(self, filename, compression):
+        """Compression follows the last file suffix."""
+        assert upload_compression(filename) == compression
+    
+    @pytest.mark.parametrize('header,encoding', [
+        (None, None),
+        ('identity', None),
+        ('gzip, deflate, br', 'gzip'),
+        ('gzip;q=1.0, zstd;q=0.5', 'gzip'),
+        ('gzip;q=0', None),
+        ('*;q=0.1, zstd;q=0', 'gzip')
+    ])
+    def test_choose_content_encoding(self, header, encoding):
+        """The accepted encoding with the highest q-value wins; q=0 refuses."""
+        assert choose_content_encoding(header) == encoding
+    
+    def test_gzip_upload_round_trip(self):
+        """A gzip-encoded CSV stream parses like the plain CSV, bad values included."""
+        csv_bytes = b"site_id,lat,lon,cluster_id\n007,bad,2.5,01\n008,1.5,2.5,01\n"
+        chunks = [csv_bytes[:20], csv_bytes[20:]]
+        compressed = b''.join(iter_encoded(chunks, 'gzip'))
+        assert gzip.decompress(compressed) == csv_bytes
+        
+        df = read_csv_upload(io.BytesIO(compressed), compression='gzip')
+        expected = read_csv_upload(io.BytesIO(csv_bytes), use_arrow=False)
+        pd.testing.assert_frame_equal(df, expected)
+    
+    def test_zstd_upload_round_trip(self):
+        """zstd output reads back through the Arrow and pandas readers."""
+        pytest.importorskip('pyarrow')
+        csv_bytes = b"site_id,lat,lon,cluster_id\nA,1.5,2.5,c\n"
+        compressed = b''.join(iter_encoded([csv_bytes], 'zstd'))
+        
+        for use_arrow in (True, False):
+            df = read_csv_upload(io.BytesIO(compressed), use_arrow=use_arrow, compression='zstd')
+            assert df['site_id'].tolist() == ['A']
+            assert df['lat'].tolist() == [1.5]